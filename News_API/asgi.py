@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'News_API.settings')
 
 application = get_asgi_application()
+
+# the keyword suggestions are built while the worker starts serving
+from news_api_app.suggest import load_at_startup  # noqa: E402
+
+load_at_startup()
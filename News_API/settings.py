@@ -46,6 +46,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'news_api_app.middleware.RequestMetricsMiddleware',
+    'news_api_app.middleware.PrimaryAfterWriteMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -56,7 +58,11 @@ MIDDLEWARE = [
 ]
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'news_api_app.authentication.CachedJWTAuthentication',
+    ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'news_api_app.serializers.TimedJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
     ],
 }
 ROOT_URLCONF = 'News_API.urls'
@@ -90,9 +96,36 @@ DATABASES = {
         'PASSWORD': os.getenv('DB_PASSWORD'),
         'HOST': os.getenv('DB_HOST'),
         'PORT': os.getenv('DB_PORT'),
+        # persistent connections, reused by the requests of a worker for this many seconds
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', 60)),
     }
 }
 
+# Read replicas of the default database, DB_REPLICA_HOSTS is a comma separated
+# list of host[:port] e.g. "replica-1,replica-2:5433", same name and credentials.
+# They become the aliases replica1, replica2, ... which serve the reads of the
+# news list, news detail and search views, see news_api_app/routers.py.
+for index, replica in enumerate(filter(None, os.getenv('DB_REPLICA_HOSTS', '').replace(' ', '').split(',')), 1):
+    replica_host, _, replica_port = replica.partition(':')
+    DATABASES['replica{}'.format(index)] = dict(
+        DATABASES['default'], HOST=replica_host, PORT=replica_port or DATABASES['default']['PORT'],
+        TEST={'MIRROR': 'default'})
+
+DATABASE_ROUTERS = ['news_api_app.routers.ReplicaRouter']
+
+# A client which wrote reads from the primary for STICKY_SECONDS, remembered in
+# the cache ALIAS of CACHES, which should be shared (memcached, redis) when
+# running several workers.
+NEWS_READ_REPLICAS = {
+    'DATABASES': [alias for alias in DATABASES if alias.startswith('replica')],
+    'STICKY_SECONDS': 5,
+    'ALIAS': 'default',
+}
+
+# An open persistent connection is checked with a query when a request starts,
+# at most once per this many seconds, and reopened when the database dropped it
+NEWS_DB_HEALTH_CHECK_SECONDS = 10
+
 # Password validation
 # https://docs.djangoproject.com/en/3.1/ref/settings/#auth-password-validators
 
@@ -152,3 +185,104 @@ JWT_AUTH = {
     # it can be refreshed.  exprired tokens can't be refreshed.
     'JWT_REFRESH_EXPIRATION_DELTA': datetime.timedelta(days=7),
 }
+
+# Keyset pagination of GET /news/
+NEWS_PAGE_SIZE = 50
+NEWS_MAX_PAGE_SIZE = 500
+
+# Scraper concurrency, see news_api_app/scraper.py
+SCRAPER_MAX_WORKERS = 16
+SCRAPER_PER_HOST_CONCURRENCY = 4
+# None runs one parse process per CPU, 0 parses in the download threads
+SCRAPER_PARSE_PROCESSES = None
+SCRAPER_TIMEOUT = 10
+# download with httpx on an event loop instead of threads
+SCRAPER_ASYNC = False
+# Days the validators of a page not fetched again are kept for conditional
+# re-scrapes (FetchedPage table)
+SCRAPER_FETCH_CACHE_KEEP_DAYS = 30
+
+# Sources scraped by the scrape worker (python manage.py run_scrape_worker)
+NEWS_PAPERS_FILE = BASE_DIR / 'NewsPapers.json'
+# A job still running after this many seconds is marked failed by the next
+# claim of a worker, its worker is taken for dead
+SCRAPE_JOB_TIMEOUT = 3600
+
+# Polling of the sources by the scheduler (python manage.py run_scheduler), in
+# seconds. A source of NewsPapers.json can override them with poll_interval,
+# min_poll_interval and max_poll_interval.
+SCRAPER_POLL_INTERVAL = 900
+SCRAPER_MIN_POLL_INTERVAL = 120
+SCRAPER_MAX_POLL_INTERVAL = 6 * 3600
+
+# News ingested by the scraper or /news/batch/ whose details are within this
+# many bits (SimHash, at most 3) of a stored news are dropped as near
+# duplicates, None disables the check
+NEWS_NEAR_DUPLICATE_DISTANCE = 3
+
+# Maximum number of items of a /news/batch/ request
+NEWS_BATCH_MAX_ITEMS = 500
+
+# Cache of the news list, detail and search responses. BACKEND 'lru' keeps
+# them in the memory of every worker, 'django' uses the cache ALIAS of CACHES.
+# A write invalidates the cache of its worker at once, the other workers and
+# the writes of the scrape worker are noticed from the head of the change
+# log, read every VERSION_CHECK_SECONDS.
+NEWS_RESPONSE_CACHE = {
+    'BACKEND': 'lru',
+    'MAX_ENTRIES': 1024,
+    'TIMEOUT': 60,
+    'VERSION_CHECK_SECONDS': 2,
+}
+
+# Verified JWTs and their users are cached in every worker for TIMEOUT
+# seconds, the user of a token is looked up again every USER_CHECK_SECONDS.
+# Revoked tokens are stored in the database, every worker reads them again
+# every REVOCATION_CHECK_SECONDS.
+NEWS_AUTH_CACHE = {
+    'MAX_ENTRIES': 10000,
+    'TIMEOUT': 300,
+    'USER_CHECK_SECONDS': 2,
+    'REVOCATION_CHECK_SECONDS': 2,
+}
+
+# Days the changes served by GET /news/changes/ are kept, a client whose cursor
+# is older has to download GET /news/export/ again. Pruned by prune_news_changes.
+NEWS_CHANGES_KEEP_DAYS = 30
+
+# Without PostgreSQL the search runs on an inverted index held in the memory
+# of each worker, which follows the changes of the news (the writes of the
+# other processes included) every NEWS_SEARCH_REFRESH_SECONDS
+NEWS_SEARCH_REFRESH_SECONDS = 2
+
+# GET /news-filter/suggest/ completes keywords from an index of the words of
+# the titles and the DETAIL_TERMS most frequent words of the details of every
+# news, held in the memory of each worker. It holds at most MAX_TERMS words,
+# follows the changes of the news every REFRESH_SECONDS and is built in the
+# background when the worker starts (wsgi.py, asgi.py) if LOAD_AT_STARTUP.
+NEWS_SUGGEST = {
+    'MAX_TERMS': 100000,
+    'DETAIL_TERMS': 10,
+    'REFRESH_SECONDS': 2,
+    'LOAD_AT_STARTUP': True,
+}
+
+# Requests slower than this are logged with their slowest queries to the
+# news_api_app.slow_requests logger
+NEWS_SLOW_REQUEST_SECONDS = 1.0
+
+# /metrics (and the --metrics-port of the workers) only answers these
+# addresses or networks, e.g. the one of Prometheus.
+NEWS_METRICS_ALLOWED_IPS = ['127.0.0.1', '::1']
+# With several processes, a directory where each one writes its metrics, at
+# most every NEWS_METRICS_WRITE_SECONDS, for /metrics to serve their sum.
+# Empty it when deploying. Without it /metrics serves its worker only.
+NEWS_METRICS_DIR = os.getenv('NEWS_METRICS_DIR')
+NEWS_METRICS_WRITE_SECONDS = 5
+
+# News older than NEWS_ARCHIVE_AFTER_DAYS are moved to the NewsArchive table
+# by the archive_news command, monthly partitioned on PostgreSQL. Archive
+# months older than NEWS_ARCHIVE_KEEP_MONTHS can be exported to files.
+NEWS_ARCHIVE_AFTER_DAYS = 90
+NEWS_ARCHIVE_MONTHS_AHEAD = 3
+NEWS_ARCHIVE_KEEP_MONTHS = 24
@@ -16,11 +16,15 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 from drf_yasg import openapi
+from drf_yasg.renderers import _SpecRenderer
 from drf_yasg.views import get_schema_view
 from rest_framework import permissions
+from rest_framework.response import Response
 from rest_framework_simplejwt import views as jwt_views
 
-schema_view = get_schema_view(
+from news_api_app.views import RevokeToken
+
+SchemaViewBase = get_schema_view(
     openapi.Info(
         title="News Operation API",
         default_version='v1',
@@ -31,11 +35,33 @@ schema_view = get_schema_view(
     public=True,
     permission_classes=(permissions.AllowAny,),
 )
+
+
+class SchemaView(SchemaViewBase):
+    """
+    Schema view generating the schema once per worker instead of on every
+    request, the schema only changes with the code and being public it is the
+    same for every user. Kept per version and base url of the request.
+    """
+    schemas = {}
+
+    def get(self, request, version='', format=None):
+        if not isinstance(request.accepted_renderer, _SpecRenderer):
+            # the UI page itself, its schema is loaded by a second request
+            return super().get(request, version, format)
+        key = (request.version or version or '', request.build_absolute_uri('/'))
+        schema = self.schemas.get(key)
+        if schema is None:
+            schema = self.schemas[key] = super().get(request, version, format).data
+        return Response(schema)
+
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/token/', jwt_views.TokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('api/token/refresh/', jwt_views.TokenRefreshView.as_view(), name='token_refresh'),
+    path('api/token/revoke/', RevokeToken.as_view(), name='token_revoke'),
     path('', include('news_api_app.urls')),
-    path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
+    path('swagger/', SchemaView.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
 
 ]
@@ -0,0 +1,74 @@
+"""
+Cost of the article discovery against the local fixture sites.
+
+Scrapes sites linking ``--articles`` stories of the day and ``--old`` stories
+of the previous days once with every discovery: crawling the homepage with
+newspaper (no feed), the RSS feed announced by the homepage, the Atom feed
+and the news sitemap index listed in "feeds". Prints the requests the sites
+received, the articles parsed and the CPU time of the scrape, the parsing
+runs in the scraping process so the CPU time covers all of it.
+
+    python benchmarks/discovery_cost.py --sources 3 --articles 10 --old 90
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'News_API.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from benchmarks.fixture_server import as_newspapers, start_sites  # noqa: E402
+from news_api_app.scraper import ScrapeEngine  # noqa: E402
+
+DISCOVERIES = (
+    ("homepage crawl", None, None),
+    ("rss feed", "rss", None),
+    ("atom feed", "atom", None),
+    ("news sitemap", None, "sitemap.xml"),
+)
+
+
+def run(sites, sources, limit):
+    """
+    Scrape the sites once
+    :return: (articles, requests received, articles parsed, cpu seconds, elapsed seconds)
+    """
+    engine = ScrapeEngine(parse_processes=0)
+    start, cpu = time.perf_counter(), time.process_time()
+    articles, stats = engine.scrape(sources, limit)
+    cpu, elapsed = time.process_time() - cpu, time.perf_counter() - start
+    return (len(articles), sum(site.requests for site in sites), sum(source["parsed"] for source in stats.values()),
+            cpu, elapsed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sources", type=int, default=3)
+    parser.add_argument("--articles", type=int, default=10)
+    parser.add_argument("--old", type=int, default=90)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--limit", type=int, default=1000, help="articles per source")
+    args = parser.parse_args()
+
+    print("{:<15} {:>8} {:>9} {:>7} {:>8} {:>8}".format("discovery", "articles", "requests", "parsed", "cpu s",
+                                                       "wall s"))
+    for label, feed, sitemap in DISCOVERIES:
+        sites = start_sites(args.sources, args.articles, args.latency, args.old, feed)
+        sources = as_newspapers(sites)
+        if sitemap:
+            for site in sites:
+                sources[site.name]["feeds"] = [site.url + sitemap]
+        try:
+            print("{:<15} {:>8} {:>9} {:>7} {:>8.2f} {:>8.2f}".format(label, *run(sites, sources, args.limit)))
+        finally:
+            for site in sites:
+                site.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Django bootstrap shared by the benchmarks.
+
+By default the benchmarks run on a throw-away in-memory SQLite database so
+they need no PostgreSQL, pass use_default_db=True to measure the database
+configured in News_API/settings.py instead (the rows they create are kept).
+"""
+import datetime
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'News_API.settings')
+
+WORDS = (
+    "election market council budget storm court climate vote police health school energy "
+    "minister trade football music science space company border festival report"
+).split()
+SOURCES = ("Washington Post", "CNN", "Time", "QZ", "Slashdot")
+
+
+def setup(use_default_db=False):
+    """
+    Configure Django and create the tables
+    :param use_default_db: keep the database of the settings instead of in-memory SQLite
+    :return:
+    """
+    import django
+    from django.conf import settings
+    from django.core.management import call_command
+
+    if not use_default_db:
+        settings.DATABASES['default'] = {'ENGINE': 'django.db.backends.sqlite3', 'NAME': ':memory:'}
+    settings.ALLOWED_HOSTS = list(settings.ALLOWED_HOSTS) + ['testserver']
+    django.setup()
+    call_command('migrate', verbosity=0)
+
+
+def seed_news(count, seed=0, batch_size=2000):
+    """
+    Insert count synthetic news
+    :param count:
+    :param seed: seed of the random generator, the same seed gives the same rows
+    :param batch_size:
+    :return:
+    """
+    from news_api_app.ingest import build_news
+    from news_api_app.models import News
+
+    generator = random.Random(seed)
+    start = News.objects.count()
+    today = datetime.date.today()
+    batch = []
+    for index in range(start, start + count):
+        title = " ".join(generator.choice(WORDS) for _ in range(8)).capitalize()
+        details = " ".join(generator.choice(WORDS) for _ in range(generator.randint(150, 400)))
+        news_from = generator.choice(SOURCES)
+        date = today - datetime.timedelta(days=generator.randint(0, 365))
+        batch.append(build_news(title, details, date, news_from,
+                                "https://example.com/{}/story-{}.html".format(news_from.lower().replace(" ", "-"),
+                                                                              index)))
+        if len(batch) == batch_size:
+            News.objects.bulk_create(batch)
+            batch = []
+    News.objects.bulk_create(batch)
@@ -0,0 +1,247 @@
+"""
+Local fake news sites for exercising the scraper without the internet.
+
+Every source is served on its own port so the scraper sees one host per
+source, like the real NewsPapers.json. Each homepage links ``articles``
+stories dated today and ``old`` stories of the previous days, every response
+can be delayed by ``latency`` seconds to simulate the network. Pages carry an
+ETag and a matching If-None-Match gets a 304 so conditional re-scrapes can be
+exercised. With ``--feed rss`` or ``--feed atom`` the homepage announces a
+feed of the same stories at /feed.xml, a news sitemap is always served at
+/news-sitemap.xml and a sitemap index at /sitemap.xml.
+
+    python benchmarks/fixture_server.py --sources 5 --articles 20 --old 80 --feed rss --latency 0.2
+
+prints a NewsPapers.json compatible mapping of the started sources.
+"""
+import argparse
+import datetime
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PARAGRAPH = (
+    "The city council met on {date} to discuss story {story} of {source}. "
+    "Officials said the budget for the coming year would be debated again next week, "
+    "while residents asked for more transparency about how the funds are spent. "
+    "Analysts expect the final vote to take place before the end of the month."
+)
+
+
+def article_path(index, day):
+    return "/{:%Y/%m/%d}/story-number-{}-of-the-day.html".format(day, index)
+
+
+def stories(articles, old, today):
+    """
+    Stories of a site, newest first
+    :param articles: number of stories published today
+    :param old: number of stories published the 7 previous days
+    :param today:
+    :return: list of (index, day)
+    """
+    return [(index, today) for index in range(articles)] + [
+        (articles + index, today - datetime.timedelta(days=index % 7 + 1)) for index in range(old)]
+
+
+def homepage_html(name, site_stories, feed=None):
+    links = "\n".join(
+        '<li><a href="{}">Story {} of {}</a></li>'.format(article_path(index, day), index, name)
+        for index, day in site_stories
+    )
+    head = '<link rel="alternate" type="application/{}+xml" title="{}" href="/feed.xml"/>'.format(
+        feed, name) if feed else ""
+    return "<html><head><title>{0}</title>{2}</head><body><h1>{0}</h1><ul>{1}</ul></body></html>".format(
+        name, links, head)
+
+
+def published(day):
+    return datetime.datetime.combine(day, datetime.time(8), datetime.timezone.utc)
+
+
+def rss_xml(name, url, site_stories):
+    items = "".join(
+        "<item><title>Story {index} of {name}</title><link>{url}{path}</link>"
+        "<pubDate>{date}</pubDate></item>".format(
+            index=index, name=name, url=url.rstrip("/"), path=article_path(index, day),
+            date=published(day).strftime("%a, %d %b %Y %H:%M:%S +0000"))
+        for index, day in site_stories
+    )
+    return ('<?xml version="1.0" encoding="UTF-8"?><rss version="2.0"><channel><title>{}</title>'
+            "<link>{}</link>{}</channel></rss>").format(name, url, items)
+
+
+def atom_xml(name, url, site_stories):
+    entries = "".join(
+        '<entry><title>Story {index} of {name}</title><link href="{path}"/>'
+        "<published>{date}</published></entry>".format(
+            index=index, name=name, path=article_path(index, day), date=published(day).isoformat())
+        for index, day in site_stories
+    )
+    return ('<?xml version="1.0" encoding="UTF-8"?><feed xmlns="http://www.w3.org/2005/Atom">'
+            "<title>{}</title>{}</feed>").format(name, entries)
+
+
+def news_sitemap_xml(url, site_stories):
+    urls = "".join(
+        "<url><loc>{url}{path}</loc><news:news><news:publication_date>{date}</news:publication_date>"
+        "</news:news></url>".format(url=url.rstrip("/"), path=article_path(index, day),
+                                    date=published(day).isoformat())
+        for index, day in site_stories
+    )
+    return ('<?xml version="1.0" encoding="UTF-8"?><urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9" '
+            'xmlns:news="http://www.google.com/schemas/sitemap-news/0.9">{}</urlset>').format(urls)
+
+
+def sitemap_index_xml(url, today):
+    return ('<?xml version="1.0" encoding="UTF-8"?><sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'
+            "<sitemap><loc>{}news-sitemap.xml</loc><lastmod>{}</lastmod></sitemap></sitemapindex>").format(
+        url, today.isoformat())
+
+
+def article_html(name, index, day):
+    # shuffled words make every story distinct, so they are not near duplicates of each other
+    generator = random.Random("{} {}".format(name, index))
+    words = PARAGRAPH.format(date=day.isoformat(), story=index, source=name).split()
+    paragraphs = "".join(
+        "<p>" + " ".join(generator.sample(words, len(words))) + "</p>" for _ in range(8)
+    )
+    return (
+        "<html><head><title>Story {index} of {name}</title>"
+        '<meta property="article:published_time" content="{date}T08:00:00+00:00"/></head>'
+        "<body><article><h1>Story {index} of {name}</h1>{paragraphs}</article></body></html>"
+    ).format(index=index, name=name, date=day.isoformat(), paragraphs=paragraphs)
+
+
+class FixtureSite:
+    """One fake news site listening on 127.0.0.1"""
+
+    def __init__(self, name, articles=20, latency=0.0, port=0, old=0, feed=None):
+        self.name = name
+        self.articles = articles
+        self.old = old
+        self.feed = feed
+        self.latency = latency
+        self.requests = 0
+        self.not_modified = 0
+        self.bytes_sent = 0
+        self._lock = threading.Lock()
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                site.handle(self)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        return "http://127.0.0.1:{}/".format(self.server.server_address[1])
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def handle(self, request):
+        if self.latency:
+            time.sleep(self.latency)
+        today = datetime.date.today()
+        site_stories = stories(self.articles, self.old, today)
+        body = None
+        content_type = "text/html; charset=utf-8"
+        if request.path == "/":
+            body = homepage_html(self.name, site_stories, self.feed)
+        elif request.path == "/feed.xml" and self.feed:
+            body = (rss_xml if self.feed == "rss" else atom_xml)(self.name, self.url, site_stories)
+            content_type = "application/{}+xml; charset=utf-8".format(self.feed)
+        elif request.path in ("/news-sitemap.xml", "/sitemap.xml"):
+            body = news_sitemap_xml(self.url, site_stories) if request.path == "/news-sitemap.xml" else \
+                sitemap_index_xml(self.url, today)
+            content_type = "application/xml; charset=utf-8"
+        else:
+            for index, day in site_stories:
+                if request.path == article_path(index, day):
+                    body = article_html(self.name, index, day)
+                    break
+        if body is None:
+            request.send_response(404)
+            request.end_headers()
+            with self._lock:
+                self.requests += 1
+            return
+        payload = body.encode()
+        etag = '"{}"'.format(hashlib.sha1(payload).hexdigest())
+        if request.headers.get("If-None-Match") == etag:
+            request.send_response(304)
+            request.send_header("ETag", etag)
+            request.end_headers()
+            with self._lock:
+                self.requests += 1
+                self.not_modified += 1
+            return
+        request.send_response(200)
+        request.send_header("Content-Type", content_type)
+        request.send_header("Content-Length", str(len(payload)))
+        request.send_header("ETag", etag)
+        request.end_headers()
+        request.wfile.write(payload)
+        with self._lock:
+            self.requests += 1
+            self.bytes_sent += len(payload)
+
+
+def start_sites(sources=5, articles=20, latency=0.0, old=0, feed=None):
+    """
+    Start the fake sites
+    :param sources: number of sites
+    :param articles: number of articles of the day linked from each homepage
+    :param latency: delay in seconds added to every response
+    :param old: number of older articles linked from each homepage
+    :param feed: "rss" or "atom" to announce a feed on the homepages, None for none
+    :return: list of running FixtureSite
+    """
+    return [FixtureSite("Fixture {}".format(index), articles, latency, old=old, feed=feed).start()
+            for index in range(sources)]
+
+
+def as_newspapers(sites):
+    """
+    NewsPapers.json compatible mapping of the sites
+    :param sites:
+    :return:
+    """
+    return {site.name: {"link": site.url} for site in sites}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sources", type=int, default=5)
+    parser.add_argument("--articles", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--old", type=int, default=0)
+    parser.add_argument("--feed", choices=["rss", "atom"])
+    args = parser.parse_args()
+    sites = start_sites(args.sources, args.articles, args.latency, args.old, args.feed)
+    print(json.dumps(as_newspapers(sites), indent=2), flush=True)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        for site in sites:
+            site.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+HTTP load test of a running deployment of the API.
+
+Keeps --concurrency requests in flight against every --url for --duration
+seconds and prints the throughput and latency percentiles, e.g. to compare
+the WSGI deployment with the ASGI one:
+
+    gunicorn News_API.wsgi -w 4 -b 127.0.0.1:8000
+    uvicorn News_API.asgi:application --workers 4 --port 8001
+    python benchmarks/load_test.py --base http://127.0.0.1:8000 --username u --password p \\
+        --url /news/ --url /news/1/ --concurrency 200
+    python benchmarks/load_test.py --base http://127.0.0.1:8001 --username u --password p \\
+        --url /news/ --url /news/1/ --concurrency 200
+"""
+import argparse
+import asyncio
+import itertools
+import time
+
+import httpx
+
+
+def percentile(timings, fraction):
+    return timings[min(int(len(timings) * fraction), len(timings) - 1)] if timings else 0.0
+
+
+async def client_loop(client, urls, deadline, timings, errors):
+    while time.monotonic() < deadline:
+        url = next(urls)
+        start = time.perf_counter()
+        try:
+            response = await client.get(url)
+            if response.status_code >= 400:
+                errors[response.status_code] = errors.get(response.status_code, 0) + 1
+                continue
+        except httpx.HTTPError as e:
+            errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+            continue
+        timings.append(time.perf_counter() - start)
+
+
+async def run(args):
+    headers = {}
+    async with httpx.AsyncClient(base_url=args.base, timeout=args.timeout) as client:
+        if args.username:
+            response = await client.post("/api/token/", data={"username": args.username, "password": args.password})
+            response.raise_for_status()
+            headers["Authorization"] = "Bearer " + response.json()["access"]
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.base, headers=headers, timeout=args.timeout, limits=limits) as client:
+        urls = itertools.cycle(args.url)
+        timings = []
+        errors = {}
+        start = time.monotonic()
+        deadline = start + args.duration
+        await asyncio.gather(*(client_loop(client, urls, deadline, timings, errors)
+                               for _ in range(args.concurrency)))
+        elapsed = time.monotonic() - start
+    timings.sort()
+    print("{} requests in {:.1f}s, {:.1f} req/s, errors {}".format(len(timings), elapsed, len(timings) / elapsed,
+                                                                   errors or 0))
+    print("latency p50 {:.1f} ms  p95 {:.1f} ms  p99 {:.1f} ms".format(
+        percentile(timings, 0.5) * 1000, percentile(timings, 0.95) * 1000, percentile(timings, 0.99) * 1000))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base", default="http://127.0.0.1:8000")
+    parser.add_argument("--url", action="append", required=True, help="path to request, repeat for several")
+    parser.add_argument("--username")
+    parser.add_argument("--password")
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Near duplicate lookup against a large fingerprint index.
+
+Fills the ArticleFingerprint table with --count random fingerprints, then
+times stored_near_duplicates() for single articles, half of them a few bits
+away from a stored fingerprint, and checks that those are found.
+
+    python benchmarks/near_duplicate_lookup.py --count 1000000
+"""
+import argparse
+import random
+import time
+
+import django_env
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=200000)
+    parser.add_argument("--lookups", type=int, default=1000)
+    parser.add_argument("--use-default-db", action="store_true")
+    args = parser.parse_args()
+
+    django_env.setup(args.use_default_db)
+    from django.db import transaction
+
+    from news_api_app.models import ArticleFingerprint, News
+    from news_api_app.simhash import bands, max_distance, stored_near_duplicates, to_signed
+
+    generator = random.Random(0)
+    start = time.perf_counter()
+    first_id = (News.objects.order_by('-id').values_list('id', flat=True).first() or 0) + 1
+    stored = []
+    batch_size = 5000
+    with transaction.atomic():
+        for offset in range(0, args.count, batch_size):
+            ids = range(first_id + offset, first_id + min(offset + batch_size, args.count))
+            News.objects.bulk_create([
+                News(id=news_id, title="", details="", date="2020-01-01", news_from="bench",
+                     news_url="bench://{}".format(news_id), url_hash="{:064x}".format(news_id))
+                for news_id in ids
+            ])
+            fingerprints = []
+            for news_id in ids:
+                fingerprint = generator.getrandbits(64)
+                stored.append(fingerprint)
+                band0, band1, band2, band3 = bands(fingerprint)
+                fingerprints.append(ArticleFingerprint(news_id=news_id, simhash=to_signed(fingerprint), band0=band0,
+                                                       band1=band1, band2=band2, band3=band3))
+            ArticleFingerprint.objects.bulk_create(fingerprints)
+    print("indexed {} fingerprints in {:.1f}s".format(args.count, time.perf_counter() - start))
+
+    timings = []
+    found = 0
+    for index in range(args.lookups):
+        if index % 2:
+            fingerprint = generator.choice(stored)
+            for bit in generator.sample(range(64), max_distance()):
+                fingerprint ^= 1 << bit
+        else:
+            fingerprint = generator.getrandbits(64)
+        start = time.perf_counter()
+        if stored_near_duplicates([fingerprint]):
+            found += 1
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    print("{} lookups, {} near duplicates found (expected ~{})".format(args.lookups, found, args.lookups // 2))
+    print("p50 {:.2f} ms  p99 {:.2f} ms".format(timings[len(timings) // 2] * 1000,
+                                               timings[int(len(timings) * 0.99)] * 1000))
+
+
+if __name__ == "__main__":
+    main()
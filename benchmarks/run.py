@@ -0,0 +1,265 @@
+"""
+Latency, throughput and queries per request of every endpoint.
+
+Seeds --count synthetic news (in-memory SQLite by default, --use-default-db
+for the database of the settings, e.g. a local PostgreSQL), obtains a JWT
+through api/token/ and sends --requests requests to every endpoint through
+the Django test client. bulk-news/ queues a scrape job which is then run
+against local fixture sites. The results are printed and written as JSON,
+--compare fails (exit status 1) when an endpoint got slower or runs more
+queries than in a previous result file.
+
+    python benchmarks/run.py --count 10000 --output results.json
+    python benchmarks/run.py --count 10000 --compare results.json --tolerance 0.25
+"""
+import argparse
+import datetime
+import json
+import platform
+import random
+import sys
+import tempfile
+import time
+
+import django_env
+
+METRICS = ("p50_ms", "p95_ms", "p99_ms")
+
+
+def percentile(timings, fraction):
+    return timings[min(int(len(timings) * fraction), len(timings) - 1)] if timings else 0.0
+
+
+def summarize(timings, queries, errors):
+    """
+    Statistics of the requests of one endpoint
+    :param timings: seconds of every request
+    :param queries: number of queries of every request
+    :param errors: number of unexpected status codes
+    :return:
+    """
+    total = sum(timings)
+    timings = sorted(timings)
+    return {
+        "requests": len(timings),
+        "errors": errors,
+        "p50_ms": round(percentile(timings, 0.5) * 1000, 3),
+        "p95_ms": round(percentile(timings, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(timings, 0.99) * 1000, 3),
+        "throughput_rps": round(len(timings) / total, 1) if total else 0.0,
+        "queries_per_request": round(sum(queries) / len(queries), 2) if queries else 0.0,
+    }
+
+
+class Bench:
+    """Authenticated test client measuring every request"""
+
+    def __init__(self, client, token):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        self.client = client
+        self.headers = {"HTTP_AUTHORIZATION": "Bearer " + token}
+        self.capture = lambda: CaptureQueriesContext(connection)
+
+    def measure(self, count, request, expected, warmup=0):
+        """
+        Send count requests
+        :param count:
+        :param request: callable(client, index, headers) sending request number index
+        :param expected: expected status codes
+        :param warmup: requests sent first and not measured
+        :return: summary of the requests
+        """
+        for index in range(warmup):
+            request(self.client, index, self.headers)
+        timings, queries, errors = [], [], 0
+        for index in range(count):
+            with self.capture() as captured:
+                start = time.perf_counter()
+                response = request(self.client, index, self.headers)
+                timings.append(time.perf_counter() - start)
+            queries.append(len(captured))
+            if response.status_code not in expected:
+                errors += 1
+        return summarize(timings, queries, errors)
+
+
+def run_endpoints(args):
+    from django.contrib.auth.models import User
+    from django.test import Client
+
+    from news_api_app.models import News
+    from news_api_app.pagination import encode_cursor
+
+    generator = random.Random(args.seed)
+    User.objects.filter(username="bench").delete()
+    User.objects.create_user("bench", password="bench")
+    client = Client()
+    token = json.loads(client.post("/api/token/", {"username": "bench", "password": "bench"}).content)["access"]
+    bench = Bench(client, token)
+    ids = list(News.objects.values_list("id", flat=True))
+    keys = list(News.objects.values_list("date", "id"))
+    words = django_env.WORDS
+    run_id = int(time.time())
+
+    def news_item(index, prefix):
+        return {"title": "Benchmark {} {}".format(prefix, index), "details": " ".join(
+            generator.choice(words) for _ in range(200)), "date": "2020-01-01", "news_from": "Benchmark",
+            "news_url": "https://benchmark.example.com/{}/{}/{}".format(run_id, prefix, index)}
+
+    created = []
+
+    def post_news(client, index, headers):
+        response = client.post("/news/", json.dumps(news_item(index, "single")), content_type="application/json",
+                               **headers)
+        created.append(index)
+        return response
+
+    news_ids = {}
+
+    def put_news(client, index, headers):
+        if not news_ids:
+            news_ids.update(News.objects.filter(news_from="Benchmark", title__startswith="Benchmark single")
+                            .values_list("title", "id"))
+        item = news_item(index % len(created), "single")
+        return client.put("/news/{}/".format(news_ids[item["title"]]), json.dumps(item),
+                          content_type="application/json", **headers)
+
+    def delete_news(client, index, headers):
+        return client.delete("/news/{}/".format(news_ids["Benchmark single {}".format(index)]), **headers)
+
+    # name, request, expected status codes, number of requests, warm up requests (read only endpoints)
+    endpoints = [
+        ("GET news/", lambda client, index, headers: client.get("/news/", {
+            "cursor": encode_cursor(*generator.choice(keys)) if index % 4 else ""}, **headers), (200,),
+         args.requests, args.warmup),
+        ("GET news/<id>/", lambda client, index, headers: client.get(
+            "/news/{}/".format(generator.choice(ids)), **headers), (200,), args.requests, args.warmup),
+        ("POST news-filter/", lambda client, index, headers: client.post("/news-filter/", json.dumps({
+            "keyword": " ".join(generator.sample(words, 2))}), content_type="application/json", **headers), (200,),
+         args.requests, args.warmup),
+        ("POST news/", post_news, (201,), args.requests, 0),
+        ("PUT news/<id>/", put_news, (200,), args.requests, 0),
+        ("DELETE news/<id>/", delete_news, (204,), args.requests, 0),
+        ("POST news/batch/", lambda client, index, headers: client.post("/news/batch/", json.dumps([
+            news_item(index * 50 + item, "batch") for item in range(50)]), content_type="application/json",
+            **headers), (200,), max(args.requests // 10, 1), 0),
+    ]
+    results = {}
+    for name, request, expected, count, warmup in endpoints:
+        results[name] = bench.measure(count, request, expected, warmup)
+        print_result(name, results[name])
+    results["POST bulk-news/"] = run_scrape(args, bench)
+    print_result("POST bulk-news/", results["POST bulk-news/"])
+    return results
+
+
+def run_scrape(args, bench):
+    """
+    Queue scrape jobs through bulk-news/ and run them against fixture sites
+    :return: summary of the jobs, the latency is from the request to the end of the job
+    """
+    from django.conf import settings
+
+    from benchmarks.fixture_server import as_newspapers, start_sites
+    from news_api_app.jobs import claim_next_job, run_job
+
+    sites = start_sites(args.sources, args.articles)
+    with tempfile.NamedTemporaryFile("w", suffix=".json") as papers:
+        json.dump({name: dict(value, limit=args.articles) for name, value in as_newspapers(sites).items()}, papers)
+        papers.flush()
+        settings.NEWS_PAPERS_FILE = papers.name
+
+        def scrape(client, index, headers):
+            response = client.post("/bulk-news/", **headers)
+            run_job(claim_next_job())
+            return response
+
+        try:
+            return bench.measure(args.scrapes, scrape, (202,))
+        finally:
+            for site in sites:
+                site.stop()
+
+
+def print_result(name, result):
+    print("{:<20} {:>6} req {:>3} err  p50 {:>8.2f} ms  p95 {:>8.2f} ms  p99 {:>8.2f} ms {:>8.1f} req/s "
+          "{:>6.2f} queries".format(name, result["requests"], result["errors"], result["p50_ms"], result["p95_ms"],
+                                    result["p99_ms"], result["throughput_rps"], result["queries_per_request"]))
+
+
+def compare(results, baseline, tolerance):
+    """
+    Find the regressions against a previous run
+    :param results: endpoints of this run
+    :param baseline: endpoints of the previous run
+    :param tolerance: allowed relative slow down of the percentiles
+    :return: list of messages
+    """
+    regressions = []
+    for name, before in baseline.items():
+        after = results.get(name)
+        if after is None:
+            continue
+        for metric in METRICS:
+            if after[metric] > before[metric] * (1 + tolerance):
+                regressions.append("{} {} {:.2f} -> {:.2f}".format(name, metric, before[metric], after[metric]))
+        if after["queries_per_request"] > before["queries_per_request"]:
+            regressions.append("{} queries_per_request {} -> {}".format(
+                name, before["queries_per_request"], after["queries_per_request"]))
+        if after["errors"] > before["errors"]:
+            regressions.append("{} errors {} -> {}".format(name, before["errors"], after["errors"]))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=10000, help="news in the database")
+    parser.add_argument("--requests", type=int, default=200, help="requests per endpoint")
+    parser.add_argument("--warmup", type=int, default=5, help="unmeasured requests to the read endpoints")
+    parser.add_argument("--scrapes", type=int, default=3, help="scrape jobs queued through bulk-news/")
+    parser.add_argument("--sources", type=int, default=3, help="fixture sites of the scrape jobs")
+    parser.add_argument("--articles", type=int, default=10, help="articles of every fixture site")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--use-default-db", action="store_true")
+    parser.add_argument("--output", help="write the results to this json file")
+    parser.add_argument("--compare", help="json file of a previous run to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative slow down")
+    args = parser.parse_args()
+
+    django_env.setup(args.use_default_db)
+    from django.db import connection
+
+    from news_api_app.models import News
+
+    start = time.perf_counter()
+    missing = args.count - News.objects.count()
+    if missing > 0:
+        django_env.seed_news(missing, args.seed)
+    print("{} news in the database, seeded in {:.1f}s".format(News.objects.count(), time.perf_counter() - start))
+
+    results = {
+        "meta": {
+            "date": datetime.datetime.now().isoformat(timespec="seconds"),
+            "count": args.count,
+            "requests": args.requests,
+            "database": connection.vendor,
+            "python": platform.python_version(),
+        },
+        "endpoints": run_endpoints(args),
+    }
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(results, output, indent=2)
+    if args.compare:
+        with open(args.compare) as previous:
+            regressions = compare(results["endpoints"], json.load(previous)["endpoints"], args.tolerance)
+        for regression in regressions:
+            print("REGRESSION " + regression)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
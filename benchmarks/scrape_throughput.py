@@ -0,0 +1,60 @@
+"""
+Scraper throughput against the local fixture sites.
+
+Runs ScrapeEngine once sequentially (one worker, parsing inline) and once with
+the configured concurrency, and prints articles per second for both.
+
+    python benchmarks/scrape_throughput.py --sources 5 --articles 20 --latency 0.1
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'News_API.settings')
+
+import django  # noqa: E402
+
+django.setup()
+
+from benchmarks.fixture_server import as_newspapers, start_sites  # noqa: E402
+from news_api_app.scraper import ScrapeEngine  # noqa: E402
+
+
+def run(engine, sources, limit):
+    start = time.perf_counter()
+    articles, stats = engine.scrape(sources, limit)
+    elapsed = time.perf_counter() - start
+    failed = sum(source["failed"] for source in stats.values())
+    return len(articles), failed, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sources", type=int, default=5)
+    parser.add_argument("--articles", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.1)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--per-host", type=int, default=None)
+    parser.add_argument("--parse-processes", type=int, default=None)
+    args = parser.parse_args()
+
+    sites = start_sites(args.sources, args.articles, args.latency)
+    sources = as_newspapers(sites)
+    try:
+        engines = [
+            ("sequential", ScrapeEngine(max_workers=1, per_host=1, parse_processes=0)),
+            ("concurrent", ScrapeEngine(args.workers, args.per_host, args.parse_processes)),
+        ]
+        for label, engine in engines:
+            count, failed, elapsed = run(engine, sources, args.articles)
+            print("{:<11} {:>5} articles {:>3} failed {:>8.2f}s {:>8.1f} articles/s".format(
+                label, count, failed, elapsed, count / elapsed if elapsed else 0.0))
+    finally:
+        for site in sites:
+            site.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+NewsSerializer against the NewsRowSerializer fast path.
+
+For every size the benchmark renders the same rows to JSON bytes through
+NewsSerializer(many=True) + JSONRenderer and through values_list() +
+NewsRowSerializer + render_json, checks that the bytes are identical and
+prints both timings.
+
+    python benchmarks/serializer_benchmark.py --sizes 1000 10000 100000
+"""
+import argparse
+import time
+
+import django_env
+
+
+def best_of(repeat, function):
+    timings = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--use-default-db", action="store_true")
+    args = parser.parse_args()
+
+    django_env.setup(args.use_default_db)
+    from rest_framework.renderers import JSONRenderer
+
+    from news_api_app.models import News
+    from news_api_app.serializers import NewsRowSerializer, NewsSerializer, render_json
+
+    row_serializer = NewsRowSerializer()
+    print("{:>8} {:>14} {:>14} {:>8}".format("rows", "serializer s", "fast path s", "speedup"))
+    for size in sorted(args.sizes):
+        missing = size - News.objects.count()
+        if missing > 0:
+            django_env.seed_news(missing)
+
+        # a new queryset on every call, a reused one would serve its cached rows
+        def drf():
+            queryset = News.objects.order_by('-date', '-id')[:size]
+            return JSONRenderer().render(NewsSerializer(queryset, many=True, fields=row_serializer.fields).data)
+
+        def fast():
+            queryset = News.objects.order_by('-date', '-id')[:size]
+            return render_json(row_serializer.many(queryset.values_list(*row_serializer.row_fields)))
+
+        drf_seconds, drf_bytes = best_of(args.repeat, drf)
+        fast_seconds, fast_bytes = best_of(args.repeat, fast)
+        assert drf_bytes == fast_bytes, "fast path output differs from NewsSerializer"
+        print("{:>8} {:>14.3f} {:>14.3f} {:>7.1f}x".format(size, drf_seconds, fast_seconds, drf_seconds / fast_seconds))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+Cold start of an API worker: import time, resident memory and modules.
+
+Starts fresh interpreters with ``python -X importtime`` which set Django up,
+build the WSGI application and import the url configuration, as a worker
+does before serving its first request. Prints the best of --repeat runs and
+the slowest imports, and exits with status 1 when the import time or the
+memory is over budget or when one of the --forbid modules (the scraper
+stack, which only the scrape worker needs) was imported. Run it from CI:
+
+    python benchmarks/startup.py --budget-ms 1500 --max-rss-mb 120
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FORBIDDEN = ("newspaper", "lxml", "nltk", "PIL", "httpx")
+WORKER = """
+import json, resource, sys
+import django
+django.setup()
+from django.conf import settings
+from django.core.wsgi import get_wsgi_application
+from django.utils.module_loading import import_module
+get_wsgi_application()
+import_module(settings.ROOT_URLCONF)
+print(json.dumps({
+    "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    "modules": sorted(sys.modules),
+}))
+"""
+
+
+def parse_importtime(stderr):
+    """
+    Import timings of python -X importtime
+    :param stderr: output of the interpreter
+    :return: list of (cumulative microseconds, depth, module)
+    """
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        imports.append((int(cumulative), (len(name) - len(name.lstrip())) // 2, name.strip()))
+    return imports
+
+
+def measure(settings_module):
+    """
+    Start one worker
+    :param settings_module: DJANGO_SETTINGS_MODULE of the worker
+    :return: {"import_ms", "max_rss_mb", "modules", "imports"}
+    """
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE=settings_module,
+               PYTHONPATH=os.pathsep.join(filter(None, [ROOT, os.environ.get("PYTHONPATH")])))
+    process = subprocess.run([sys.executable, "-X", "importtime", "-c", WORKER], cwd=ROOT, env=env,
+                             capture_output=True, text=True)
+    if process.returncode != 0:
+        raise RuntimeError(process.stderr[-2000:])
+    worker = json.loads(process.stdout.splitlines()[-1])
+    imports = parse_importtime(process.stderr)
+    return {
+        # the top level imports hold the time of everything they import
+        "import_ms": sum(cumulative for cumulative, depth, _ in imports if depth == 0) / 1000,
+        "max_rss_mb": worker["max_rss_kb"] / 1024,
+        "modules": worker["modules"],
+        "imports": imports,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--settings", default=os.environ.get("DJANGO_SETTINGS_MODULE", "News_API.settings"))
+    parser.add_argument("--repeat", type=int, default=5, help="workers started, the best one is kept")
+    parser.add_argument("--top", type=int, default=15, help="slowest imports printed")
+    parser.add_argument("--budget-ms", type=float, help="fail when the import time is higher")
+    parser.add_argument("--max-rss-mb", type=float, help="fail when the resident memory is higher")
+    parser.add_argument("--forbid", nargs="*", default=list(FORBIDDEN),
+                        help="fail when one of these modules is imported")
+    args = parser.parse_args()
+
+    runs = [measure(args.settings) for _ in range(args.repeat)]
+    best = min(runs, key=lambda run: run["import_ms"])
+    print("import time {:.1f} ms (best of {}), max RSS {:.1f} MB, {} modules".format(
+        best["import_ms"], args.repeat, min(run["max_rss_mb"] for run in runs), len(best["modules"])))
+    for cumulative, depth, name in sorted(best["imports"], reverse=True)[:args.top]:
+        print("{:>10.1f} ms  {}{}".format(cumulative / 1000, "  " * depth, name))
+
+    failures = []
+    if args.budget_ms is not None and best["import_ms"] > args.budget_ms:
+        failures.append("import time {:.1f} ms over the budget of {} ms".format(best["import_ms"], args.budget_ms))
+    max_rss_mb = min(run["max_rss_mb"] for run in runs)
+    if args.max_rss_mb is not None and max_rss_mb > args.max_rss_mb:
+        failures.append("max RSS {:.1f} MB over the budget of {} MB".format(max_rss_mb, args.max_rss_mb))
+    imported = sorted(module for module in args.forbid if module in best["modules"])
+    if imported:
+        failures.append("imported at startup: " + ", ".join(imported))
+    for failure in failures:
+        print("FAILED " + failure)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Latency and memory of the keyword suggestion index.
+
+Indexes --count synthetic news whose words follow a Zipf distribution over a
+vocabulary of --vocabulary words, then times SuggestIndex.suggest() for
+random prefixes of 1 to 4 letters, and while news are being added and
+deleted between the lookups.
+
+    python benchmarks/suggest_latency.py --count 200000 --vocabulary 300000
+"""
+import argparse
+import itertools
+import random
+import string
+import time
+import tracemalloc
+
+import django_env
+
+
+def percentiles(timings):
+    timings = sorted(timings)
+    return timings[len(timings) // 2] * 1e6, timings[int(len(timings) * 0.99)] * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=50000)
+    parser.add_argument("--vocabulary", type=int, default=200000)
+    parser.add_argument("--max-terms", type=int, default=100000)
+    parser.add_argument("--lookups", type=int, default=5000)
+    args = parser.parse_args()
+
+    django_env.setup()
+    from news_api_app.suggest import SuggestIndex
+
+    generator = random.Random(0)
+    vocabulary = ["".join(generator.choice(string.ascii_lowercase) for _ in range(generator.randint(4, 11)))
+                  for _ in range(args.vocabulary)]
+    weights = list(itertools.accumulate(1 / rank for rank in range(1, len(vocabulary) + 1)))
+
+    def text(words):
+        return " ".join(generator.choices(vocabulary, cum_weights=weights, k=words))
+
+    documents = [(text(10), text(300)) for _ in range(args.count)]
+
+    def build():
+        index = SuggestIndex(max_terms=args.max_terms)
+        for news_id, (title, details) in enumerate(documents):
+            index.add(news_id, title, details)
+        index.warm()
+        return index
+
+    # built again under tracemalloc for the memory, which slows it down
+    tracemalloc.start()
+    traced = build()
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del traced
+    start = time.perf_counter()
+    index = build()
+    print("indexed {} news in {:.1f}s, {} terms, {:.1f} MB".format(args.count, time.perf_counter() - start,
+                                                                   len(index), memory / 2 ** 20))
+
+    prefixes = ["".join(generator.choice(string.ascii_lowercase) for _ in range(generator.randint(1, 4)))
+                for _ in range(args.lookups)]
+    timings = []
+    for prefix in prefixes:
+        start = time.perf_counter()
+        index.suggest(prefix, 10)
+        timings.append(time.perf_counter() - start)
+    print("suggest        p50 {:.0f} us  p99 {:.0f} us".format(*percentiles(timings)))
+
+    timings = []
+    for news_id, prefix in enumerate(prefixes, start=args.count):
+        index.add(news_id, *documents[news_id % args.count])
+        index.remove(news_id - args.count)
+        start = time.perf_counter()
+        index.suggest(prefix, 10)
+        timings.append(time.perf_counter() - start)
+    print("with writes    p50 {:.0f} us  p99 {:.0f} us".format(*percentiles(timings)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1 @@
+default_app_config = 'news_api_app.apps.NewsApiAppConfig'
@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class NewsApiAppConfig(AppConfig):
     name = 'news_api_app'
+
+    def ready(self):
+        # connect the signal receivers
+        from . import cache, changes, metrics, rollup, routers, search, signals, simhash  # noqa: F401
@@ -0,0 +1,147 @@
+import datetime
+import os
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from .db import create_range_partition, is_postgresql
+from .export import EXPORT_FIELDS, buffered, gzipped, ndjson_lines
+from .ingest import delete_news
+from .models import News, NewsArchive
+
+# news moved per transaction
+BATCH_SIZE = 1000
+
+
+def archive_cutoff(today=None):
+    """
+    News published before this date belong to the archive
+    :param today:
+    :return:
+    """
+    today = today or datetime.date.today()
+    return today - datetime.timedelta(days=getattr(settings, 'NEWS_ARCHIVE_AFTER_DAYS', 90))
+
+
+def month_start(date):
+    return date.replace(day=1)
+
+
+def add_months(month, count):
+    """
+    :param month: first day of a month
+    :param count: months to add, may be negative
+    :return: first day of the month count months later
+    """
+    index = month.year * 12 + month.month - 1 + count
+    return datetime.date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month):
+    return '{}_y{:04d}m{:02d}'.format(NewsArchive._meta.db_table, month.year, month.month)
+
+
+def create_partitions(first_month, last_month):
+    """
+    Create the monthly partitions of the archive from first_month to
+    last_month included, only PostgreSQL partitions the archive
+    :param first_month: first day of a month
+    :param last_month: first day of a month
+    :return: names of the partitions, existing ones included
+    """
+    if not is_postgresql(connection):
+        return []
+    names = []
+    month = first_month
+    while month <= last_month:
+        create_range_partition(connection, NewsArchive._meta.db_table, partition_name(month), month.isoformat(),
+                               add_months(month, 1).isoformat())
+        names.append(partition_name(month))
+        month = add_months(month, 1)
+    return names
+
+
+def create_partitions_ahead(months_ahead=None, today=None):
+    """
+    Create the partitions the archive will need for the next months_ahead
+    months, so moving the news never waits for a CREATE TABLE
+    :param months_ahead: NEWS_ARCHIVE_MONTHS_AHEAD when None
+    :param today:
+    :return: names of the partitions
+    """
+    if months_ahead is None:
+        months_ahead = getattr(settings, 'NEWS_ARCHIVE_MONTHS_AHEAD', 3)
+    first_month = month_start(archive_cutoff(today))
+    return create_partitions(first_month, add_months(first_month, months_ahead))
+
+
+def archive_news(before, batch_size=BATCH_SIZE):
+    """
+    Move the news published before the given date to the archive, oldest
+    first, one transaction per batch. A news whose url is already archived
+    is only deleted.
+    :param before: date
+    :param batch_size:
+    :return: (number of news archived, number of news deleted as already archived)
+    """
+    oldest = News.objects.filter(date__lt=before).order_by('date').values_list('date', flat=True).first()
+    if oldest is None:
+        return 0, 0
+    create_partitions(month_start(oldest), month_start(before))
+    archived = duplicates = 0
+    while True:
+        with transaction.atomic():
+            rows = list(News.objects.filter(date__lt=before).order_by('date', 'id').values_list(
+                'id', 'title', 'details', 'date', 'news_from', 'news_url', 'url_hash')[:batch_size])
+            if not rows:
+                return archived, duplicates
+            stored = set(NewsArchive.objects.filter(url_hash__in=[row[6] for row in rows]).values_list(
+                'url_hash', flat=True))
+            NewsArchive.objects.bulk_create([
+                NewsArchive(id=id_, title=title, details=details, date=date, news_from=news_from,
+                            news_url=news_url, url_hash=hash_)
+                for id_, title, details, date, news_from, news_url, hash_ in rows if hash_ not in stored
+            ])
+            # without the per row post_delete, the move is announced once as archived
+            delete_news([
+                News(id=id_, title=title, details=details, date=date, news_from=news_from, news_url=news_url,
+                     url_hash=hash_)
+                for id_, title, details, date, news_from, news_url, hash_ in rows
+            ], archived=True)
+        duplicates += sum(1 for row in rows if row[6] in stored)
+        archived += len(rows)
+
+
+def archived_months(before):
+    """
+    Months of the archive holding news published before the given month
+    :param before: first day of a month
+    :return: list of first days of a month, oldest first
+    """
+    return list(NewsArchive.objects.filter(date__lt=before).dates('date', 'month'))
+
+
+def export_month(month, directory):
+    """
+    Write the archived news of a month to a gzipped NDJSON file, in the
+    format of the export endpoint, and remove them from the archive. On
+    PostgreSQL the partition of the month is dropped.
+    :param month: first day of a month
+    :param directory:
+    :return: path of the file
+    """
+    path = os.path.join(directory, 'news-{:04d}-{:02d}.ndjson.gz'.format(month.year, month.month))
+    rows = NewsArchive.objects.filter(date__gte=month, date__lt=add_months(month, 1)).order_by(
+        'date', 'id').values_list(*EXPORT_FIELDS).iterator(chunk_size=BATCH_SIZE)
+    # written aside first, a failed export leaves no truncated file behind
+    with open(path + '.tmp', 'wb') as output:
+        for chunk in gzipped(buffered(ndjson_lines(rows))):
+            output.write(chunk)
+    os.replace(path + '.tmp', path)
+    with transaction.atomic():
+        if is_postgresql(connection):
+            with connection.cursor() as cursor:
+                cursor.execute('DROP TABLE IF EXISTS {}'.format(connection.ops.quote_name(partition_name(month))))
+        else:
+            NewsArchive.objects.filter(date__gte=month, date__lt=add_months(month, 1)).delete()
+    return path
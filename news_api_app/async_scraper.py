@@ -0,0 +1,150 @@
+import asyncio
+import time
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import urlsplit
+
+import httpx
+from asgiref.sync import async_to_sync, sync_to_async
+
+from .scraper import ScrapeEngine, parse_article, timed
+
+
+class AsyncSourceLimit:
+    """SourceLimit for coroutines, the requests are spaced by 1 / rps seconds"""
+
+    def __init__(self, max_concurrency=None, rps=None):
+        self._semaphore = asyncio.Semaphore(max_concurrency) if max_concurrency else None
+        self.interval = 1.0 / rps if rps else 0.0
+        self._next_request = 0.0
+
+    async def wait_turn(self):
+        if not self.interval:
+            return
+        now = time.monotonic()
+        start = max(now, self._next_request)
+        self._next_request = start + self.interval
+        if start > now:
+            await asyncio.sleep(start - now)
+
+    async def __aenter__(self):
+        if self._semaphore is not None:
+            await self._semaphore.acquire()
+        await self.wait_turn()
+
+    async def __aexit__(self, *exc_info):
+        if self._semaphore is not None:
+            self._semaphore.release()
+
+
+class AsyncScrapeEngine(ScrapeEngine):
+    """
+    ScrapeEngine downloading with httpx on an event loop, one coroutine per
+    page instead of one thread. The article urls of a source without feed
+    are still extracted from its homepage by newspaper (which downloads the
+    categories) in a thread, the parsing runs in the process pool and the
+    database work of the fetch cache and known_urls in the thread calling scrape.
+    """
+
+    def scrape(self, sources, limit, progress=None):
+        return async_to_sync(self.scrape_async)(sources, limit, progress)
+
+    async def fetch_async(self, client, url, cached, source_limit):
+        """
+        Non blocking fetch
+        :param client: httpx.AsyncClient
+        :param url:
+        :param cached: fetch cache entry of the url or None
+        :param source_limit: AsyncSourceLimit of the source of the page
+        :return: see ScrapeEngine.fetch
+        """
+        async with source_limit, self._host_limit(url):
+            response = await client.get(url, headers=self.request_headers(cached))
+        return self.fetch_result(response.status_code, response.content, response.text, response.headers, cached)
+
+    async def discover_async(self, client, link, feeds, cached, source_limit):
+        """
+        Non blocking discover, see ScrapeEngine.discovery
+        :return: (pages, entries)
+        """
+        steps = self.discovery(link, feeds, cached)
+        try:
+            url = next(steps)
+            while True:
+                try:
+                    page = await self.fetch_async(client, url, cached.get(url), source_limit)
+                except Exception as e:
+                    url = steps.throw(e)
+                else:
+                    url = steps.send(page)
+        except StopIteration as stop:
+            pages, entries = stop.value
+        if entries is None:
+            return await asyncio.get_event_loop().run_in_executor(None, self.homepage_entries, link, pages, cached)
+        return pages, entries
+
+    def _host_limit(self, url):
+        host = urlsplit(url).netloc.lower()
+        limit = self._host_limits.get(host)
+        if limit is None:
+            limit = self._host_limits[host] = AsyncSourceLimit(self.per_host)
+        return limit
+
+    async def scrape_async(self, sources, limit, progress=None):
+        """
+        Coroutine of scrape, see ScrapeEngine.scrape
+        :return: (articles, stats)
+        """
+        stats = self.new_stats(sources)
+        articles = []
+        self._host_limits = {}
+        await sync_to_async(self.fetch_cache.load, thread_sensitive=True)(
+            [value['link'] for value in sources.values()])
+        parse_pool = ProcessPoolExecutor(self.parse_processes) if self.parse_processes != 0 else None
+        try:
+            limits = httpx.Limits(max_connections=self.max_workers)
+            async with httpx.AsyncClient(timeout=self.timeout, limits=limits, follow_redirects=True) as client:
+                await asyncio.gather(*(
+                    self._scrape_source(client, parse_pool, name, value, value.get('limit', limit), stats[name],
+                                        articles, progress)
+                    for name, value in sources.items()
+                ))
+        finally:
+            if parse_pool is not None:
+                parse_pool.shutdown()
+        await sync_to_async(self.fetch_cache.save, thread_sensitive=True)()
+        return articles, stats
+
+    async def _scrape_source(self, client, parse_pool, name, value, limit, source_stats, articles, progress):
+        source_limit = AsyncSourceLimit(value.get('max_concurrency'), value.get('rps'))
+        link, feeds = value['link'], value.get('feeds', [])
+        try:
+            cached = await sync_to_async(self.cached_pages, thread_sensitive=True)(link, feeds)
+            start = time.perf_counter()
+            pages, entries = await self.discover_async(client, link, feeds, cached, source_limit)
+            source_stats["fetch_seconds"] += time.perf_counter() - start
+            article_urls = await sync_to_async(self.discovered, thread_sensitive=True)(
+                link, pages, entries, limit, source_stats)
+        except Exception:
+            source_stats["failed"] += 1
+            article_urls = []
+        await asyncio.gather(*(
+            self._scrape_article(client, parse_pool, name, url, source_limit, source_stats, articles)
+            for url in article_urls
+        ))
+        if progress is not None:
+            await sync_to_async(progress, thread_sensitive=True)(name, source_stats)
+
+    async def _scrape_article(self, client, parse_pool, name, url, source_limit, source_stats, articles):
+        loop = asyncio.get_event_loop()
+        try:
+            start = time.perf_counter()
+            page = await self.fetch_async(client, url, self.fetch_cache.get(url), source_limit)
+            source_stats["fetch_seconds"] += time.perf_counter() - start
+            if not self.downloaded(name, url, page, source_stats, articles):
+                return
+            article, seconds = await loop.run_in_executor(parse_pool, timed, parse_article, url, page["html"])
+        except Exception:
+            source_stats["failed"] += 1
+            return
+        source_stats["parse_seconds"] += seconds
+        self.parsed(name, url, page, article, source_stats, articles)
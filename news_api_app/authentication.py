@@ -0,0 +1,144 @@
+import datetime
+import hashlib
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings
+
+from .cache import LRUCache
+from .models import RevokedToken
+
+
+def auth_cache_config():
+    return getattr(settings, 'NEWS_AUTH_CACHE', {})
+
+
+# verified tokens of this worker: sha256 of the raw token -> (user, validated token, monotonic time of the user
+# lookup)
+_token_cache = LRUCache(auth_cache_config().get('MAX_ENTRIES', 10000), auth_cache_config().get('TIMEOUT', 300))
+
+
+def token_id(validated_token):
+    return validated_token.get(api_settings.JTI_CLAIM) or hashlib.sha256(str(validated_token).encode()).hexdigest()
+
+
+def seconds_to_expiry(validated_token):
+    return validated_token['exp'] - time.time()
+
+
+class RevocationList:
+    """
+    Ids of the revoked tokens not expired yet, stored in the RevokedToken
+    table and held by every worker, which reads them again at most every
+    REVOCATION_CHECK_SECONDS of NEWS_AUTH_CACHE. A revocation is refused at
+    once by its worker and by the others within that delay.
+    """
+
+    def __init__(self):
+        # token id -> expiry timestamp
+        self._revoked = {}
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def _is_stale(self):
+        return (self._loaded_at is None or
+                time.monotonic() - self._loaded_at >= auth_cache_config().get('REVOCATION_CHECK_SECONDS', 2))
+
+    def _load(self):
+        with self._lock:
+            if not self._is_stale():
+                return
+            rows = RevokedToken.objects.filter(expires_at__gt=timezone.now()).values_list('jti', 'expires_at')
+            self._revoked = {jti: expires_at.timestamp() for jti, expires_at in rows}
+            self._loaded_at = time.monotonic()
+
+    def revoke(self, validated_token):
+        """
+        Refuse a token until it expires
+        :param validated_token:
+        :return:
+        """
+        jti = token_id(validated_token)
+        expires_at = validated_token['exp']
+        with transaction.atomic():
+            # the list only holds live tokens
+            RevokedToken.objects.filter(expires_at__lte=timezone.now()).delete()
+            RevokedToken.objects.get_or_create(jti=jti, defaults={
+                'expires_at': datetime.datetime.fromtimestamp(expires_at, datetime.timezone.utc)})
+        with self._lock:
+            self._revoked[jti] = expires_at
+
+    def is_revoked(self, validated_token):
+        if self._is_stale():
+            self._load()
+        expires_at = self._revoked.get(token_id(validated_token))
+        return expires_at is not None and expires_at > time.time()
+
+
+revocation_list = RevocationList()
+
+
+def revoke_token(validated_token):
+    revocation_list.revoke(validated_token)
+
+
+def is_revoked(validated_token):
+    return revocation_list.is_revoked(validated_token)
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication verifying a token and looking its user up once, the
+    result is kept in a bounded in-process cache for NEWS_AUTH_CACHE TIMEOUT
+    seconds at most and never past the expiry of the token. The user is
+    looked up again at most every USER_CHECK_SECONDS, so a user deactivated
+    or deleted by another worker is refused within that delay. Every request
+    is still checked against the revocation list, held in memory and read
+    again from the database every few seconds.
+    """
+
+    def authenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+
+        key = hashlib.sha256(raw_token).hexdigest()
+        entry = _token_cache.get(key)
+        if entry is None or seconds_to_expiry(entry[1]) <= 0:
+            validated_token = self.get_validated_token(raw_token)
+            entry = (self.get_user(validated_token), validated_token, time.monotonic())
+            _token_cache.set(key, entry, min(_token_cache.timeout, seconds_to_expiry(validated_token)))
+        elif time.monotonic() - entry[2] >= auth_cache_config().get('USER_CHECK_SECONDS', 2):
+            # one query by primary key, get_user refuses a deactivated or deleted user
+            _token_cache.delete(key)
+            entry = (self.get_user(entry[1]), entry[1], time.monotonic())
+            _token_cache.set(key, entry, min(_token_cache.timeout, seconds_to_expiry(entry[1])))
+        user, validated_token = entry[:2]
+        if is_revoked(validated_token):
+            _token_cache.delete(key)
+            raise AuthenticationFailed(_('Token is revoked'), code='token_revoked')
+        return user, validated_token
+
+
+@receiver(post_save, sender=get_user_model())
+@receiver(post_delete, sender=get_user_model())
+def forget_cached_users(sender, **kwargs):
+    """
+    A user changed by this worker (deactivated, deleted, new password) is
+    looked up again at once, the other workers notice within USER_CHECK_SECONDS
+    :return:
+    """
+    _token_cache.clear()
@@ -0,0 +1,248 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.dispatch import receiver
+from django.http import HttpResponse, HttpResponseNotModified
+from rest_framework.response import Response
+
+from .changes import change_log_head
+from .routers import reads_from_primary
+from .serializers import TimedJSONRenderer
+from .signals import news_changed
+
+VERSION_KEY = 'news_api_app:news:version'
+
+
+class LRUCache:
+    """Bounded in-process cache, least recently used entries are evicted first"""
+
+    def __init__(self, max_entries=1024, timeout=60):
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """
+        Get a live entry
+        :param key:
+        :return: the value or None when missing or expired
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value, timeout=None):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + (self.timeout if timeout is None else timeout), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class LocalResponseCache(LRUCache):
+    """Response cache kept in the memory of the worker, the default backend"""
+
+    def __init__(self, max_entries=1024, timeout=60):
+        super().__init__(max_entries, timeout)
+        self._version = 0
+
+    def get_version(self):
+        return self._version
+
+    def bump_version(self):
+        with self._lock:
+            self._version += 1
+        # entries of older versions can never be read again
+        self.clear()
+
+
+class DjangoResponseCache:
+    """
+    Response cache on a Django cache alias. The version counter lives in the
+    same cache so a shared cache (memcached, redis) invalidates all workers.
+    """
+
+    def __init__(self, alias='default', timeout=60):
+        self.cache = caches[alias]
+        self.timeout = timeout
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return 0
+
+    def get(self, key):
+        value = self.cache.get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def set(self, key, value):
+        self.cache.set(key, value, self.timeout)
+
+    def get_version(self):
+        version = self.cache.get(VERSION_KEY)
+        if version is None:
+            self.cache.add(VERSION_KEY, 0, None)
+            version = self.cache.get(VERSION_KEY, 0)
+        return version
+
+    def bump_version(self):
+        try:
+            self.cache.incr(VERSION_KEY)
+        except ValueError:
+            self.cache.add(VERSION_KEY, 1, None)
+
+
+class ChangeLogVersion:
+    """
+    Head of the change log (see changes.py), read at most every
+    VERSION_CHECK_SECONDS of NEWS_RESPONSE_CACHE. Part of the cache keys
+    along with the version counter of the cache, which only moves with the
+    writes of this worker for the lru backend: the head also moves with the
+    writes of the other workers and of the scrape worker.
+    """
+
+    def __init__(self):
+        self._head = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def get(self):
+        interval = getattr(settings, 'NEWS_RESPONSE_CACHE', {}).get('VERSION_CHECK_SECONDS', 2)
+        if self._head is None or time.monotonic() - self._checked_at >= interval:
+            with self._lock:
+                if self._head is None or time.monotonic() - self._checked_at >= interval:
+                    self._head = change_log_head()
+                    self._checked_at = time.monotonic()
+        return self._head
+
+
+_change_log_version = ChangeLogVersion()
+_response_cache = None
+_response_cache_lock = threading.Lock()
+
+
+def get_response_cache():
+    """
+    Build the response cache configured by NEWS_RESPONSE_CACHE on first use
+    :return:
+    """
+    global _response_cache
+    if _response_cache is None:
+        with _response_cache_lock:
+            if _response_cache is None:
+                config = getattr(settings, 'NEWS_RESPONSE_CACHE', {})
+                timeout = config.get('TIMEOUT', 60)
+                if config.get('BACKEND', 'lru') == 'django':
+                    _response_cache = DjangoResponseCache(config.get('ALIAS', 'default'), timeout)
+                else:
+                    _response_cache = LocalResponseCache(config.get('MAX_ENTRIES', 1024), timeout)
+    return _response_cache
+
+
+def cache_stats():
+    """
+    Hit ratio and size of the response cache
+    :return:
+    """
+    cache = get_response_cache()
+    lookups = cache.hits + cache.misses
+    return {
+        "hits": cache.hits,
+        "misses": cache.misses,
+        "hit_ratio": cache.hits / lookups if lookups else 0.0,
+        "entries": len(cache),
+        "version": cache.get_version(),
+    }
+
+
+def response_cache_key(request, version):
+    """
+    Key of a response, the same request gives the same key until the news change
+    :param request:
+    :param version: version of the news table, see cached_response
+    :return:
+    """
+    digest = hashlib.sha256()
+    for part in (request.method, request.path, request.META.get('QUERY_STRING', '')):
+        digest.update(part.encode())
+        digest.update(b'\0')
+    if request.method == 'POST':
+        digest.update(request.body)
+    return 'news_api_app:response:{}:{}'.format(version, digest.hexdigest())
+
+
+def cached_response(request, build):
+    """
+    Serve the response from the cache or build and cache it. Only 200 responses
+    are cached. The response carries an ETag and a matching If-None-Match gives a 304.
+    A client pinned to the primary after a write skips the lookup, an entry
+    built from a lagging replica must not hide its write.
+    :param request:
+    :param build: callable returning the response when it is not cached
+    :return:
+    """
+    cache = get_response_cache()
+    horizon, seq = _change_log_version.get()
+    key = response_cache_key(request, '{}.{}.{}'.format(cache.get_version(), horizon, seq))
+    entry = None if reads_from_primary(request) else cache.get(key)
+    if entry is None:
+        response = build()
+        if response.status_code != 200:
+            return response
+        if isinstance(response, Response):
+            response.accepted_renderer = TimedJSONRenderer()
+            response.accepted_media_type = TimedJSONRenderer.media_type
+            response.renderer_context = {}
+            response.render()
+        content = response.content
+        entry = ('"{}"'.format(hashlib.sha1(content).hexdigest()), content, response['Content-Type'])
+        cache.set(key, entry)
+    etag, content, content_type = entry
+    if etag in (tag.strip() for tag in request.META.get('HTTP_IF_NONE_MATCH', '').split(',')):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(content, content_type=content_type)
+    response['ETag'] = etag
+    return response
+
+
+@receiver(news_changed)
+def invalidate_response_cache(sender, **kwargs):
+    """
+    Bump the version of the news table once the write is committed, the
+    cached responses are invalidated at once in this worker, the other
+    workers see the change log move within VERSION_CHECK_SECONDS
+    :return:
+    """
+    transaction.on_commit(get_response_cache().bump_version)
@@ -0,0 +1,156 @@
+import base64
+import binascii
+import datetime
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .db import is_postgresql
+from .models import News, NewsChange
+from .pagination import PaginationError
+from .serializers import NewsRowSerializer, NewsSerializer
+from .signals import news_changed
+
+# rows written per statement
+BATCH_SIZE = 500
+# the whole news, details included, to keep a copy
+NEWS_FIELDS = NewsSerializer.Meta.fields + ('updated_at',)
+
+
+class ChangesExpired(Exception):
+    """Raised when the changes after a cursor may have been pruned, the client has to sync again"""
+
+
+def keep_days():
+    return getattr(settings, 'NEWS_CHANGES_KEEP_DAYS', 30)
+
+
+@receiver(news_changed)
+def log_news_changes(sender, created, updated, deleted, archived=False, **kwargs):
+    """
+    Append the writes to the change log, in the transaction of the write
+    :return:
+    """
+    # evaluated by the INSERT, so the txid is the one of the writing transaction
+    txid = RawSQL('txid_current()', []) if is_postgresql(connection) else 0
+    changes = [NewsChange(txid=txid, news_id=news.id, action=NewsChange.INSERT)
+               for news in created if news.id is not None]
+    changes.extend(NewsChange(txid=txid, news_id=news.id, action=NewsChange.UPDATE) for news in updated)
+    changes.extend(NewsChange(txid=txid, news_id=news.id,
+                              action=NewsChange.ARCHIVE if archived else NewsChange.DELETE) for news in deleted)
+    NewsChange.objects.bulk_create(changes, batch_size=BATCH_SIZE)
+
+
+def change_horizon():
+    """
+    Oldest transaction still running on PostgreSQL, every transaction with a
+    lower txid has committed or rolled back so its changes can be served.
+    Writes are serialized on the other databases.
+    :return: txid or None
+    """
+    if not is_postgresql(connection):
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT txid_snapshot_xmin(txid_current_snapshot())")
+        return cursor.fetchone()[0]
+
+
+def change_log_head():
+    """
+    Position of the head of the change log. It moves once the writes of any
+    process have committed: the last seq, and on PostgreSQL the horizon too
+    since a transaction may commit after one with a higher seq.
+    :return: (horizon or None, last seq or None)
+    """
+    return change_horizon(), NewsChange.objects.order_by('-seq').values_list('seq', flat=True).first()
+
+
+def encode_change_cursor(txid, seq):
+    """
+    Build an opaque cursor after the change (txid, seq), stamped with the
+    time it was issued to detect the cursors older than the change log
+    :param txid:
+    :param seq:
+    :return:
+    """
+    raw = "{}|{}|{}".format(txid, seq, int(timezone.now().timestamp())).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_change_cursor(cursor):
+    """
+    Decode the cursor produced by encode_change_cursor
+    :param cursor:
+    :return: (txid, seq, issued datetime)
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        txid, seq, issued = base64.urlsafe_b64decode(padded.encode()).decode().split("|")
+        return int(txid), int(seq), datetime.datetime.fromtimestamp(int(issued), datetime.timezone.utc)
+    except (binascii.Error, UnicodeDecodeError, ValueError, OverflowError, OSError):
+        raise PaginationError("Invalid cursor")
+
+
+def read_changes(cursor, page_size):
+    """
+    The news changed after the cursor, one entry per news with its state at
+    the time of the read: "insert" or "update" with the news, "delete" or
+    "archive" without. Changes are read in (txid, seq) order below the
+    horizon of the running transactions, so a transaction which commits
+    later never lands behind a cursor already handed out. Without cursor no
+    change is returned, only the cursor of the head of the log.
+    :param cursor: "next" of the previous call, None to start
+    :param page_size: number of changes read
+    :return: (entries, next cursor, whether more changes are readable now)
+    """
+    horizon = change_horizon()
+    if cursor is None:
+        if horizon is not None:
+            # the changes of the finished transactions are already in the table
+            return [], encode_change_cursor(horizon, 0), False
+        last = NewsChange.objects.order_by('-seq').values_list('seq', flat=True).first()
+        return [], encode_change_cursor(0, last or 0), False
+    txid, seq, issued = decode_change_cursor(cursor)
+    if issued < timezone.now() - datetime.timedelta(days=keep_days()):
+        raise ChangesExpired("Cursor older than {} days, sync again from GET /news/export/".format(keep_days()))
+    queryset = NewsChange.objects.filter(Q(txid__gt=txid) | Q(txid=txid, seq__gt=seq))
+    if horizon is not None:
+        queryset = queryset.filter(txid__lt=horizon)
+    rows = list(queryset.order_by('txid', 'seq').values_list('txid', 'seq', 'news_id', 'action')[:page_size + 1])
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    if rows:
+        txid, seq = rows[-1][:2]
+    # last change of every news, in the order of the log
+    actions = {}
+    for _, _, news_id, action in rows:
+        actions.pop(news_id, None)
+        actions[news_id] = action
+    serializer = NewsRowSerializer(NewsSerializer.Meta.fields, NEWS_FIELDS)
+    updated_at = NEWS_FIELDS.index('updated_at')
+    stored = {row[0]: row for row in News.objects.filter(id__in=list(actions)).values_list(*NEWS_FIELDS)}
+    entries = []
+    for news_id, action in actions.items():
+        row = stored.get(news_id)
+        if row is None:
+            entries.append({"action": NewsChange.ARCHIVE if action == NewsChange.ARCHIVE else NewsChange.DELETE,
+                            "id": news_id})
+        else:
+            entries.append({"action": action if action in (NewsChange.INSERT, NewsChange.UPDATE)
+                            else NewsChange.UPDATE, "id": news_id, "news": serializer.to_representation(row),
+                            "updated_at": row[updated_at].isoformat()})
+    return entries, encode_change_cursor(txid, seq), has_more
+
+
+def prune_changes():
+    """
+    Delete the changes older than the cursors (NEWS_CHANGES_KEEP_DAYS), plus
+    a day for the transactions running when a cursor was issued
+    :return: number of changes deleted
+    """
+    cutoff = timezone.now() - datetime.timedelta(days=keep_days() + 1)
+    return NewsChange.objects.filter(changed_at__lt=cutoff).delete()[0]
@@ -0,0 +1,162 @@
+import zlib
+
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import DatabaseError, transaction
+from django.db.migrations import AddIndex, CreateModel
+from django.db.models import BinaryField, Index, TextField
+
+
+def is_postgresql(connection):
+    """
+    Check whether the given connection (or schema editor connection) is PostgreSQL
+    :param connection:
+    :return:
+    """
+    return connection.vendor == 'postgresql'
+
+
+class PortableGinIndex(GinIndex):
+    """
+    GIN index on PostgreSQL, plain index everywhere else.
+
+    The SQLite backend used in tests does not know ``USING gin``, and SQLite
+    rebuilds every index of a table when a column is altered, so the fallback
+    has to live in the index itself rather than in the migration.
+    """
+
+    def create_sql(self, model, schema_editor, using='', **kwargs):
+        if is_postgresql(schema_editor.connection):
+            return super().create_sql(model, schema_editor, using=using, **kwargs)
+        return Index.create_sql(self, model, schema_editor, using=using, **kwargs)
+
+
+class CompressedTextField(TextField):
+    """
+    TextField stored compressed, decoded on access.
+
+    PostgreSQL compresses long text values itself (TOAST, see
+    set_lz4_compression) and its search trigger reads the column, so it stays
+    text there. The other databases store it as a zlib compressed blob, values
+    written before the column was compressed are still read as they are.
+    """
+
+    def db_type(self, connection):
+        if is_postgresql(connection):
+            return super().db_type(connection)
+        return BinaryField().db_type(connection)
+
+    def get_db_prep_value(self, value, connection, prepared=False):
+        value = super().get_db_prep_value(value, connection, prepared)
+        if value is None or is_postgresql(connection):
+            return value
+        return connection.Database.Binary(zlib.compress(value.encode()))
+
+    def from_db_value(self, value, expression, connection):
+        if value is None or isinstance(value, str):
+            return value
+        value = bytes(value)
+        try:
+            return zlib.decompress(value).decode()
+        except zlib.error:
+            return value.decode()
+
+
+def set_lz4_compression(schema_editor, table, column):
+    """
+    Compress the TOASTed values of a text column with lz4 instead of pglz
+    on PostgreSQL 14+ built with lz4: faster to decompress, about as small.
+    The values already stored keep their compression until rewritten.
+    :param schema_editor:
+    :param table:
+    :param column:
+    :return: whether the compression was changed
+    """
+    connection = schema_editor.connection
+    if not is_postgresql(connection) or connection.pg_version < 140000:
+        return False
+    quote_name = schema_editor.quote_name
+    try:
+        with transaction.atomic(using=connection.alias):
+            schema_editor.execute('ALTER TABLE {} ALTER COLUMN {} SET COMPRESSION lz4'.format(
+                quote_name(table), quote_name(column)))
+    except DatabaseError:
+        # server built without lz4
+        return False
+    return True
+
+
+class AddIndexConcurrentlyIfSupported(AddIndexConcurrently):
+    """
+    CREATE INDEX CONCURRENTLY on PostgreSQL so the index can be built on a live
+    table, a plain AddIndex on the other databases. The migration using it has
+    to set atomic = False.
+    """
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if is_postgresql(schema_editor.connection):
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+        else:
+            AddIndex.database_forwards(self, app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if is_postgresql(schema_editor.connection):
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+        else:
+            AddIndex.database_backwards(self, app_label, schema_editor, from_state, to_state)
+
+
+class CreatePartitionedModel(CreateModel):
+    """
+    CreateModel of a table range partitioned by partition_key on PostgreSQL,
+    a plain table on the other databases. PostgreSQL wants the partition key
+    in the primary key, it becomes (pk, partition_key). The partitions
+    themselves are created with create_range_partition.
+    """
+
+    def __init__(self, name, fields, partition_key, options=None, bases=None, managers=None):
+        self.partition_key = partition_key
+        super().__init__(name, fields, options, bases, managers)
+
+    def deconstruct(self):
+        name, args, kwargs = super().deconstruct()
+        kwargs['partition_key'] = self.partition_key
+        return name, args, kwargs
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        model = to_state.apps.get_model(app_label, self.name)
+        if not is_postgresql(schema_editor.connection):
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+            return
+        if not self.allow_migrate_model(schema_editor.connection.alias, model):
+            return
+        quote_name = schema_editor.quote_name
+        columns = []
+        for field in model._meta.local_fields:
+            if field.primary_key:
+                definition = field.db_type(schema_editor.connection) + ' NOT NULL'
+            else:
+                definition, _ = schema_editor.column_sql(model, field)
+            columns.append('{} {}'.format(quote_name(field.column), definition))
+        partition_column = quote_name(model._meta.get_field(self.partition_key).column)
+        schema_editor.execute('CREATE TABLE {} ({}, PRIMARY KEY ({}, {})) PARTITION BY RANGE ({})'.format(
+            quote_name(model._meta.db_table), ', '.join(columns), quote_name(model._meta.pk.column),
+            partition_column, partition_column))
+        for index in model._meta.indexes:
+            schema_editor.add_index(model, index)
+
+
+def create_range_partition(connection, table, name, start, end):
+    """
+    Create the partition of a partitioned table holding [start, end) unless it exists
+    :param connection:
+    :param table: name of the partitioned table
+    :param name: name of the partition
+    :param start: first value of the partition
+    :param end: first value after the partition
+    :return:
+    """
+    quote_name = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute('CREATE TABLE IF NOT EXISTS {} PARTITION OF {} FOR VALUES FROM (%s) TO (%s)'.format(
+            quote_name(name), quote_name(table)), [start, end])
@@ -0,0 +1,182 @@
+import datetime
+import re
+import xml.etree.ElementTree as ElementTree
+from email.utils import parsedate_to_datetime
+from urllib.parse import urljoin
+
+from django.utils.dateparse import parse_date, parse_datetime
+
+FEED_TYPES = ('application/rss+xml', 'application/atom+xml')
+LINK_TAG = re.compile(r'<link\b[^>]*>', re.IGNORECASE)
+ATTRIBUTE = re.compile(r'([a-zA-Z-]+)\s*=\s*(?:"([^"]*)"|\'([^\']*)\'|([^\s"\'>]+))')
+
+
+class FeedError(Exception):
+    """Raised when a feed or sitemap cannot be parsed"""
+
+
+def feed_links(link, html):
+    """
+    Urls of the RSS and Atom feeds announced by a homepage with
+    <link rel="alternate" type="application/rss+xml" href="...">, found
+    without parsing the whole page
+    :param link: url of the homepage
+    :param html:
+    :return:
+    """
+    urls = []
+    for tag in LINK_TAG.findall(html):
+        # one of the quoted, single quoted or bare value groups matched
+        attributes = {name.lower(): ''.join(values) for name, *values in ATTRIBUTE.findall(tag)}
+        if 'alternate' in attributes.get('rel', '').lower().split() and \
+                attributes.get('type', '').lower() in FEED_TYPES and attributes.get('href'):
+            url = urljoin(link, attributes['href'].strip())
+            if url not in urls:
+                urls.append(url)
+    return urls
+
+
+def parse_published(value):
+    """
+    Publication date of a feed entry: RFC 822 in RSS, ISO 8601 in Atom and
+    sitemaps, a date alone is midnight
+    :param value: text of the element or None
+    :return: datetime or None when missing or invalid
+    """
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        published = parse_datetime(value)
+        if published is None:
+            date = parse_date(value)
+            published = datetime.datetime(date.year, date.month, date.day) if date is not None else None
+    except ValueError:
+        published = None
+    if published is None:
+        try:
+            published = parsedate_to_datetime(value)
+        except (TypeError, ValueError, IndexError):
+            return None
+    return published
+
+
+def local_name(element):
+    """
+    Tag of an element without its namespace
+    :param element:
+    :return:
+    """
+    return element.tag.rsplit('}', 1)[-1]
+
+
+def child_text(element, *names):
+    """
+    Text of the first child with one of the names, namespaces ignored
+    :param element:
+    :param names: local names, in order of preference
+    :return:
+    """
+    for name in names:
+        for child in element.iter():
+            if child is not element and local_name(child) == name and child.text and child.text.strip():
+                return child.text.strip()
+    return None
+
+
+def atom_link(entry):
+    """
+    Url of an Atom entry, the alternate link
+    :param entry:
+    :return:
+    """
+    for child in entry:
+        if local_name(child) == 'link' and child.get('rel', 'alternate') == 'alternate' and child.get('href'):
+            return child.get('href').strip()
+    return None
+
+
+def parse_feed(url, content):
+    """
+    Entries of an RSS 2.0 or Atom feed, a sitemap or a sitemap index, the
+    Google News sitemap publication date is preferred over lastmod
+    :param url: url of the feed, relative links are resolved against it
+    :param content: body of the feed
+    :return: {"entries": [[article url, iso publication date or None]],
+              "sitemaps": [[sitemap url, iso lastmod or None]]}
+    """
+    try:
+        root = ElementTree.fromstring(content)
+    except ElementTree.ParseError as e:
+        raise FeedError("{} is not a feed: {}".format(url, e))
+    kind = local_name(root)
+    entries, sitemaps = [], []
+    if kind == 'rss' or kind == 'RDF':
+        for item in root.iter():
+            if local_name(item) == 'item':
+                link = child_text(item, 'link') or child_text(item, 'guid')
+                entries.append((link, child_text(item, 'pubDate', 'date', 'published')))
+    elif kind == 'feed':
+        for entry in root:
+            if local_name(entry) == 'entry':
+                entries.append((atom_link(entry), child_text(entry, 'published', 'updated')))
+    elif kind == 'urlset':
+        for node in root:
+            if local_name(node) == 'url':
+                entries.append((child_text(node, 'loc'), child_text(node, 'publication_date', 'lastmod')))
+    elif kind == 'sitemapindex':
+        for node in root:
+            if local_name(node) == 'sitemap':
+                sitemaps.append((child_text(node, 'loc'), child_text(node, 'lastmod')))
+    else:
+        raise FeedError("{} is not a feed: unknown root element {}".format(url, kind))
+
+    def resolved(pairs):
+        results = []
+        for link, published in pairs:
+            if link:
+                published = parse_published(published)
+                results.append([urljoin(url, link), published.isoformat() if published is not None else None])
+        return results
+    return {"entries": resolved(entries), "sitemaps": resolved(sitemaps)}
+
+
+def is_recent(published, today):
+    """
+    Whether an entry may have been published today, in its own timezone or
+    in the local one, an entry without date may be
+    :param published: iso publication date or None
+    :param today: date
+    :return:
+    """
+    if published is None:
+        return True
+    published = parse_datetime(published)
+    if published is None:
+        return True
+    if published.date() == today:
+        return True
+    return published.tzinfo is not None and published.astimezone().date() == today
+
+
+def newest_first(entries):
+    """
+    Entries sorted by publication date, newest first and undated last,
+    duplicate urls dropped
+    :param entries: [[url, iso publication date or None]]
+    :return:
+    """
+    def key(entry):
+        published = parse_datetime(entry[1]) if entry[1] else None
+        if published is None:
+            return 0.0
+        if published.tzinfo is None:
+            published = published.astimezone()
+        return -published.timestamp()
+    seen = set()
+    results = []
+    for url, published in sorted(entries, key=key):
+        if url not in seen:
+            seen.add(url)
+            results.append([url, published])
+    return results
@@ -0,0 +1,127 @@
+import csv
+import datetime
+import io
+import json
+import zlib
+
+from .models import News, NewsArchive
+
+EXPORT_FIELDS = ('id', 'title', 'details', 'date', 'news_from', 'news_url')
+# rows fetched per round trip, a server-side cursor on PostgreSQL
+CHUNK_SIZE = 2000
+# bytes gathered before a chunk is sent to the client
+BUFFER_SIZE = 64 * 1024
+CONTENT_TYPES = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+def export_queryset(date_from=None, date_to=None, news_from=None, archive=False):
+    """
+    Rows of the export, oldest first
+    :param date_from: first date included, None for no bound
+    :param date_to: last date included, None for no bound
+    :param news_from: only the news of this source, None for all
+    :param archive: export the archived news instead of the News table
+    :return: values_list queryset of EXPORT_FIELDS
+    """
+    queryset = (NewsArchive if archive else News).objects.order_by('date', 'id')
+    if date_from is not None:
+        queryset = queryset.filter(date__gte=date_from)
+    if date_to is not None:
+        queryset = queryset.filter(date__lte=date_to)
+    if news_from is not None:
+        queryset = queryset.filter(news_from=news_from)
+    return queryset.values_list(*EXPORT_FIELDS)
+
+
+def ndjson_lines(rows):
+    """
+    One json object per row
+    :param rows: tuples of EXPORT_FIELDS
+    :return: generator of text lines
+    """
+    for row in rows:
+        record = dict(zip(EXPORT_FIELDS, row))
+        record['date'] = record['date'].isoformat()
+        yield json.dumps(record, ensure_ascii=False) + '\n'
+
+
+def csv_lines(rows):
+    """
+    Csv header followed by one line per row
+    :param rows: tuples of EXPORT_FIELDS
+    :return: generator of text lines
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_FIELDS)
+    for row in rows:
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerow(row)
+    yield buffer.getvalue()
+
+
+def buffered(lines):
+    """
+    Join text lines into utf-8 chunks of about BUFFER_SIZE bytes
+    :param lines:
+    :return: generator of bytes
+    """
+    chunk = []
+    size = 0
+    for line in lines:
+        data = line.encode()
+        chunk.append(data)
+        size += len(data)
+        if size >= BUFFER_SIZE:
+            yield b''.join(chunk)
+            chunk = []
+            size = 0
+    if chunk:
+        yield b''.join(chunk)
+
+
+def gzipped(chunks):
+    """
+    Gzip a stream of bytes on the fly
+    :param chunks:
+    :return: generator of gzip bytes
+    """
+    compressor = zlib.compressobj(6, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_stream(export_format, date_from=None, date_to=None, news_from=None, gzip=False, archive=False):
+    """
+    Stream the news table in constant memory
+    :param export_format: 'ndjson' or 'csv'
+    :param date_from:
+    :param date_to:
+    :param news_from:
+    :param gzip: compress the stream
+    :param archive: stream the archived news
+    :return: generator of bytes
+    """
+    rows = export_queryset(date_from, date_to, news_from, archive).iterator(chunk_size=CHUNK_SIZE)
+    lines = ndjson_lines(rows) if export_format == 'ndjson' else csv_lines(rows)
+    chunks = buffered(lines)
+    return gzipped(chunks) if gzip else chunks
+
+
+def parse_date(value):
+    """
+    Parse an optional YYYY-MM-DD query parameter
+    :param value:
+    :return: date or None
+    """
+    if value in (None, ''):
+        return None
+    return datetime.datetime.strptime(value, "%Y-%m-%d").date()
@@ -0,0 +1,117 @@
+import datetime
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import FetchedPage
+from .utils import url_hash
+
+# keeps the IN lists below the SQLite limit of bound parameters
+BATCH_SIZE = 500
+
+
+class FetchCache:
+    """
+    Validators (ETag, Last-Modified), content hash and parsed result of the
+    fetched pages, kept in memory for the duration of one scrape. Articles
+    have an empty parsed result, they are stored in the news.
+    """
+
+    def __init__(self):
+        self._entries = {}
+        self._changed = set()
+
+    def load(self, urls):
+        """
+        Make the entries of the urls available to get, nothing to do in memory
+        :param urls:
+        :return:
+        """
+
+    def get(self, url):
+        """
+        Entry of a url
+        :param url:
+        :return: dict with etag, last_modified, content_hash and parsed or None
+        """
+        return self._entries.get(url)
+
+    def put(self, url, etag, last_modified, content_hash, parsed):
+        self._entries[url] = {
+            "etag": etag or "",
+            "last_modified": last_modified or "",
+            "content_hash": content_hash,
+            "parsed": parsed,
+        }
+        self._changed.add(url)
+
+    def save(self):
+        """
+        Persist the entries put since the last save, nothing to do in memory
+        :return:
+        """
+        self._changed.clear()
+
+
+def prune_fetched_pages():
+    """
+    Delete the pages not fetched for SCRAPER_FETCH_CACHE_KEEP_DAYS days
+    :return: number of pages deleted
+    """
+    cutoff = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(
+        days=getattr(settings, 'SCRAPER_FETCH_CACHE_KEEP_DAYS', 30))
+    deleted, _ = FetchedPage.objects.filter(fetched_at__lt=cutoff).delete()
+    return deleted
+
+
+class DatabaseFetchCache(FetchCache):
+    """
+    FetchCache persisted in the FetchedPage table so it lasts across scrapes,
+    the pages not fetched again for SCRAPER_FETCH_CACHE_KEEP_DAYS are dropped
+    """
+
+    def load(self, urls):
+        """
+        Read the entries of the urls which are not loaded yet in IN queries
+        :param urls:
+        :return:
+        """
+        hashes = {url_hash(url): url for url in urls if url not in self._entries}
+        hash_list = list(hashes)
+        for start in range(0, len(hash_list), BATCH_SIZE):
+            pages = FetchedPage.objects.filter(url_hash__in=hash_list[start:start + BATCH_SIZE])
+            for page in pages:
+                self._entries[hashes[page.url_hash]] = {
+                    "etag": page.etag,
+                    "last_modified": page.last_modified,
+                    "content_hash": page.content_hash,
+                    "parsed": page.parsed,
+                }
+
+    def save(self):
+        """
+        Write the entries put since the last save, existing rows are updated,
+        and prune the old pages
+        :return:
+        """
+        pages = {
+            url_hash(url): FetchedPage(url=url, url_hash=url_hash(url), **self._entries[url])
+            for url in self._changed
+        }
+        hash_list = list(pages)
+        with transaction.atomic():
+            for start in range(0, len(hash_list), BATCH_SIZE):
+                existing = dict(FetchedPage.objects.filter(url_hash__in=hash_list[start:start + BATCH_SIZE])
+                                .values_list('url_hash', 'id'))
+                for hash_, page_id in existing.items():
+                    pages[hash_].id = page_id
+            now = datetime.datetime.now(datetime.timezone.utc)
+            for page in pages.values():
+                page.fetched_at = now
+            updated = [page for page in pages.values() if page.id is not None]
+            FetchedPage.objects.bulk_update(updated, ['etag', 'last_modified', 'content_hash', 'parsed',
+                                                      'fetched_at'], batch_size=BATCH_SIZE)
+            FetchedPage.objects.bulk_create([page for page in pages.values() if page.id is None],
+                                            batch_size=BATCH_SIZE, ignore_conflicts=True)
+            prune_fetched_pages()
+        self._changed.clear()
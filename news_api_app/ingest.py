@@ -0,0 +1,149 @@
+from django.db import connection, transaction
+
+from .db import is_postgresql
+from .models import ArticleFingerprint, News
+from .signals import news_changed
+from .simhash import split_near_duplicates
+from .utils import summarize, url_hash
+
+# keeps the IN lists below the SQLite limit of bound parameters
+BATCH_SIZE = 500
+# pg_advisory_xact_lock key serializing the ingests
+INGEST_LOCK_ID = 5_202_011
+
+
+class IngestResult:
+    """
+    Outcome of an ingest, the inserted News and the skipped candidates. The
+    skipped near duplicates are also listed with the id of their original.
+    """
+
+    def __init__(self):
+        self.inserted = []
+        self.skipped = []
+        self.near_duplicates = []
+
+    def counts(self):
+        return {"inserted": len(self.inserted), "skipped": len(self.skipped),
+                "near_duplicates": len(self.near_duplicates)}
+
+
+def build_news(title, details, date, news_from, news_url):
+    """
+    Build an unsaved News with stripped values, its dedup key and its snippet
+    :return:
+    """
+    news_url = news_url.strip()
+    details = details.strip()
+    snippet, word_count = summarize(details)
+    return News(title=title.strip(), details=details, snippet=snippet, word_count=word_count, date=date,
+                news_from=news_from.strip(), news_url=news_url, url_hash=url_hash(news_url))
+
+
+def existing_url_hashes(hashes):
+    """
+    Find which of the url hashes are already stored
+    :param hashes: list of url hashes
+    :return: set of the stored ones
+    """
+    existing = set()
+    for start in range(0, len(hashes), BATCH_SIZE):
+        existing.update(News.objects.filter(url_hash__in=hashes[start:start + BATCH_SIZE]).values_list(
+            'url_hash', flat=True))
+    return existing
+
+
+def ingested_urls(urls):
+    """
+    Find which of the urls are already stored, compared by their dedup key
+    :param urls:
+    :return: set of the stored urls
+    """
+    hashes = {}
+    for url in urls:
+        hashes.setdefault(url_hash(url), []).append(url)
+    existing = existing_url_hashes(list(hashes))
+    return {url for hash_ in existing for url in hashes[hash_]}
+
+
+def ingest_news(candidates):
+    """
+    Insert the candidates whose url is not stored yet and which are not near
+    duplicates (SimHash of the details) of a stored news, in one transaction.
+
+    The stored urls are looked up with IN queries and the new rows are written
+    with bulk_create, on PostgreSQL concurrent ingests are serialized with an
+    advisory lock. A single insert from the API can still store a url between
+    the lookup and bulk_create: ignore_conflicts drops the candidate and, as
+    the row read back does not carry the updated_at written by this ingest,
+    it is counted as skipped and not announced as created.
+    :param candidates: unsaved News built with build_news
+    :return: IngestResult
+    """
+    result = IngestResult()
+    unique = {}
+    for news in candidates:
+        if news.url_hash in unique:
+            result.skipped.append(news)
+        else:
+            unique[news.url_hash] = news
+    if not unique:
+        return result
+    with transaction.atomic():
+        if is_postgresql(connection):
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT pg_advisory_xact_lock(%s)", [INGEST_LOCK_ID])
+        existing = existing_url_hashes(list(unique))
+        new = []
+        for hash_, news in unique.items():
+            if hash_ in existing:
+                result.skipped.append(news)
+            else:
+                new.append(news)
+        new, near_duplicates = split_near_duplicates(new)
+        News.objects.bulk_create(new, batch_size=BATCH_SIZE, ignore_conflicts=True)
+        # ids are not returned when conflicts are ignored, read them back
+        stored = {}
+        for start in range(0, len(new), BATCH_SIZE):
+            for hash_, news_id, updated_at in News.objects.filter(
+                    url_hash__in=[news.url_hash for news in new[start:start + BATCH_SIZE]]).values_list(
+                    'url_hash', 'id', 'updated_at'):
+                stored[hash_] = (news_id, updated_at)
+        for news in new:
+            news_id, updated_at = stored.get(news.url_hash, (None, None))
+            # bulk_create set updated_at on the news, another value is a row written by someone else
+            if news_id is not None and updated_at == news.updated_at:
+                news.id = news_id
+                result.inserted.append(news)
+            else:
+                result.skipped.append(news)
+        for news, original in near_duplicates:
+            result.skipped.append(news)
+            result.near_duplicates.append((news, original if isinstance(original, int) else original.id))
+        if result.inserted:
+            news_changed.send(sender=News, created=result.inserted, updated=[], deleted=[])
+    return result
+
+
+def delete_news(news, archived=False):
+    """
+    Delete news with one DELETE per batch of ids and announce them with a
+    single news_changed, where deleting a queryset would collect the rows
+    and send post_delete (and its receivers' queries) once per news.
+    To be called in a transaction.
+    :param news: News with at least their id, date and news_from loaded
+    :param archived: whether the news were moved to the archive
+    :return:
+    """
+    ids = [item.id for item in news]
+    if not ids:
+        return
+    sql = "DELETE FROM {} WHERE {} IN ({{}})".format(connection.ops.quote_name(News._meta.db_table),
+                                                     connection.ops.quote_name(News._meta.pk.column))
+    with connection.cursor() as cursor:
+        for start in range(0, len(ids), BATCH_SIZE):
+            batch = ids[start:start + BATCH_SIZE]
+            # the fingerprints reference the news, they go first
+            ArticleFingerprint.objects.filter(news_id__in=batch).delete()
+            cursor.execute(sql.format(", ".join(["%s"] * len(batch))), batch)
+    news_changed.send(sender=News, created=[], updated=[], deleted=list(news), archived=archived)
@@ -0,0 +1,138 @@
+import datetime
+import json
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .fetch_cache import DatabaseFetchCache
+from .ingest import build_news, ingest_news, ingested_urls
+from .metrics import record_scrape
+from .models import ScrapeJob
+
+# As library execute for many news so need to limit, sources of NewsPapers.json can set their own limit
+LIMIT = 5
+
+
+def load_sources():
+    """
+    Loads the JSON file with news sites
+    :return:
+    """
+    with open(getattr(settings, 'NEWS_PAPERS_FILE', settings.BASE_DIR / 'NewsPapers.json')) as data_file:
+        return json.load(data_file)
+
+
+def store_articles(articles):
+    """
+    Insert the scraped articles published today which are not in the db yet
+    :param articles: articles returned by ScrapeEngine.scrape
+    :return: IngestResult
+    """
+    today = datetime.datetime.now().strftime("%d-%m-%Y")
+    candidates = []
+    for content in articles:
+        # Again, for consistency, if there is no found publish date the article will be skipped.
+        if content["publish_date"] is None:
+            continue
+
+        # Comparing the article publish date and current date
+        # Proceed only when both date are same as per the problem statement
+        publish_date = content["publish_date"]
+        if today == publish_date.strftime("%d-%m-%Y"):
+            candidates.append(build_news(content["title"], content["text"], publish_date, content["news_from"],
+                                         content["url"]))
+    # news already in the db are skipped
+    return ingest_news(candidates)
+
+
+def enqueue_scrape_job():
+    """
+    Queue a scrape of every source for the worker
+    :return:
+    """
+    return ScrapeJob.objects.create()
+
+
+def fail_stale_jobs():
+    """
+    Mark failed the jobs running for longer than SCRAPE_JOB_TIMEOUT seconds,
+    their worker died without finishing them
+    :return: number of jobs failed
+    """
+    timeout = getattr(settings, 'SCRAPE_JOB_TIMEOUT', 3600)
+    now = timezone.now()
+    return ScrapeJob.objects.filter(
+        status=ScrapeJob.RUNNING, started_at__lt=now - datetime.timedelta(seconds=timeout)
+    ).update(status=ScrapeJob.FAILED, finished_at=now, error="Worker stopped, no result after %d seconds" % timeout)
+
+
+def claim_next_job():
+    """
+    Take the oldest queued job and mark it running, concurrent workers skip
+    the rows locked by each other. The stale running jobs are failed first.
+    :return: the claimed job or None when the queue is empty
+    """
+    fail_stale_jobs()
+    with transaction.atomic():
+        job = ScrapeJob.objects.select_for_update(skip_locked=True).filter(
+            status=ScrapeJob.QUEUED).order_by('id').first()
+        if job is None:
+            return None
+        job.status = ScrapeJob.RUNNING
+        job.started_at = timezone.now()
+        job.save(update_fields=['status', 'started_at'])
+    return job
+
+
+def default_engine():
+    """
+    ScrapeEngine of the jobs, re-scrapes send conditional requests with the
+    validators of the FetchedPage table and skip the articles already stored.
+    SCRAPER_ASYNC switches to the httpx based engine.
+    :return:
+    """
+    # imported here, the API workers only enqueue jobs and never load newspaper, lxml, PIL and httpx
+    if getattr(settings, 'SCRAPER_ASYNC', False):
+        from .async_scraper import AsyncScrapeEngine as engine_class
+    else:
+        from .scraper import ScrapeEngine as engine_class
+    return engine_class(fetch_cache=DatabaseFetchCache(), known_urls=ingested_urls)
+
+
+def run_job(job, engine=None, names=None):
+    """
+    Scrape every source, store the articles and record the progress on the job
+    :param job: a running ScrapeJob
+    :param engine: ScrapeEngine to use, default_engine() when None
+    :param names: only scrape the sources with these names, all when None
+    :return:
+    """
+    try:
+        companies = load_sources()
+        if names is not None:
+            companies = {name: value for name, value in companies.items() if name in names}
+        job.sources = {name: {"status": "pending"} for name in companies}
+        job.save(update_fields=['sources'])
+
+        def progress(name, stats):
+            job.sources[name] = dict(stats, status="scraped")
+            job.save(update_fields=['sources'])
+
+        articles, _ = (engine or default_engine()).scrape(companies, LIMIT, progress)
+        result = store_articles(articles)
+        for name, source in job.sources.items():
+            source["status"] = "done"
+            source["inserted"] = sum(1 for news in result.inserted if news.news_from == name)
+            source["skipped"] = sum(1 for news in result.skipped if news.news_from == name)
+            source["near_duplicates"] = sum(1 for news, _ in result.near_duplicates if news.news_from == name)
+        job.articles_inserted = len(result.inserted)
+        job.articles_skipped = len(result.skipped)
+        job.status = ScrapeJob.SUCCEEDED
+        record_scrape(job.sources)
+    except Exception as e:
+        job.status = ScrapeJob.FAILED
+        job.error = str(e)
+    job.finished_at = timezone.now()
+    job.save()
+    return job
@@ -0,0 +1,36 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from news_api_app.archive import BATCH_SIZE, add_months, archive_cutoff, archive_news, archived_months, \
+    create_partitions_ahead, export_month, month_start
+
+
+class Command(BaseCommand):
+    help = "Move the news older than NEWS_ARCHIVE_AFTER_DAYS to the monthly partitioned archive and create the " \
+           "partitions of the coming months. Run it daily, e.g. from cron."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--months-ahead', type=int,
+                            help='Months of archive partitions to create ahead (NEWS_ARCHIVE_MONTHS_AHEAD)')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE,
+                            help='News moved per transaction')
+        parser.add_argument('--export-dir',
+                            help='Write the archive months older than NEWS_ARCHIVE_KEEP_MONTHS to gzipped NDJSON '
+                                 'files in this directory and drop them from the database')
+
+    def handle(self, *args, **options):
+        partitions = create_partitions_ahead(options['months_ahead'])
+        if partitions:
+            self.stdout.write("Archive partitions up to {}".format(partitions[-1]))
+        cutoff = archive_cutoff()
+        archived, duplicates = archive_news(cutoff, options['batch_size'])
+        self.stdout.write("Archived {} news published before {}, {} of them were already archived".format(
+            archived, cutoff, duplicates))
+        if options['export_dir']:
+            if not os.path.isdir(options['export_dir']):
+                raise CommandError("{} is not a directory".format(options['export_dir']))
+            keep_from = add_months(month_start(cutoff), -getattr(settings, 'NEWS_ARCHIVE_KEEP_MONTHS', 24))
+            for month in archived_months(keep_from):
+                self.stdout.write("Exported {}".format(export_month(month, options['export_dir'])))
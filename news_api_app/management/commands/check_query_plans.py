@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from news_api_app.query_plans import explain_endpoint_queries
+
+
+class Command(BaseCommand):
+    help = "Fail when a query of the API endpoints does not use an index (EXPLAIN based, run it from CI)."
+
+    def handle(self, *args, **options):
+        failures = []
+        for name, plan, full_scan in explain_endpoint_queries():
+            self.stdout.write("{} {}".format("FULL SCAN" if full_scan else "index   ", name))
+            if options['verbosity'] > 1:
+                self.stdout.write(plan)
+            if full_scan:
+                failures.append(name)
+        if failures:
+            raise CommandError("Queries without index: " + ", ".join(failures))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from news_api_app.changes import keep_days, prune_changes
+
+
+class Command(BaseCommand):
+    help = "Delete the news changes older than NEWS_CHANGES_KEEP_DAYS from the log behind /news/changes/. " \
+           "Run it daily, e.g. from cron."
+
+    def handle(self, *args, **options):
+        self.stdout.write("Deleted {} changes older than {} days".format(prune_changes(), keep_days()))
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+
+from news_api_app.simhash import rebuild_fingerprints
+
+
+class Command(BaseCommand):
+    help = "Fingerprint every stored news for the near duplicate detection, e.g. after the upgrade adding it."
+
+    def handle(self, *args, **options):
+        self.stdout.write("{} fingerprints written".format(rebuild_fingerprints()))
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+
+from news_api_app.rollup import rebuild_daily_counts
+
+
+class Command(BaseCommand):
+    help = "Recount the news per source and day behind /news/stats/, e.g. after the upgrade adding it."
+
+    def handle(self, *args, **options):
+        self.stdout.write("{} daily counts written".format(rebuild_daily_counts()))
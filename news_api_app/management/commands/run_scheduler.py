@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from news_api_app.metrics import serve_metrics
+from news_api_app.scheduler import poll_due_sources, seconds_until_next_poll
+
+
+class Command(BaseCommand):
+    help = "Poll every source of NewsPapers.json on its own, adaptive, schedule."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help='Poll the sources due right now and exit')
+        parser.add_argument('--max-sleep', type=float, default=60.0,
+                            help='Longest wait between two checks of the schedule, in seconds')
+        parser.add_argument('--metrics-port', type=int,
+                            help='Serve the scraper metrics for Prometheus on this port')
+
+    def handle(self, *args, **options):
+        if options['metrics_port']:
+            serve_metrics(options['metrics_port'])
+        while True:
+            job = poll_due_sources()
+            if job is not None:
+                self.stdout.write("Scrape job {} {}: {}".format(job.id, job.status, ", ".join(
+                    "{} +{}".format(name, source.get("inserted", 0)) for name, source in job.sources.items())))
+            if options['once']:
+                return
+            wait = seconds_until_next_poll()
+            time.sleep(options['max_sleep'] if wait is None else min(wait, options['max_sleep']))
@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from news_api_app.jobs import claim_next_job, enqueue_scrape_job, run_job
+from news_api_app.metrics import serve_metrics
+
+
+class Command(BaseCommand):
+    help = "Run the queued scrape jobs. Use --enqueue from cron to schedule recurring scrapes."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help='Run the jobs queued right now and exit instead of polling')
+        parser.add_argument('--enqueue', action='store_true',
+                            help='Queue a new scrape job before running the queue')
+        parser.add_argument('--poll-interval', type=float, default=5.0,
+                            help='Seconds to wait between polls of an empty queue')
+        parser.add_argument('--metrics-port', type=int,
+                            help='Serve the scraper metrics for Prometheus on this port')
+
+    def handle(self, *args, **options):
+        if options['metrics_port']:
+            serve_metrics(options['metrics_port'])
+        if options['enqueue']:
+            job = enqueue_scrape_job()
+            self.stdout.write("Queued scrape job {}".format(job.id))
+        while True:
+            job = claim_next_job()
+            if job is None:
+                if options['once']:
+                    return
+                time.sleep(options['poll_interval'])
+                continue
+            self.stdout.write("Running scrape job {}".format(job.id))
+            run_job(job)
+            self.stdout.write("Scrape job {} {}, {} news inserted".format(
+                job.id, job.status, job.articles_inserted))
@@ -0,0 +1,423 @@
+import atexit
+import contextvars
+import functools
+import ipaddress
+import json
+import logging
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+QUERIES_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+BYTES_BUCKETS = (100, 1000, 10000, 100000, 1000000, 10000000)
+# queries kept per request for the slow request log
+SLOW_REQUEST_MAX_QUERIES = 200
+# queries written to the slow request log, the slowest first
+SLOW_REQUEST_LOGGED_QUERIES = 10
+
+logger = logging.getLogger('news_api_app.slow_requests')
+
+# RequestMetrics of the request being served, asgiref copies it into the threads of sync_to_async
+current_request = contextvars.ContextVar('news_api_app_request_metrics', default=None)
+
+
+def format_labels(names, values):
+    return ','.join('{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+                    for name, value in zip(names, values))
+
+
+def format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic counter per label values"""
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, *label_values):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def snapshot(self):
+        """
+        Copy of the values
+        :return: {label values: value}
+        """
+        with self._lock:
+            return dict(self._values)
+
+    @staticmethod
+    def merge(total, values):
+        """
+        Add the values of a snapshot to total
+        :return:
+        """
+        for label_values, value in values.items():
+            total[label_values] = total.get(label_values, 0) + value
+
+    def samples(self, values, labels=(), label_values=()):
+        """
+        Sample lines of a snapshot
+        :param values: snapshot of the counter
+        :param labels: extra labels of every sample, before the labels of the counter
+        :param label_values: values of the extra labels
+        :return:
+        """
+        for own_values, value in sorted(values.items()):
+            yield '{}{{{}}} {}'.format(self.name, format_labels(labels + self.labels, label_values + own_values),
+                                       format_value(value))
+
+
+class Histogram:
+    """Cumulative histogram per label values, as the Prometheus client library does"""
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=SECONDS_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        # label values -> [count of every bucket..., sum, count]
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            counts = self._values.get(label_values)
+            if counts is None:
+                counts = self._values[label_values] = [0] * (len(self.buckets) + 2)
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+                    break
+            counts[-2] += value
+            counts[-1] += 1
+
+    def snapshot(self):
+        """
+        Copy of the values
+        :return: {label values: [count of every bucket..., sum, count]}
+        """
+        with self._lock:
+            return {label_values: list(counts) for label_values, counts in self._values.items()}
+
+    @staticmethod
+    def merge(total, values):
+        """
+        Add the values of a snapshot to total
+        :return:
+        """
+        for label_values, counts in values.items():
+            current = total.setdefault(label_values, [0] * len(counts))
+            for index, count in enumerate(counts):
+                current[index] += count
+
+    def samples(self, values, labels=(), label_values=()):
+        """
+        Sample lines of a snapshot
+        :param values: snapshot of the histogram
+        :param labels: extra labels of every sample, before the labels of the histogram
+        :param label_values: values of the extra labels
+        :return:
+        """
+        for own_values, counts in sorted(values.items()):
+            labels_text = format_labels(labels + self.labels, label_values + own_values)
+            separator = ',' if labels_text else ''
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                yield '{}_bucket{{{}{}le="{}"}} {}'.format(self.name, labels_text, separator, format_value(bound),
+                                                          cumulative)
+            yield '{}_bucket{{{}{}le="+Inf"}} {}'.format(self.name, labels_text, separator, counts[-1])
+            yield '{}_sum{{{}}} {}'.format(self.name, labels_text, format_value(counts[-2]))
+            yield '{}_count{{{}}} {}'.format(self.name, labels_text, counts[-1])
+
+
+class Registry:
+    """
+    The metrics of the process, rendered in the Prometheus text format.
+
+    Every process (API worker, scrape worker, scheduler) has its own values.
+    With NEWS_METRICS_DIR set, each one writes them to its own file of that
+    directory at most every NEWS_METRICS_WRITE_SECONDS and when it exits, and
+    render serves the sum of the files, the processes gone included so the
+    counters never go back. Without it, render serves the values of this
+    process with a pid label, so the workers are distinct series.
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self._file = None
+        self._written_at = None
+        self._write_lock = threading.Lock()
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def snapshot(self):
+        return {metric.name: metric.snapshot() for metric in self._metrics}
+
+    def write(self, force=False):
+        """
+        Write the values of this process to its file of NEWS_METRICS_DIR, if
+        the last write is older than NEWS_METRICS_WRITE_SECONDS
+        :param force: write whatever the time of the last write
+        :return:
+        """
+        directory = getattr(settings, 'NEWS_METRICS_DIR', None)
+        if not directory:
+            return
+        now = time.monotonic()
+        if not force and self._written_at is not None and \
+                now - self._written_at < getattr(settings, 'NEWS_METRICS_WRITE_SECONDS', 5):
+            return
+        with self._write_lock:
+            if self._file is None or os.path.dirname(self._file) != directory:
+                # the start time keeps a new process from taking the file of a dead one with the same pid
+                self._file = os.path.join(directory, '{}-{}.json'.format(os.getpid(), time.time_ns()))
+                atexit.register(self.write, True)
+            snapshot = {name: [[list(label_values), value] for label_values, value in values.items()]
+                        for name, values in self.snapshot().items()}
+            temporary = self._file + '.tmp'
+            with open(temporary, 'w') as output:
+                json.dump(snapshot, output)
+            os.replace(temporary, self._file)
+            self._written_at = now
+
+    def read_all(self, directory):
+        """
+        Values of every process which wrote to the directory
+        :param directory:
+        :return: list of snapshots
+        """
+        snapshots = []
+        for name in sorted(os.listdir(directory)):
+            if not name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(directory, name)) as data:
+                    stored = json.load(data)
+            except (OSError, ValueError):
+                continue
+            snapshots.append({metric: {tuple(label_values): value for label_values, value in values}
+                              for metric, values in stored.items()})
+        return snapshots
+
+    def render(self):
+        """
+        Text exposition of every metric, summed over the processes with NEWS_METRICS_DIR
+        :return: bytes
+        """
+        directory = getattr(settings, 'NEWS_METRICS_DIR', None)
+        if directory:
+            self.write(force=True)
+            snapshots, labels, label_values = self.read_all(directory), (), ()
+        else:
+            snapshots, labels, label_values = [self.snapshot()], ('pid',), (os.getpid(),)
+        lines = []
+        for metric in self._metrics:
+            values = {}
+            for snapshot in snapshots:
+                metric.merge(values, snapshot.get(metric.name, {}))
+            lines.append('# HELP {} {}'.format(metric.name, metric.documentation))
+            lines.append('# TYPE {} {}'.format(metric.name, metric.kind))
+            lines.extend(metric.samples(values, labels, label_values))
+        return ('\n'.join(lines) + '\n').encode()
+
+
+REGISTRY = Registry()
+REQUESTS = REGISTRY.register(Counter(
+    'news_api_requests_total', 'Requests served', ('method', 'route', 'status')))
+REQUEST_SECONDS = REGISTRY.register(Histogram(
+    'news_api_request_seconds', 'Wall time of the requests', ('method', 'route')))
+REQUEST_DB_QUERIES = REGISTRY.register(Histogram(
+    'news_api_request_db_queries', 'Database queries per request', ('method', 'route'), QUERIES_BUCKETS))
+REQUEST_DB_SECONDS = REGISTRY.register(Histogram(
+    'news_api_request_db_seconds', 'Time spent in database queries per request', ('method', 'route')))
+REQUEST_SERIALIZE_SECONDS = REGISTRY.register(Histogram(
+    'news_api_request_serialize_seconds', 'Time spent serializing the response per request', ('method', 'route')))
+RESPONSE_BYTES = REGISTRY.register(Histogram(
+    'news_api_response_bytes', 'Size of the response bodies, streamed responses excluded', ('method', 'route'),
+    BYTES_BUCKETS))
+SCRAPE_FETCH_SECONDS = REGISTRY.register(Histogram(
+    'news_api_scrape_fetch_seconds', 'Time spent downloading the pages of a source per scrape', ('source',)))
+SCRAPE_PARSE_SECONDS = REGISTRY.register(Histogram(
+    'news_api_scrape_parse_seconds', 'Time spent parsing the articles of a source per scrape', ('source',)))
+SCRAPE_ARTICLES = REGISTRY.register(Counter(
+    'news_api_scrape_articles_total', 'Articles of the scrapes by outcome: seen on the home page, downloaded, '
+    'failed, inserted, skipped (already stored or near duplicate), near_duplicate', ('source', 'outcome')))
+
+
+class RequestMetrics:
+    """What a request spent its time on"""
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.serialize_seconds = 0.0
+        # (seconds, sql) of the first SLOW_REQUEST_MAX_QUERIES queries
+        self.statements = []
+
+    def add_query(self, sql, seconds):
+        self.queries += 1
+        self.db_seconds += seconds
+        if len(self.statements) < SLOW_REQUEST_MAX_QUERIES:
+            self.statements.append((seconds, sql))
+
+
+def record_query(execute, sql, params, many, context):
+    """
+    Execute wrapper of every connection, times the queries of the current request
+    :return:
+    """
+    metrics = current_request.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.add_query(sql, time.perf_counter() - start)
+
+
+@receiver(connection_created)
+def install_query_recorder(sender, connection, **kwargs):
+    """
+    Add record_query to the execute wrappers of a new connection, on the
+    connection rather than around the request so the queries made in the
+    threads of sync_to_async and on every database alias are counted
+    :return:
+    """
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def timed_serialization(function):
+    """
+    Add the time spent in function to the serialization time of the current request
+    :param function:
+    :return:
+    """
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        metrics = current_request.get()
+        if metrics is None:
+            return function(*args, **kwargs)
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            metrics.serialize_seconds += time.perf_counter() - start
+    return wrapper
+
+
+def request_route(request):
+    """
+    Route of the url pattern which served the request, a label of bounded cardinality
+    :param request:
+    :return:
+    """
+    match = getattr(request, 'resolver_match', None)
+    return match.route if match is not None else 'unmatched'
+
+
+def observe_request(request, response, metrics, seconds):
+    """
+    Record a served request and log it when slow
+    :param request:
+    :param response:
+    :param metrics: RequestMetrics of the request
+    :param seconds: wall time of the request
+    :return:
+    """
+    labels = (request.method, request_route(request))
+    REQUESTS.inc(1, *labels, response.status_code)
+    REQUEST_SECONDS.observe(seconds, *labels)
+    REQUEST_DB_QUERIES.observe(metrics.queries, *labels)
+    REQUEST_DB_SECONDS.observe(metrics.db_seconds, *labels)
+    REQUEST_SERIALIZE_SECONDS.observe(metrics.serialize_seconds, *labels)
+    if not response.streaming:
+        RESPONSE_BYTES.observe(len(response.content), *labels)
+    REGISTRY.write()
+    if seconds >= getattr(settings, 'NEWS_SLOW_REQUEST_SECONDS', 1.0):
+        slowest = sorted(metrics.statements, key=lambda statement: statement[0], reverse=True)
+        logger.warning("Slow request %s %s %d %.3fs: %d queries in %.3fs, serialization %.3fs%s",
+                       request.method, request.get_full_path(), response.status_code, seconds, metrics.queries,
+                       metrics.db_seconds, metrics.serialize_seconds,
+                       ''.join('\n  {:.3f}s {}'.format(duration, sql)
+                               for duration, sql in slowest[:SLOW_REQUEST_LOGGED_QUERIES]))
+
+
+def record_scrape(sources):
+    """
+    Record the per source statistics of a finished scrape job
+    :param sources: ScrapeJob.sources
+    :return:
+    """
+    for name, source in sources.items():
+        if "fetch_seconds" in source:
+            SCRAPE_FETCH_SECONDS.observe(source["fetch_seconds"], name)
+            SCRAPE_PARSE_SECONDS.observe(source["parse_seconds"], name)
+        for outcome, key in (("old", "old"), ("seen", "articles"), ("downloaded", "downloaded"), ("failed", "failed"),
+                             ("inserted", "inserted"), ("skipped", "skipped"), ("near_duplicate", "near_duplicates")):
+            if source.get(key):
+                SCRAPE_ARTICLES.inc(source[key], name, outcome)
+    REGISTRY.write(force=True)
+
+
+def is_allowed_client(address):
+    """
+    Check whether a client may read the metrics, by NEWS_METRICS_ALLOWED_IPS
+    :param address: ip address of the client
+    :return:
+    """
+    try:
+        client = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(client in ipaddress.ip_network(allowed, strict=False)
+               for allowed in getattr(settings, 'NEWS_METRICS_ALLOWED_IPS', ['127.0.0.1', '::1']))
+
+
+def serve_metrics(port, address=''):
+    """
+    Serve /metrics from a daemon thread, for the processes without http
+    server such as the scrape worker
+    :param port:
+    :param address:
+    :return: the server
+    """
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if not is_allowed_client(self.client_address[0]):
+                self.send_error(403)
+                return
+            body = REGISTRY.render()
+            self.send_response(200)
+            self.send_header('Content-Type', CONTENT_TYPE)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((address, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,50 @@
+import time
+
+from .metrics import RequestMetrics, current_request, observe_request
+from .routers import RequestWrites, pin_to_primary, replica_aliases, request_writes
+
+
+class RequestMetricsMiddleware:
+    """
+    Record the wall time, database queries, serialization time and response
+    size of every request into the histograms served at /metrics, and log
+    the slow requests with their queries.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics = RequestMetrics()
+        token = current_request.set(metrics)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_request.reset(token)
+        observe_request(request, response, metrics, time.perf_counter() - start)
+        return response
+
+
+class PrimaryAfterWriteMiddleware:
+    """
+    Pin the client of a request which wrote to the database to the primary
+    for NEWS_READ_REPLICAS['STICKY_SECONDS'], so it reads its own writes
+    while the replicas catch up. Does nothing without replicas.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not replica_aliases():
+            return self.get_response(request)
+        writes = RequestWrites()
+        token = request_writes.set(writes)
+        try:
+            response = self.get_response(request)
+        finally:
+            request_writes.reset(token)
+        if writes.wrote:
+            pin_to_primary(request)
+        return response
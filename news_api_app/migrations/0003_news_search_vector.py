@@ -0,0 +1,57 @@
+# Generated by Django 3.1.2 on 2026-10-18 04:36
+
+import django.contrib.postgres.search
+from django.db import migrations
+import news_api_app.db
+
+SEARCH_VECTOR_TRIGGER = """
+CREATE OR REPLACE FUNCTION news_api_app_news_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('pg_catalog.english', coalesce(NEW.title, '')), 'A') ||
+        setweight(to_tsvector('pg_catalog.english', coalesce(NEW.details, '')), 'B');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER news_api_app_news_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF title, details ON news_api_app_news
+    FOR EACH ROW EXECUTE PROCEDURE news_api_app_news_search_vector_update();
+
+UPDATE news_api_app_news SET title = title;
+"""
+
+DROP_SEARCH_VECTOR_TRIGGER = """
+DROP TRIGGER IF EXISTS news_api_app_news_search_vector_trigger ON news_api_app_news;
+DROP FUNCTION IF EXISTS news_api_app_news_search_vector_update();
+"""
+
+
+def create_search_vector_trigger(apps, schema_editor):
+    if news_api_app.db.is_postgresql(schema_editor.connection):
+        schema_editor.execute(SEARCH_VECTOR_TRIGGER)
+
+
+def drop_search_vector_trigger(apps, schema_editor):
+    if news_api_app.db.is_postgresql(schema_editor.connection):
+        schema_editor.execute(DROP_SEARCH_VECTOR_TRIGGER)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('news_api_app', '0002_auto_20201101_1909'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='news',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='news',
+            index=news_api_app.db.PortableGinIndex(fields=['search_vector'], name='news_search_vector_gin'),
+        ),
+        migrations.RunPython(create_search_vector_trigger, drop_search_vector_trigger),
+    ]
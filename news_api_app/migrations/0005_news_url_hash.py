@@ -0,0 +1,66 @@
+# Generated by Django 3.1.2 on 2026-10-18 05:02
+
+from django.db import migrations, models
+
+from news_api_app.utils import url_hash
+
+BATCH_SIZE = 1000
+
+
+def fill_url_hash(apps, schema_editor):
+    """
+    Hash the url of the existing news. News whose urls are the same once
+    normalized can not be kept apart by the unique url_hash, the migration
+    stops and lists them to be merged or fixed by hand, nothing is deleted.
+    """
+    News = apps.get_model('news_api_app', 'News')
+    # url hash -> ids of the news with it
+    ids = {}
+    conflicts = set()
+    batch = []
+    for news in News.objects.only('id', 'news_url').order_by('id').iterator(chunk_size=BATCH_SIZE):
+        news.url_hash = url_hash(news.news_url)
+        if news.url_hash in ids:
+            ids[news.url_hash].append(news.id)
+            conflicts.add(news.url_hash)
+            continue
+        ids[news.url_hash] = [news.id]
+        batch.append(news)
+        if len(batch) == BATCH_SIZE:
+            News.objects.bulk_update(batch, ['url_hash'])
+            batch = []
+    News.objects.bulk_update(batch, ['url_hash'])
+    if conflicts:
+        # the hashes written above are rolled back with the migration
+        raise RuntimeError(
+            "News with the same normalized news_url, delete or change the url of all but one of each group "
+            "and migrate again: {}".format("; ".join(
+                ", ".join(str(news_id) for news_id in ids[hash_]) for hash_ in sorted(conflicts, key=ids.get)))
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('news_api_app', '0004_scrapejob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='news',
+            name='url_hash',
+            field=models.CharField(editable=False, max_length=64, null=True),
+        ),
+        # nothing to undo backwards, the column is dropped
+        migrations.RunPython(fill_url_hash, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='news',
+            name='url_hash',
+            field=models.CharField(editable=False, max_length=64, unique=True),
+        ),
+        migrations.AddField(
+            model_name='scrapejob',
+            name='articles_skipped',
+            field=models.IntegerField(default=0),
+        ),
+    ]
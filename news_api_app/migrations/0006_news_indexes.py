@@ -0,0 +1,25 @@
+# Generated by Django 3.1.2 on 2026-10-18 06:15
+
+from django.db import migrations, models
+
+import news_api_app.db
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('news_api_app', '0005_news_url_hash'),
+    ]
+
+    operations = [
+        news_api_app.db.AddIndexConcurrentlyIfSupported(
+            model_name='news',
+            index=models.Index(fields=['date', 'id'], name='news_date_id_idx'),
+        ),
+        news_api_app.db.AddIndexConcurrentlyIfSupported(
+            model_name='news',
+            index=models.Index(fields=['news_from', 'date'], name='news_from_date_idx'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 3.1.2 on 2026-10-18 07:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('news_api_app', '0006_news_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FetchedPage',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('url', models.TextField()),
+                ('url_hash', models.CharField(max_length=64, unique=True)),
+                ('etag', models.CharField(blank=True, max_length=250)),
+                ('last_modified', models.CharField(blank=True, max_length=100)),
+                ('content_hash', models.CharField(blank=True, max_length=64)),
+                ('parsed', models.JSONField(default=dict)),
+                ('fetched_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
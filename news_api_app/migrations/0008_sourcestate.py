@@ -0,0 +1,25 @@
+# Generated by Django 3.1.2 on 2026-10-18 07:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('news_api_app', '0007_fetchedpage'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SourceState',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('poll_interval', models.FloatField()),
+                ('next_poll_at', models.DateTimeField(db_index=True)),
+                ('last_polled_at', models.DateTimeField(null=True)),
+                ('last_inserted', models.IntegerField(default=0)),
+                ('polls', models.IntegerField(default=0)),
+            ],
+        ),
+    ]
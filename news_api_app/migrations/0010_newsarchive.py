@@ -0,0 +1,37 @@
+# Generated by Django 3.1.2 on 2026-10-18 08:40
+
+from django.db import migrations, models
+
+import news_api_app.db
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('news_api_app', '0009_articlefingerprint'),
+    ]
+
+    operations = [
+        news_api_app.db.CreatePartitionedModel(
+            name='NewsArchive',
+            fields=[
+                ('id', models.IntegerField(primary_key=True, serialize=False)),
+                ('title', models.CharField(max_length=500)),
+                ('details', models.TextField()),
+                ('date', models.DateField()),
+                ('news_from', models.CharField(max_length=50)),
+                ('news_url', models.CharField(max_length=250)),
+                ('url_hash', models.CharField(max_length=64)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            partition_key='date',
+        ),
+        migrations.AddIndex(
+            model_name='newsarchive',
+            index=models.Index(fields=['date', 'id'], name='news_archive_date_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='newsarchive',
+            index=models.Index(fields=['url_hash'], name='news_archive_url_hash_idx'),
+        ),
+    ]
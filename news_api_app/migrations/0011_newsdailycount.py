@@ -0,0 +1,26 @@
+# Generated by Django 3.1.2 on 2026-10-18 09:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('news_api_app', '0010_newsarchive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NewsDailyCount',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('news_from', models.CharField(max_length=50)),
+                ('count', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='newsdailycount',
+            constraint=models.UniqueConstraint(fields=('date', 'news_from'), name='news_daily_count_date_from_uniq'),
+        ),
+    ]
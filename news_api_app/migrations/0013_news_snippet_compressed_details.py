@@ -0,0 +1,94 @@
+# Generated by Django 3.1.2 on 2026-10-18 10:05
+
+from django.db import migrations, models
+import news_api_app.db
+import news_api_app.utils
+
+BATCH_SIZE = 1000
+
+
+def fill_snippets(apps, schema_editor):
+    """
+    Summarize the stored news, and compress their details where the
+    application does it (the column type changed, the values did not)
+    """
+    News = apps.get_model('news_api_app', 'News')
+    NewsArchive = apps.get_model('news_api_app', 'NewsArchive')
+    compress = not news_api_app.db.is_postgresql(schema_editor.connection)
+    fields = ['snippet', 'word_count'] + (['details'] if compress else [])
+    last_id = 0
+    while True:
+        batch = list(News.objects.filter(id__gt=last_id).order_by('id').only('id', 'details')[:BATCH_SIZE])
+        if not batch:
+            break
+        for news in batch:
+            news.snippet, news.word_count = news_api_app.utils.summarize(news.details)
+        News.objects.bulk_update(batch, fields)
+        last_id = batch[-1].id
+    last_id = 0
+    while compress:
+        batch = list(NewsArchive.objects.filter(id__gt=last_id).order_by('id').only('id', 'details')[:BATCH_SIZE])
+        if not batch:
+            break
+        NewsArchive.objects.bulk_update(batch, ['details'])
+        last_id = batch[-1].id
+
+
+def decompress_details(apps, schema_editor):
+    """
+    Write the details back as text before the columns are text again
+    """
+    if news_api_app.db.is_postgresql(schema_editor.connection):
+        return
+    quote_name = schema_editor.quote_name
+    for model_name in ('News', 'NewsArchive'):
+        model = apps.get_model('news_api_app', model_name)
+        sql = 'UPDATE {} SET {} = %s WHERE {} = %s'.format(quote_name(model._meta.db_table), quote_name('details'),
+                                                          quote_name('id'))
+        last_id = 0
+        while True:
+            rows = list(model.objects.filter(id__gt=last_id).order_by('id').values_list('id', 'details')[:BATCH_SIZE])
+            if not rows:
+                break
+            with schema_editor.connection.cursor() as cursor:
+                cursor.executemany(sql, [(details, id_) for id_, details in rows])
+            last_id = rows[-1][0]
+
+
+def set_lz4_compression(apps, schema_editor):
+    for model_name in ('News', 'NewsArchive'):
+        model = apps.get_model('news_api_app', model_name)
+        news_api_app.db.set_lz4_compression(schema_editor, model._meta.db_table, 'details')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('news_api_app', '0012_news_changes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='news',
+            name='snippet',
+            field=models.CharField(blank=True, default='', max_length=300),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='news',
+            name='word_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='news',
+            name='details',
+            field=news_api_app.db.CompressedTextField(),
+        ),
+        migrations.AlterField(
+            model_name='newsarchive',
+            name='details',
+            field=news_api_app.db.CompressedTextField(),
+        ),
+        migrations.RunPython(fill_snippets, decompress_details),
+        migrations.RunPython(set_lz4_compression, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 3.1.2 on 2026-10-18 10:45
+
+from django.db import migrations, models
+
+
+def drop_cached_articles(apps, schema_editor):
+    # the articles are stored in the news, only their validators are kept
+    FetchedPage = apps.get_model('news_api_app', 'FetchedPage')
+    FetchedPage.objects.filter(parsed__has_key='text').update(parsed={})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('news_api_app', '0014_revokedtoken'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='fetchedpage',
+            name='fetched_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.RunPython(drop_cached_articles, migrations.RunPython.noop),
+    ]
@@ -1,13 +1,234 @@
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 
+from .db import CompressedTextField, PortableGinIndex
+from .utils import summarize, url_hash
+
+
+class NewsManager(models.Manager):
+    """Manager for the News entity"""
+
+    def get_queryset(self):
+        # the search vector is only used inside the database, never load it
+        return super().get_queryset().defer('search_vector')
+
 
 class News(models.Model):
     """Model for the News entity"""
     title = models.CharField(max_length=500, blank=False)
-    details = models.TextField(blank=False)
+    details = CompressedTextField(blank=False)
+    # served by the lists and the search instead of the details, see utils.summarize
+    snippet = models.CharField(max_length=300, blank=True)
+    word_count = models.IntegerField(default=0)
     date = models.DateField(blank=False)
     news_from = models.CharField(max_length=50, blank=False)
     news_url = models.CharField(max_length=250, blank=False)
+    # dedup key, hash of the normalized news_url
+    url_hash = models.CharField(max_length=64, unique=True, editable=False)
+    # maintained by a database trigger on PostgreSQL, see migration 0003
+    search_vector = SearchVectorField(null=True, editable=False)
+    # time of the last write, served with the changes of GET /news/changes/
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = NewsManager()
+
+    class Meta:
+        indexes = [
+            PortableGinIndex(fields=['search_vector'], name='news_search_vector_gin'),
+            # keyset pagination and export order
+            models.Index(fields=['date', 'id'], name='news_date_id_idx'),
+            # per source filters of the export
+            models.Index(fields=['news_from', 'date'], name='news_from_date_idx'),
+        ]
 
     def __str__(self):
         return self.id
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # (date, news_from) as loaded, an update moves the NewsDailyCount of this key, see rollup.py
+        if 'date' in field_names and 'news_from' in field_names:
+            instance._loaded_rollup_key = (instance.date, instance.news_from)
+        return instance
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None:
+            self.url_hash = url_hash(self.news_url)
+            self.snippet, self.word_count = summarize(self.details)
+        elif update_fields:
+            # auto_now is only saved when listed
+            kwargs['update_fields'] = set(update_fields).union(('updated_at',))
+            if 'news_url' in update_fields:
+                self.url_hash = url_hash(self.news_url)
+                kwargs['update_fields'].add('url_hash')
+            if 'details' in update_fields:
+                self.snippet, self.word_count = summarize(self.details)
+                kwargs['update_fields'].update(('snippet', 'word_count'))
+        super().save(*args, **kwargs)
+
+
+class ArticleFingerprint(models.Model):
+    """
+    Model for the SimHash of the details of a news. The 64 bits are split in
+    four indexed 16 bit bands, two fingerprints within 3 bits of each other
+    have at least one equal band, so near duplicates are found by index lookups.
+    """
+    news = models.OneToOneField(News, on_delete=models.CASCADE, primary_key=True, related_name='fingerprint')
+    # signed, as stored by BigIntegerField
+    simhash = models.BigIntegerField()
+    band0 = models.IntegerField(db_index=True)
+    band1 = models.IntegerField(db_index=True)
+    band2 = models.IntegerField(db_index=True)
+    band3 = models.IntegerField(db_index=True)
+
+    def __str__(self):
+        return "fingerprint of news {}".format(self.news_id)
+
+
+class NewsDailyCount(models.Model):
+    """
+    Model for the number of news of a source published on a day, archived
+    news included. Kept up to date by rollup.py, serves GET /news/stats/.
+    """
+    date = models.DateField()
+    news_from = models.CharField(max_length=50)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'news_from'], name='news_daily_count_date_from_uniq'),
+        ]
+
+    def __str__(self):
+        return "{} news of {} on {}".format(self.count, self.news_from, self.date)
+
+
+class NewsChange(models.Model):
+    """
+    Model for the change log of the news served by GET /news/changes/, one
+    row per inserted, updated, deleted or archived news, written by
+    changes.py in the transaction of the write
+    """
+    INSERT = 'insert'
+    UPDATE = 'update'
+    DELETE = 'delete'
+    ARCHIVE = 'archive'
+    ACTION_CHOICES = (
+        (INSERT, 'Insert'),
+        (UPDATE, 'Update'),
+        (DELETE, 'Delete'),
+        (ARCHIVE, 'Archive'),
+    )
+    seq = models.BigAutoField(primary_key=True)
+    # txid_current() of the writing transaction on PostgreSQL, 0 elsewhere
+    txid = models.BigIntegerField(default=0)
+    news_id = models.IntegerField()
+    action = models.CharField(max_length=10, choices=ACTION_CHOICES)
+    changed_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        indexes = [
+            # reading the feed in (txid, seq) order from a cursor
+            models.Index(fields=['txid', 'seq'], name='news_change_txid_seq_idx'),
+        ]
+
+    def __str__(self):
+        return "{} of news {}".format(self.action, self.news_id)
+
+
+class NewsArchive(models.Model):
+    """
+    Model for the news moved out of the News table once older than
+    NEWS_ARCHIVE_AFTER_DAYS, see archive.py. On PostgreSQL the table is range
+    partitioned by month of date, the primary key is (id, date) there.
+    """
+    # id the news had in the News table
+    id = models.IntegerField(primary_key=True)
+    title = models.CharField(max_length=500)
+    details = CompressedTextField()
+    date = models.DateField()
+    news_from = models.CharField(max_length=50)
+    news_url = models.CharField(max_length=250)
+    url_hash = models.CharField(max_length=64)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['date', 'id'], name='news_archive_date_id_idx'),
+            models.Index(fields=['url_hash'], name='news_archive_url_hash_idx'),
+        ]
+
+    def __str__(self):
+        return "archived news {}".format(self.id)
+
+
+class ScrapeJob(models.Model):
+    """Model for a scrape of the news sources, run by the scrape worker"""
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (SUCCEEDED, 'Succeeded'),
+        (FAILED, 'Failed'),
+    )
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED, db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True)
+    finished_at = models.DateTimeField(null=True)
+    # progress, counts and timings of every source
+    sources = models.JSONField(default=dict)
+    articles_inserted = models.IntegerField(default=0)
+    articles_skipped = models.IntegerField(default=0)
+    error = models.TextField(blank=True)
+
+    def __str__(self):
+        return "scrape job {} ({})".format(self.id, self.status)
+
+
+class SourceState(models.Model):
+    """Model for the polling schedule of a news source, adapted by the scheduler"""
+    name = models.CharField(max_length=100, unique=True)
+    # seconds between two polls, adapted to how often the source publishes
+    poll_interval = models.FloatField()
+    next_poll_at = models.DateTimeField(db_index=True)
+    last_polled_at = models.DateTimeField(null=True)
+    last_inserted = models.IntegerField(default=0)
+    polls = models.IntegerField(default=0)
+
+    def __str__(self):
+        return self.name
+
+
+class FetchedPage(models.Model):
+    """Model for the last fetch of a page by the scraper, used for conditional re-scrapes"""
+    url = models.TextField()
+    url_hash = models.CharField(max_length=64, unique=True)
+    etag = models.CharField(max_length=250, blank=True)
+    last_modified = models.CharField(max_length=100, blank=True)
+    # sha256 of the body, detects unchanged pages served without validators
+    content_hash = models.CharField(max_length=64, blank=True)
+    # article urls of a homepage or entries of a feed, empty for an article
+    parsed = models.JSONField(default=dict)
+    # pruned after SCRAPER_FETCH_CACHE_KEEP_DAYS, see fetch_cache.py
+    fetched_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    def __str__(self):
+        return self.url
+
+
+class RevokedToken(models.Model):
+    """
+    Model for the access tokens revoked before their expiry, shared by the
+    workers through authentication.py and deleted once expired
+    """
+    # jti claim of the token, sha256 of the token without one
+    jti = models.CharField(max_length=64, unique=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return self.jti
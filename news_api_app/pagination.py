@@ -0,0 +1,116 @@
+import base64
+import binascii
+import datetime
+
+from django.conf import settings
+from django.db.models import Q
+
+DEFAULT_PAGE_SIZE = getattr(settings, 'NEWS_PAGE_SIZE', 50)
+MAX_PAGE_SIZE = getattr(settings, 'NEWS_MAX_PAGE_SIZE', 500)
+
+
+class PaginationError(Exception):
+    """Raised when the cursor, page size or field list of a request is invalid"""
+
+
+def encode_cursor(date, pk):
+    """
+    Build an opaque cursor pointing at the (date, id) of the last row of a page
+    :param date: date of the last row
+    :param pk: id of the last row
+    :return:
+    """
+    raw = "{}|{}".format(date.isoformat(), pk).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """
+    Decode the cursor produced by encode_cursor back to (date, id)
+    :param cursor:
+    :return:
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        date, pk = base64.urlsafe_b64decode(padded.encode()).decode().split("|")
+        return datetime.datetime.strptime(date, "%Y-%m-%d").date(), int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise PaginationError("Invalid cursor")
+
+
+def parse_page_size(value):
+    """
+    Validate the page_size query parameter and bound it by MAX_PAGE_SIZE
+    :param value: raw query parameter, may be None
+    :return:
+    """
+    if value in (None, ""):
+        return DEFAULT_PAGE_SIZE
+    try:
+        page_size = int(value)
+    except (TypeError, ValueError):
+        raise PaginationError("page_size must be an integer")
+    if page_size < 1:
+        raise PaginationError("page_size must be greater than 0")
+    return min(page_size, MAX_PAGE_SIZE)
+
+
+def parse_page_number(value):
+    """
+    Validate the 1 based page number of paginated search results
+    :param value: raw parameter, may be None
+    :return:
+    """
+    if value in (None, ""):
+        return 1
+    try:
+        page = int(value)
+    except (TypeError, ValueError):
+        raise PaginationError("page must be an integer")
+    if page < 1:
+        raise PaginationError("page must be greater than 0")
+    return page
+
+
+def parse_fields(value, allowed_fields):
+    """
+    Validate the comma separated fields query parameter
+    :param value: raw query parameter, may be None
+    :param allowed_fields: fields that can be projected
+    :return: tuple of fields in the order of allowed_fields
+    """
+    if value in (None, ""):
+        return tuple(allowed_fields)
+    requested = {field.strip() for field in value.split(",") if field.strip()}
+    unknown = requested.difference(allowed_fields)
+    if unknown:
+        raise PaginationError("Unknown fields: " + ", ".join(sorted(unknown)))
+    return tuple(field for field in allowed_fields if field in requested)
+
+
+def news_key(news):
+    return news.date, news.id
+
+
+def paginate_keyset(queryset, cursor=None, page_size=DEFAULT_PAGE_SIZE, key=news_key):
+    """
+    Return one page of the queryset ordered newest first on (date, id).
+
+    The page is located with a (date, id) comparison instead of an OFFSET so
+    the cost of fetching a page does not depend on how deep the client is.
+    :param queryset:
+    :param cursor: cursor returned with the previous page, None for the first page
+    :param page_size:
+    :param key: gives the (date, id) of a row, for values_list querysets
+    :return: (rows, next_cursor) where next_cursor is None on the last page
+    """
+    queryset = queryset.order_by('-date', '-id')
+    if cursor:
+        date, pk = decode_cursor(cursor)
+        queryset = queryset.filter(Q(date__lt=date) | Q(date=date, id__lt=pk))
+    rows = list(queryset[:page_size + 1])
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        next_cursor = encode_cursor(*key(rows[-1]))
+    return rows, next_cursor
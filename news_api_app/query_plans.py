@@ -0,0 +1,83 @@
+import datetime
+
+from django.contrib.postgres.search import SearchQuery
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .db import is_postgresql
+from .models import ArticleFingerprint, News, NewsArchive, NewsChange, NewsDailyCount, ScrapeJob
+from .serializers import NewsRowSerializer
+
+
+def endpoint_queries():
+    """
+    The queries behind the endpoints, by name
+    :return: list of (name, queryset, postgresql only)
+    """
+    fields = NewsRowSerializer().row_fields
+    today = datetime.date.today()
+    return [
+        ("news list, first page", News.objects.values_list(*fields).order_by('-date', '-id')[:51], False),
+        ("news list, next page", News.objects.values_list(*fields).filter(
+            Q(date__lt=today) | Q(date=today, id__lt=1000)).order_by('-date', '-id')[:51], False),
+        ("news detail", News.objects.filter(id=1), False),
+        ("news dedup", News.objects.filter(url_hash__in=['0' * 64, 'f' * 64]).values_list('url_hash'), False),
+        ("news export by source", News.objects.filter(news_from='CNN', date__gte=today).order_by('date', 'id')
+         .values_list(*fields), False),
+        ("news search", News.objects.filter(
+            search_vector=SearchQuery('election', config='english', search_type='websearch')).values_list('id'),
+         True),
+        ("near duplicate lookup", ArticleFingerprint.objects.filter(
+            Q(band0__in=[1, 2]) | Q(band1__in=[3]) | Q(band2__in=[4]) | Q(band3__in=[5])).values_list(
+            'news_id', 'simhash'), False),
+        ("archive move", News.objects.filter(date__lt=today).order_by('date', 'id').values_list(*fields)[:1000],
+         False),
+        ("archived news detail", NewsArchive.objects.filter(id=1), False),
+        ("archive dedup", NewsArchive.objects.filter(url_hash__in=['0' * 64, 'f' * 64]).values_list('url_hash'),
+         False),
+        ("news stats", NewsDailyCount.objects.filter(date__gte=today, count__gt=0).values_list(
+            'date', 'news_from', 'count'), False),
+        ("news changes", NewsChange.objects.filter(Q(txid__gt=1000) | Q(txid=1000, seq__gt=1)).order_by(
+            'txid', 'seq').values_list('txid', 'seq', 'news_id', 'action')[:51], False),
+        ("stale scrape jobs", ScrapeJob.objects.filter(status=ScrapeJob.RUNNING, started_at__lt=timezone.now()),
+         False),
+        ("scrape job claim", ScrapeJob.objects.filter(status=ScrapeJob.QUEUED).order_by('id')[:1], False),
+    ]
+
+
+def uses_full_scan(plan, table):
+    """
+    Check whether a query plan reads the whole table instead of an index
+    :param plan: output of QuerySet.explain()
+    :param table: name of the table
+    :return:
+    """
+    for line in plan.splitlines():
+        if is_postgresql(connection):
+            if 'Seq Scan on ' + table in line:
+                return True
+        # SQLite: "SCAN news_api_app_news" without "USING ... INDEX"
+        elif 'SCAN ' + table in line.replace('TABLE ', '') and 'INDEX' not in line:
+            return True
+    return False
+
+
+def explain_endpoint_queries():
+    """
+    EXPLAIN the queries of the endpoints which the database can run, run by
+    the check_query_plans command and the tests
+    :return: list of (name, plan, whether it reads a whole table)
+    """
+    results = []
+    for name, queryset, postgresql_only in endpoint_queries():
+        if postgresql_only and not is_postgresql(connection):
+            continue
+        with transaction.atomic():
+            if is_postgresql(connection):
+                # on a small table a seq scan is cheaper, make it the last resort
+                with connection.cursor() as cursor:
+                    cursor.execute("SET LOCAL enable_seqscan = off")
+            plan = queryset.explain()
+        results.append((name, plan, uses_full_scan(plan, queryset.model._meta.db_table)))
+    return results
@@ -0,0 +1,115 @@
+from collections import Counter
+
+from django.db import connection, transaction
+from django.db.models import Count, Sum
+from django.dispatch import receiver
+
+from .models import News, NewsArchive, NewsDailyCount
+from .signals import news_changed
+
+# rows written per statement
+BATCH_SIZE = 500
+
+
+def rollup_key(news):
+    """
+    (date, news_from) of a news as stored, the views set datetimes on date
+    :param news:
+    :return:
+    """
+    return News._meta.get_field('date').to_python(news.date), news.news_from
+
+
+def apply_deltas(deltas):
+    """
+    Add the deltas to the daily counts with an upsert (PostgreSQL and
+    SQLite 3.24+), concurrent writers never collide on a missing row
+    :param deltas: {(date, news_from): change of the count}
+    :return:
+    """
+    rows = [(connection.ops.adapt_datefield_value(date), news_from, delta)
+            for (date, news_from), delta in deltas.items() if delta]
+    if not rows:
+        return
+    sql = ("INSERT INTO {table} ({date}, {news_from}, {count}) VALUES (%s, %s, %s) "
+           "ON CONFLICT ({date}, {news_from}) DO UPDATE SET {count} = {table}.{count} + excluded.{count}").format(
+        **{name: connection.ops.quote_name(column) for name, column in (
+            ('table', NewsDailyCount._meta.db_table), ('date', 'date'), ('news_from', 'news_from'),
+            ('count', 'count'))})
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), BATCH_SIZE):
+            cursor.executemany(sql, rows[start:start + BATCH_SIZE])
+    emptied = [key for key, delta in deltas.items() if delta < 0]
+    for date, news_from in emptied:
+        NewsDailyCount.objects.filter(date=date, news_from=news_from, count__lte=0).delete()
+
+
+@receiver(news_changed)
+def update_daily_counts(sender, created, updated, deleted, archived=False, **kwargs):
+    """
+    Keep the daily counts in line with the writes, in the transaction of the
+    write. An update moves the count from the key the news was loaded with
+    to its new key, news moved to the archive are still counted.
+    :return:
+    """
+    deltas = Counter()
+    for news in created:
+        if news.id is not None:
+            deltas[rollup_key(news)] += 1
+    if not archived:
+        for news in deleted:
+            deltas[getattr(news, '_loaded_rollup_key', None) or rollup_key(news)] -= 1
+    for news in updated:
+        key = rollup_key(news)
+        loaded = getattr(news, '_loaded_rollup_key', None)
+        if loaded is not None and loaded != key:
+            deltas[loaded] -= 1
+            deltas[key] += 1
+        news._loaded_rollup_key = key
+    apply_deltas(deltas)
+
+
+def rebuild_daily_counts():
+    """
+    Recount the news and the archive, for the news stored before the rollup existed
+    :return: number of rows of the rollup
+    """
+    counts = Counter()
+    for model in (News, NewsArchive):
+        for date, news_from, count in model.objects.order_by().values_list('date', 'news_from').annotate(
+                count=Count('id')):
+            counts[date, news_from] += count
+    with transaction.atomic():
+        NewsDailyCount.objects.all().delete()
+        NewsDailyCount.objects.bulk_create([
+            NewsDailyCount(date=date, news_from=news_from, count=count)
+            for (date, news_from), count in counts.items()
+        ], batch_size=BATCH_SIZE)
+    return len(counts)
+
+
+def daily_counts(date_from=None, date_to=None, news_from=None, top=10):
+    """
+    Facets of the news from the rollup, the cost depends on the number of
+    days and sources asked for, not on the number of news
+    :param date_from: first date included, None for no bound
+    :param date_to: last date included, None for no bound
+    :param news_from: only this source, None for all
+    :param top: number of sources in the ranking
+    :return: {"total", "sources": top sources by count, "days": count per day and source}
+    """
+    queryset = NewsDailyCount.objects.filter(count__gt=0)
+    if date_from is not None:
+        queryset = queryset.filter(date__gte=date_from)
+    if date_to is not None:
+        queryset = queryset.filter(date__lte=date_to)
+    if news_from is not None:
+        queryset = queryset.filter(news_from=news_from)
+    sources = queryset.order_by().values('news_from').annotate(total=Sum('count')).order_by('-total', 'news_from')
+    return {
+        "total": queryset.aggregate(total=Sum('count'))['total'] or 0,
+        "sources": [{"news_from": row['news_from'], "count": row['total']} for row in sources[:top]],
+        "days": [{"date": date.isoformat(), "news_from": source, "count": count}
+                 for date, source, count in queryset.order_by('date', 'news_from').values_list(
+                     'date', 'news_from', 'count')],
+    }
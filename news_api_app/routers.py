@@ -0,0 +1,155 @@
+import contextvars
+import functools
+import random
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.signals import request_started
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.dispatch import receiver
+
+PIN_KEY = 'news_api_app:primary-pin:{}'
+
+# set by read_from_replica around the read only views
+_replica_reads = contextvars.ContextVar('news_api_app_replica_reads', default=False)
+# RequestWrites of the request being served, set by PrimaryAfterWriteMiddleware
+request_writes = contextvars.ContextVar('news_api_app_request_writes', default=None)
+
+
+def replica_config():
+    return getattr(settings, 'NEWS_READ_REPLICAS', {})
+
+
+def replica_aliases():
+    return replica_config().get('DATABASES', [])
+
+
+class ReplicaRouter:
+    """
+    Send the reads of the views decorated with read_from_replica to a random
+    replica of NEWS_READ_REPLICAS, everything else (writes, authentication,
+    jobs, migrations) to the primary
+    """
+
+    def db_for_read(self, model, **hints):
+        aliases = replica_aliases()
+        if aliases and _replica_reads.get():
+            return random.choice(aliases)
+        return DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        writes = request_writes.get()
+        if writes is not None:
+            writes.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # the replicas hold the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in replica_aliases()
+
+
+def pin_cache():
+    return caches[replica_config().get('ALIAS', 'default')]
+
+
+def client_key(request):
+    """
+    Pin key of the client of a request, its user
+    :param request: HttpRequest or DRF Request
+    :return: the key or None for an anonymous client
+    """
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        return None
+    return PIN_KEY.format(user.pk)
+
+
+def reads_from_primary(request):
+    """
+    Whether the client wrote within the last STICKY_SECONDS and has to read
+    from the primary, remembered on the request
+    :param request: HttpRequest or DRF Request
+    :return:
+    """
+    request = getattr(request, '_request', request)
+    pinned = getattr(request, '_news_api_reads_from_primary', None)
+    if pinned is None:
+        key = client_key(request) if replica_aliases() else None
+        pinned = key is not None and pin_cache().get(key) is not None
+        request._news_api_reads_from_primary = pinned
+    return pinned
+
+
+def read_from_replica(view):
+    """
+    Run a read only view (request, ...) on the replicas, unless the client
+    has to read its own writes from the primary. Use method_decorator on the
+    methods of an APIView.
+    :param view:
+    :return:
+    """
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not replica_aliases() or reads_from_primary(request):
+            return view(request, *args, **kwargs)
+        with replica_reads():
+            return view(request, *args, **kwargs)
+    return wrapper
+
+
+@contextmanager
+def replica_reads():
+    token = _replica_reads.set(True)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+class RequestWrites:
+    """Whether the request being served wrote to the database, see ReplicaRouter.db_for_write"""
+
+    def __init__(self):
+        self.wrote = False
+
+
+def pin_to_primary(request):
+    """
+    Make the client of a request which wrote read from the primary for the
+    next STICKY_SECONDS, while the replicas catch up
+    :param request:
+    :return:
+    """
+    # DRF sets the authenticated user on the request
+    key = client_key(request)
+    if key is not None:
+        pin_cache().set(key, True, replica_config().get('STICKY_SECONDS', 5))
+
+
+def check_connections():
+    """
+    Close the persistent connections which no longer work (database restart,
+    failover, idle timeout of a proxy), at most every
+    NEWS_DB_HEALTH_CHECK_SECONDS per connection, so the next query reconnects instead of failing
+    :return:
+    """
+    interval = getattr(settings, 'NEWS_DB_HEALTH_CHECK_SECONDS', 10)
+    now = time.monotonic()
+    for connection in connections.all():
+        if connection.connection is None or connection.in_atomic_block:
+            continue
+        if now - getattr(connection, '_news_api_checked_at', 0) < interval:
+            continue
+        connection._news_api_checked_at = now
+        if not connection.is_usable():
+            connection.close()
+
+
+@receiver(request_started)
+def check_connections_on_request(sender, **kwargs):
+    check_connections()
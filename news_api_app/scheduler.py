@@ -0,0 +1,113 @@
+import datetime
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Min
+from django.utils import timezone
+
+from .jobs import LIMIT, load_sources, run_job
+from .models import ScrapeJob, SourceState
+
+# the interval is divided by SPEEDUP when a poll fills the article limit of the
+# source, multiplied by BACKOFF when it finds nothing new
+SPEEDUP = 2.0
+BACKOFF = 1.5
+
+
+def poll_bounds(config):
+    """
+    Initial, shortest and longest poll interval of a source
+    :param config: NewsPapers.json entry of the source
+    :return: (poll_interval, min_poll_interval, max_poll_interval) in seconds
+    """
+    interval = config.get('poll_interval', getattr(settings, 'SCRAPER_POLL_INTERVAL', 900))
+    shortest = config.get('min_poll_interval', min(interval, getattr(settings, 'SCRAPER_MIN_POLL_INTERVAL', 120)))
+    longest = config.get('max_poll_interval', max(interval, getattr(settings, 'SCRAPER_MAX_POLL_INTERVAL', 21600)))
+    return interval, shortest, longest
+
+
+def next_interval(interval, inserted, config):
+    """
+    Adapt the poll interval of a source to what its last poll found: a full
+    page of new articles means articles may have been missed, so poll sooner,
+    no new article means the source is quiet, so back off
+    :param interval: current interval in seconds
+    :param inserted: number of news inserted by the last poll
+    :param config: NewsPapers.json entry of the source
+    :return: new interval in seconds
+    """
+    _, shortest, longest = poll_bounds(config)
+    if inserted >= config.get('limit', LIMIT):
+        interval /= SPEEDUP
+    elif not inserted:
+        interval *= BACKOFF
+    return min(max(interval, shortest), longest)
+
+
+def sync_states(sources, now):
+    """
+    Create the schedule of the sources seen for the first time, they are due now
+    :param sources: mapping of source name to its NewsPapers.json entry
+    :param now:
+    :return:
+    """
+    known = set(SourceState.objects.filter(name__in=list(sources)).values_list('name', flat=True))
+    SourceState.objects.bulk_create([
+        SourceState(name=name, poll_interval=poll_bounds(config)[0], next_poll_at=now)
+        for name, config in sources.items() if name not in known
+    ], ignore_conflicts=True)
+
+
+def claim_due_sources(sources, now):
+    """
+    Take the sources whose poll is due. Their next poll is pushed by one interval
+    right away so concurrent schedulers skip them, even if this one dies.
+    :param sources: mapping of source name to its NewsPapers.json entry
+    :param now:
+    :return: list of the claimed SourceState
+    """
+    with transaction.atomic():
+        states = list(SourceState.objects.select_for_update(skip_locked=True).filter(
+            name__in=list(sources), next_poll_at__lte=now).order_by('next_poll_at'))
+        for state in states:
+            state.next_poll_at = now + datetime.timedelta(seconds=state.poll_interval)
+            state.save(update_fields=['next_poll_at'])
+    return states
+
+
+def poll_due_sources(engine=None):
+    """
+    Scrape the sources whose poll is due in one scrape job and schedule their next poll
+    :param engine: ScrapeEngine to use, the default one of run_job when None
+    :return: the ScrapeJob or None when no source was due
+    """
+    sources = load_sources()
+    now = timezone.now()
+    sync_states(sources, now)
+    states = claim_due_sources(sources, now)
+    if not states:
+        return None
+    job = ScrapeJob.objects.create(status=ScrapeJob.RUNNING, started_at=now)
+    run_job(job, engine, [state.name for state in states])
+    finished = timezone.now()
+    for state in states:
+        # a failed scrape says nothing about the source, keep its interval
+        if job.status == ScrapeJob.SUCCEEDED:
+            state.last_inserted = job.sources[state.name].get("inserted", 0)
+            state.poll_interval = next_interval(state.poll_interval, state.last_inserted, sources[state.name])
+        state.last_polled_at = finished
+        state.next_poll_at = finished + datetime.timedelta(seconds=state.poll_interval)
+        state.polls += 1
+        state.save()
+    return job
+
+
+def seconds_until_next_poll():
+    """
+    Time until the next source is due
+    :return: seconds, None when no source is scheduled
+    """
+    next_poll_at = SourceState.objects.aggregate(next_poll_at=Min('next_poll_at'))['next_poll_at']
+    if next_poll_at is None:
+        return None
+    return max((next_poll_at - timezone.now()).total_seconds(), 0.0)
@@ -0,0 +1,488 @@
+import datetime
+import hashlib
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+import newspaper
+import requests
+from django.conf import settings
+
+from .discovery import feed_links, is_recent, newest_first, parse_feed
+from .fetch_cache import FetchCache
+
+USER_AGENT = newspaper.Config().browser_user_agent
+# children of a sitemap index read per scrape, the most recent ones
+SITEMAP_CHILDREN = 3
+
+
+def parse_article(url, html):
+    """
+    Extract title, text and publish date from a downloaded article.
+
+    Runs in the parse process pool, so it takes and returns plain data only.
+    :param url:
+    :param html:
+    :return:
+    """
+    article = newspaper.Article(url)
+    article.download(input_html=html)
+    article.parse()
+    return {
+        "url": article.url,
+        "title": article.title,
+        "text": article.text,
+        "publish_date": article.publish_date,
+    }
+
+
+def extract_article_urls(link, html):
+    """
+    Find the article urls of a source from its already downloaded homepage,
+    the categories and feeds are downloaded as newspaper.build does
+    :param link: homepage of the source
+    :param html: html of the homepage
+    :return:
+    """
+    source = newspaper.Source(link, memoize_articles=False)
+    source.html = html
+    source.parse()
+    source.set_categories()
+    source.download_categories()
+    source.parse_categories()
+    source.set_feeds()
+    source.download_feeds()
+    source.generate_articles()
+    return [article.url for article in source.articles]
+
+
+def timed(function, *args):
+    """
+    Call function and measure how long it took
+    :param function:
+    :param args:
+    :return: (result, seconds)
+    """
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+class HostLimiter:
+    """Bound the number of requests in flight against every host"""
+
+    def __init__(self, per_host):
+        self.per_host = per_host
+        self._semaphores = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def limit(self, url):
+        host = urlsplit(url).netloc.lower()
+        with self._lock:
+            semaphore = self._semaphores.get(host)
+            if semaphore is None:
+                semaphore = self._semaphores[host] = threading.BoundedSemaphore(self.per_host)
+        with semaphore:
+            yield
+
+
+class SourceLimit:
+    """
+    Concurrency and request rate allowed against one source, the requests are
+    spaced by 1 / rps seconds
+    """
+
+    def __init__(self, max_concurrency=None, rps=None):
+        self._semaphore = threading.BoundedSemaphore(max_concurrency) if max_concurrency else None
+        self.interval = 1.0 / rps if rps else 0.0
+        self._next_request = 0.0
+        self._lock = threading.Lock()
+
+    def wait_turn(self):
+        """
+        Block until the next request of the source may be sent
+        :return:
+        """
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_request)
+            self._next_request = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+    @contextmanager
+    def limit(self):
+        if self._semaphore is None:
+            self.wait_turn()
+            yield
+            return
+        with self._semaphore:
+            self.wait_turn()
+            yield
+
+
+UNLIMITED = SourceLimit()
+
+
+class ScrapeEngine:
+    """
+    Scrape many news sources at once.
+
+    The article urls come from the RSS/Atom feeds and news sitemaps of the
+    sources, the homepage of a source without feed is crawled by newspaper.
+    Pages are downloaded by a bounded thread pool with a per-host concurrency
+    limit, the CPU heavy article parsing runs in a process pool so it does
+    not serialize on the GIL.
+    """
+
+    def __init__(self, max_workers=None, per_host=None, parse_processes=None, timeout=None, fetch_cache=None,
+                 known_urls=None):
+        self.max_workers = max_workers or getattr(settings, 'SCRAPER_MAX_WORKERS', 16)
+        self.per_host = per_host or getattr(settings, 'SCRAPER_PER_HOST_CONCURRENCY', 4)
+        # 0 parses in the download threads, None uses one process per CPU
+        self.parse_processes = parse_processes if parse_processes is not None else getattr(
+            settings, 'SCRAPER_PARSE_PROCESSES', None)
+        self.timeout = timeout or getattr(settings, 'SCRAPER_TIMEOUT', 10)
+        self.limiter = HostLimiter(self.per_host)
+        # validators and parsed results of the pages fetched before, kept by the engine when not given
+        self.fetch_cache = fetch_cache if fetch_cache is not None else FetchCache()
+        # callable returning which of the given article urls are already stored, those are not fetched
+        self.known_urls = known_urls
+
+    def fetch(self, url, cached=None, source_limit=None):
+        """
+        Download a single page, conditionally when it was fetched before
+        :param url:
+        :param cached: fetch cache entry of the url or None
+        :param source_limit: SourceLimit of the source of the page or None
+        :return: dict with status, html (None on 304), etag, last_modified,
+            content_hash and the number of body bytes received
+        """
+        with (source_limit or UNLIMITED).limit(), self.limiter.limit(url):
+            response = requests.get(url, headers=self.request_headers(cached), timeout=self.timeout)
+        return self.fetch_result(response.status_code, response.content, response.text, response.headers, cached)
+
+    @staticmethod
+    def request_headers(cached):
+        """
+        Headers of a request, conditional when the page was fetched before
+        :param cached: fetch cache entry of the url or None
+        :return:
+        """
+        headers = {"User-Agent": USER_AGENT}
+        if cached is not None:
+            if cached["etag"]:
+                headers["If-None-Match"] = cached["etag"]
+            if cached["last_modified"]:
+                headers["If-Modified-Since"] = cached["last_modified"]
+        return headers
+
+    @staticmethod
+    def fetch_result(status_code, content, text, headers, cached):
+        """
+        Result of fetch from a received response, an error status raises
+        :param status_code:
+        :param content: body bytes
+        :param text: decoded body
+        :param headers: response headers
+        :param cached: fetch cache entry of the url or None
+        :return:
+        """
+        if status_code == 304 and cached is not None:
+            return {"status": 304, "html": None, "etag": cached["etag"], "last_modified": cached["last_modified"],
+                    "content_hash": cached["content_hash"], "bytes": len(content)}
+        if status_code >= 400:
+            raise requests.HTTPError("{} Error for url".format(status_code))
+        return {
+            "status": status_code,
+            "html": text,
+            "etag": headers.get("ETag", ""),
+            "last_modified": headers.get("Last-Modified", ""),
+            "content_hash": hashlib.sha256(content).hexdigest(),
+            "bytes": len(content),
+        }
+
+    def cached_pages(self, link, feeds):
+        """
+        Fetch cache entries of the pages the discovery of a source may fetch:
+        its homepage, its feeds, the feeds its homepage announced and the
+        sitemaps listed by its sitemap indexes
+        :param link: homepage of the source
+        :param feeds: feed and sitemap urls of the source
+        :return: {url: entry}
+        """
+        urls = [link] + list(feeds)
+        self.fetch_cache.load(urls)
+        homepage = self.fetch_cache.get(link)
+        if homepage is not None and not feeds:
+            urls.extend(homepage["parsed"].get("feed_urls", []))
+            self.fetch_cache.load(urls)
+        children = []
+        for url in urls[1:]:
+            entry = self.fetch_cache.get(url)
+            if entry is not None:
+                children.extend(sitemap for sitemap, _ in entry["parsed"].get("sitemaps", []))
+        self.fetch_cache.load(children)
+        return {url: self.fetch_cache.get(url) for url in urls + children if self.fetch_cache.get(url) is not None}
+
+    def discovery(self, link, feeds, cached):
+        """
+        Steps of the discovery of the article urls of a source, whatever
+        downloads the pages: yields the urls to fetch and is sent their fetch
+        result or thrown the error of the fetch. The RSS/Atom feeds and news
+        sitemaps of the source are read first, else the feeds announced by
+        its homepage. Unchanged feeds are not parsed again.
+        :param link: homepage of the source
+        :param feeds: feed and sitemap urls of the source, "feeds" of NewsPapers.json
+        :param cached: result of cached_pages
+        :return: (pages, entries) where pages are {url: (fetch result, parsed)} to
+            cache and entries [[article url, iso publication date or None]],
+            None when the source has no feed and its homepage has to be crawled
+        """
+        pages = {}
+        if not feeds:
+            page = yield link
+            homepage = cached.get(link)
+            if self.is_unchanged(page, homepage) and "feed_urls" in homepage["parsed"]:
+                feeds = homepage["parsed"]["feed_urls"]
+            else:
+                feeds = feed_links(link, page["html"])
+            pages[link] = (page, {"feed_urls": feeds})
+        entries, sitemaps, read = [], [], 0
+        for url in feeds:
+            try:
+                parsed = yield from self.read_feed(url, cached, pages)
+            except Exception:
+                continue
+            read += 1
+            entries.extend(parsed["entries"])
+            sitemaps.extend(parsed["sitemaps"])
+        today = datetime.date.today()
+        for url, _ in newest_first([sitemap for sitemap in sitemaps if is_recent(sitemap[1], today)])[
+                :SITEMAP_CHILDREN]:
+            try:
+                parsed = yield from self.read_feed(url, cached, pages)
+            except Exception:
+                continue
+            entries.extend(parsed["entries"])
+        if read:
+            return pages, entries
+        if link not in pages:
+            # none of the feeds of the source could be read
+            pages[link] = ((yield link), {"feed_urls": []})
+        return pages, None
+
+    def read_feed(self, url, cached, pages):
+        """
+        Step of discovery reading one feed or sitemap
+        :return: {"entries", "sitemaps"} see parse_feed
+        """
+        page = yield url
+        entry = cached.get(url)
+        if self.is_unchanged(page, entry) and "entries" in entry["parsed"]:
+            parsed = entry["parsed"]
+        else:
+            parsed = parse_feed(url, page["html"])
+        pages[url] = (page, parsed)
+        return parsed
+
+    def discover(self, link, feeds, cached, source_limit=None):
+        """
+        Find the article urls of a source by downloading the pages of discovery
+        :param link: homepage of the source
+        :param feeds: feed and sitemap urls of the source
+        :param cached: result of cached_pages
+        :param source_limit: SourceLimit of the source or None
+        :return: (pages, entries) see discovery
+        """
+        steps = self.discovery(link, feeds, cached)
+        try:
+            url = next(steps)
+            while True:
+                try:
+                    page = self.fetch(url, cached.get(url), source_limit)
+                except Exception as e:
+                    url = steps.throw(e)
+                else:
+                    url = steps.send(page)
+        except StopIteration as stop:
+            pages, entries = stop.value
+        if entries is None:
+            return self.homepage_entries(link, pages, cached)
+        return pages, entries
+
+    def homepage_entries(self, link, pages, cached):
+        """
+        Article urls of a source without feed, crawled from its fetched homepage
+        :return: (pages, entries) see discovery
+        """
+        page, parsed = pages[link]
+        article_urls = self.homepage_article_urls(link, page, cached.get(link))
+        pages[link] = (page, dict(parsed, article_urls=article_urls))
+        return pages, [[url, None] for url in article_urls]
+
+    def homepage_article_urls(self, link, page, cached):
+        """
+        Article urls of a fetched homepage, the urls found last time are reused
+        when the homepage did not change
+        :param link:
+        :param page: result of fetch
+        :param cached: fetch cache entry of the homepage or None
+        :return:
+        """
+        if self.is_unchanged(page, cached) and "article_urls" in cached["parsed"]:
+            return cached["parsed"]["article_urls"]
+        return extract_article_urls(link, page["html"])
+
+    @staticmethod
+    def is_unchanged(page, cached):
+        """
+        Check whether a fetched page is the one in the cache, by 304 or identical body
+        :param page: result of fetch
+        :param cached: fetch cache entry or None
+        :return:
+        """
+        return cached is not None and (page["status"] == 304 or page["content_hash"] == cached["content_hash"])
+
+    def scrape(self, sources, limit, progress=None):
+        """
+        Scrape up to limit new articles of every source. The fetch cache is
+        only used from this thread, the workers get the entries they need.
+        :param sources: mapping of source name to its NewsPapers.json entry,
+            the optional limit, max_concurrency and rps of an entry apply to its source
+        :param limit: maximum number of articles of the sources without their own limit
+        :param progress: optional callable(name, stats) called once a source is done
+        :return: (articles, stats) where articles are dicts with the source name
+            under "news_from" and stats holds per source counts, bytes and timings
+        """
+        stats = self.new_stats(sources)
+        articles = []
+        limits = {name: value.get('limit', limit) for name, value in sources.items()}
+        source_limits = {name: SourceLimit(value.get('max_concurrency'), value.get('rps'))
+                         for name, value in sources.items()}
+        self.fetch_cache.load([value['link'] for value in sources.values()])
+        parse_pool = ProcessPoolExecutor(self.parse_processes) if self.parse_processes != 0 else None
+        try:
+            with ThreadPoolExecutor(self.max_workers) as pool:
+                pending = {}
+                # number of pending futures of every source
+                remaining = dict.fromkeys(sources, 1)
+                for name, value in sources.items():
+                    link, feeds = value['link'], value.get('feeds', [])
+                    future = pool.submit(timed, self.discover, link, feeds, self.cached_pages(link, feeds),
+                                         source_limits[name])
+                    pending[future] = ("discover", name, link, None)
+                while pending:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        stage, name, url, page = pending.pop(future)
+                        queued = self._handle(future, stage, name, url, page, limits[name], source_limits[name],
+                                              stats[name], articles, pending, pool, parse_pool)
+                        remaining[name] += queued - 1
+                        if progress is not None and not remaining[name]:
+                            progress(name, stats[name])
+        finally:
+            if parse_pool is not None:
+                parse_pool.shutdown()
+        self.fetch_cache.save()
+        return articles, stats
+
+    @staticmethod
+    def new_stats(sources):
+        return {
+            name: {"articles": 0, "feeds": 0, "old": 0, "known": 0, "downloaded": 0, "not_modified": 0,
+                   "unchanged": 0, "parsed": 0, "failed": 0, "bytes": 0, "fetch_seconds": 0.0, "parse_seconds": 0.0}
+            for name in sources
+        }
+
+    def discovered(self, link, pages, entries, limit, source_stats):
+        """
+        Record the pages of a discovery, drop the articles not published today
+        and the urls already stored, before downloading anything, and keep the
+        first limit ones, newest first. Reads the database when the fetch
+        cache or known_urls do.
+        :param link: homepage of the source
+        :param pages: {url: (fetch result, parsed)} see discovery
+        :param entries: [[article url, iso publication date or None]]
+        :return: article urls to fetch
+        """
+        for url, (page, parsed) in pages.items():
+            source_stats["bytes"] += page["bytes"]
+            if url != link:
+                source_stats["feeds"] += 1
+            self.fetch_cache.put(url, page["etag"], page["last_modified"], page["content_hash"], parsed)
+        entries = newest_first(entries)
+        today = datetime.date.today()
+        article_urls = [url for url, published in entries if is_recent(published, today)]
+        source_stats["old"] += len(entries) - len(article_urls)
+        if self.known_urls is not None:
+            known = self.known_urls(article_urls)
+            source_stats["known"] += len(known)
+            article_urls = [url for url in article_urls if url not in known]
+        article_urls = article_urls[:limit]
+        source_stats["articles"] = len(article_urls)
+        self.fetch_cache.load(article_urls)
+        return article_urls
+
+    def downloaded(self, name, url, page, source_stats, articles):
+        """
+        Record a downloaded article, an unchanged one is dropped without
+        parsing as an earlier scrape returned it already
+        :return: True when the article still has to be parsed
+        """
+        source_stats["downloaded"] += 1
+        source_stats["bytes"] += page["bytes"]
+        if self.is_unchanged(page, self.fetch_cache.get(url)):
+            source_stats["not_modified" if page["status"] == 304 else "unchanged"] += 1
+            return False
+        return True
+
+    def parsed(self, name, url, page, article, source_stats, articles):
+        """
+        Record a parsed article, only its validators are cached as the
+        article itself is stored in the news
+        :return:
+        """
+        source_stats["parsed"] += 1
+        self.fetch_cache.put(url, page["etag"], page["last_modified"], page["content_hash"], {})
+        article["news_from"] = name
+        articles.append(article)
+
+    def _handle(self, future, stage, name, url, page, limit, source_limit, source_stats, articles, pending, pool,
+                parse_pool):
+        """
+        Record the outcome of a finished future and queue the next stage of its article
+        :return: number of futures queued
+        """
+        try:
+            result, seconds = future.result()
+        except Exception:
+            source_stats["failed"] += 1
+            return 0
+        if stage == "discover":
+            pages, entries = result
+            source_stats["fetch_seconds"] += seconds
+            article_urls = self.discovered(url, pages, entries, limit, source_stats)
+            for article_url in article_urls:
+                future = pool.submit(timed, self.fetch, article_url, self.fetch_cache.get(article_url), source_limit)
+                pending[future] = ("download", name, article_url, None)
+            return len(article_urls)
+        elif stage == "download":
+            source_stats["fetch_seconds"] += seconds
+            if not self.downloaded(name, url, result, source_stats, articles):
+                return 0
+            if parse_pool is None:
+                parse_future = pool.submit(timed, parse_article, url, result["html"])
+            else:
+                parse_future = parse_pool.submit(timed, parse_article, url, result["html"])
+            pending[parse_future] = ("parse", name, url, result)
+            return 1
+        else:
+            source_stats["parse_seconds"] += seconds
+            self.parsed(name, url, page, result, source_stats, articles)
+            return 0
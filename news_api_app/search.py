@@ -0,0 +1,336 @@
+import datetime
+import math
+import re
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.db import connection, transaction
+from django.db.models import Count, F
+from django.dispatch import receiver
+
+from .changes import ChangesExpired, read_changes
+from .db import is_postgresql
+from .models import News
+from .signals import news_changed
+
+TOKEN_RE = re.compile(r"\w+")
+PHRASE_RE = re.compile(r'"([^"]*)"')
+# a hit in the title counts as much as TITLE_WEIGHT hits in the details
+TITLE_WEIGHT = 2.0
+# ids per IN query, below the SQLite limit of bound parameters
+SEARCH_BATCH_SIZE = 500
+# changes of the news read per query when catching up
+CHANGES_BATCH_SIZE = 500
+
+
+def tokenize(text):
+    """
+    Split a text into lower case word tokens
+    :param text:
+    :return:
+    """
+    return TOKEN_RE.findall(text.lower())
+
+
+def parse_query(text):
+    """
+    Split a search query into single terms and "quoted phrases"
+    :param text:
+    :return: (terms, phrases) where every phrase is a list of terms
+    """
+    phrases = [tokens for tokens in (tokenize(phrase) for phrase in PHRASE_RE.findall(text)) if tokens]
+    terms = tokenize(PHRASE_RE.sub(" ", text))
+    return terms, phrases
+
+
+class PostgresSearchBackend:
+    """Ranked full-text search on the GIN indexed search_vector column"""
+
+    def search(self, keyword, offset, limit, fields):
+        """
+        Search the news matching every term and "quoted phrase" of the keyword
+        :param keyword:
+        :param offset: number of ranked results to skip
+        :param limit: number of results to return
+        :param fields: fields of the returned rows
+        :return: list of values_list rows ordered by relevance
+        """
+        query = SearchQuery(keyword, config='english', search_type='websearch')
+        queryset = News.objects.filter(search_vector=query).annotate(
+            rank=SearchRank(F('search_vector'), query)
+        ).order_by('-rank', '-date', '-id')
+        return list(queryset.values_list(*fields)[offset:offset + limit])
+
+    def source_counts(self, keyword, date_from=None, date_to=None):
+        """
+        Number of news matching the keyword per source
+        :param keyword:
+        :param date_from: first date included, None for no bound
+        :param date_to: last date included, None for no bound
+        :return: {news_from: count}
+        """
+        query = SearchQuery(keyword, config='english', search_type='websearch')
+        queryset = filter_dates(News.objects.filter(search_vector=query), date_from, date_to)
+        return dict(queryset.order_by().values_list('news_from').annotate(count=Count('id')))
+
+
+def filter_dates(queryset, date_from, date_to):
+    if date_from is not None:
+        queryset = queryset.filter(date__gte=date_from)
+    if date_to is not None:
+        queryset = queryset.filter(date__lte=date_to)
+    return queryset
+
+
+class InvertedIndex:
+    """
+    In-process positional inverted index over the title and details of news.
+
+    Used when the database has no full-text search (SQLite in tests), it is
+    built on first use and then kept up to date through news_changed and the
+    change log (see InvertedIndexSearchBackend).
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        # term -> {news id -> positions of the term}
+        self._postings = defaultdict(dict)
+        # news id -> (sort key, number of title tokens, terms of the news)
+        self._documents = {}
+
+    def __len__(self):
+        return len(self._documents)
+
+    def add(self, news_id, title, details, date):
+        """
+        Index (or re-index) a single news
+        :param news_id:
+        :param title:
+        :param details:
+        :param date:
+        :return:
+        """
+        title_tokens = tokenize(title)
+        # the gap keeps phrases from matching across the title and the details
+        tokens = title_tokens + [None] + tokenize(details)
+        positions = defaultdict(list)
+        for position, token in enumerate(tokens):
+            if token is not None:
+                positions[token].append(position)
+        with self._lock:
+            self._remove(news_id)
+            for term, term_positions in positions.items():
+                self._postings[term][news_id] = tuple(term_positions)
+            self._documents[news_id] = ((date.toordinal(), news_id), len(title_tokens), tuple(positions))
+
+    def remove(self, news_id):
+        """
+        Drop a news from the index
+        :param news_id:
+        :return:
+        """
+        with self._lock:
+            self._remove(news_id)
+
+    def _remove(self, news_id):
+        document = self._documents.pop(news_id, None)
+        if document is None:
+            return
+        for term in document[2]:
+            postings = self._postings[term]
+            postings.pop(news_id, None)
+            if not postings:
+                del self._postings[term]
+
+    def search(self, keyword):
+        """
+        Find the news containing every term and phrase of the keyword
+        :param keyword:
+        :return: list of news ids, best match first
+        """
+        terms, phrases = parse_query(keyword)
+        required = set(terms).union(*phrases)
+        if not required:
+            return []
+        with self._lock:
+            postings = [self._postings.get(term, {}) for term in required]
+            postings.sort(key=len)
+            candidates = set(postings[0])
+            for term_postings in postings[1:]:
+                if not candidates:
+                    break
+                candidates.intersection_update(term_postings)
+            if not candidates:
+                return []
+            for phrase in phrases:
+                candidates = {news_id for news_id in candidates if self._has_phrase(news_id, phrase)}
+            total = len(self._documents)
+            idf = {term: math.log(1 + total / len(self._postings[term])) for term in required}
+            scored = []
+            for news_id in candidates:
+                sort_key, title_length, _ = self._documents[news_id]
+                score = 0.0
+                for term in required:
+                    weight = sum(TITLE_WEIGHT if position < title_length else 1.0
+                                 for position in self._postings[term][news_id])
+                    score += idf[term] * (1 + math.log(weight))
+                scored.append((score, sort_key))
+        scored.sort(reverse=True)
+        return [sort_key[1] for _, sort_key in scored]
+
+    def _has_phrase(self, news_id, phrase):
+        starts = set(self._postings[phrase[0]][news_id])
+        for offset, term in enumerate(phrase[1:], 1):
+            starts.intersection_update(position - offset for position in self._postings[term][news_id])
+            if not starts:
+                return False
+        return True
+
+
+class InvertedIndexSearchBackend:
+    """
+    Search backend for databases without full-text search. The index of a
+    worker is built from the news table once, then follows the change log
+    (see changes.py) at most every NEWS_SEARCH_REFRESH_SECONDS, so the news
+    written by other processes, the scrape worker included, are found too.
+    """
+
+    def __init__(self):
+        self.index = InvertedIndex()
+        self._loaded = False
+        self._cursor = None
+        self._refreshed_at = 0.0
+        self._load_lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+
+    @property
+    def loaded(self):
+        return self._loaded
+
+    def load(self):
+        """
+        Build the index from the news table, only the first call does the work
+        :return:
+        """
+        with self._load_lock:
+            if self._loaded:
+                return
+            self._build()
+            self._loaded = True
+
+    def _build(self):
+        index = InvertedIndex()
+        # taken first, the changes made while loading are applied again by refresh
+        _, cursor, _ = read_changes(None, 1)
+        rows = News.objects.values_list('id', 'title', 'details', 'date')
+        for news_id, title, details, date in rows.iterator():
+            index.add(news_id, title, details, date)
+        self._cursor = cursor
+        self._refreshed_at = time.monotonic()
+        # replaced at once, the searches use the previous index meanwhile
+        self.index = index
+
+    def refresh(self):
+        """
+        Apply the changes of the news logged since the last refresh, if it is
+        older than NEWS_SEARCH_REFRESH_SECONDS. A refresh running in another
+        thread is not waited for.
+        :return:
+        """
+        if time.monotonic() - self._refreshed_at < getattr(settings, 'NEWS_SEARCH_REFRESH_SECONDS', 2):
+            return
+        if not self._refresh_lock.acquire(blocking=False):
+            return
+        try:
+            has_more = True
+            while has_more:
+                try:
+                    changes, cursor, has_more = read_changes(self._cursor, CHANGES_BATCH_SIZE)
+                except ChangesExpired:
+                    self._build()
+                    return
+                index = self.index
+                for change in changes:
+                    news = change.get("news")
+                    if news is None:
+                        index.remove(change["id"])
+                    else:
+                        index.add(change["id"], news["title"], news["details"],
+                                  datetime.date.fromisoformat(news["date"]))
+                self._cursor = cursor
+            self._refreshed_at = time.monotonic()
+        finally:
+            self._refresh_lock.release()
+
+    def search(self, keyword, offset, limit, fields):
+        """
+        Search the news matching every term and "quoted phrase" of the keyword
+        :param keyword:
+        :param offset: number of ranked results to skip
+        :param limit: number of results to return
+        :param fields: fields of the returned rows
+        :return: list of values_list rows ordered by relevance
+        """
+        self.load()
+        self.refresh()
+        ids = self.index.search(keyword)[offset:offset + limit]
+        rows = {row[0]: row[1:] for row in News.objects.filter(id__in=ids).values_list('id', *fields)}
+        return [rows[news_id] for news_id in ids if news_id in rows]
+
+    def source_counts(self, keyword, date_from=None, date_to=None):
+        """
+        Number of news matching the keyword per source
+        :param keyword:
+        :param date_from: first date included, None for no bound
+        :param date_to: last date included, None for no bound
+        :return: {news_from: count}
+        """
+        self.load()
+        self.refresh()
+        ids = self.index.search(keyword)
+        counts = defaultdict(int)
+        for start in range(0, len(ids), SEARCH_BATCH_SIZE):
+            queryset = filter_dates(News.objects.filter(id__in=ids[start:start + SEARCH_BATCH_SIZE]), date_from,
+                                    date_to)
+            for news_from, count in queryset.order_by().values_list('news_from').annotate(count=Count('id')):
+                counts[news_from] += count
+        return dict(counts)
+
+
+_inverted_index_backend = InvertedIndexSearchBackend()
+_postgres_backend = PostgresSearchBackend()
+
+
+def get_search_backend():
+    """
+    Pick the search backend matching the default database
+    :return:
+    """
+    if is_postgresql(connection):
+        return _postgres_backend
+    return _inverted_index_backend
+
+
+@receiver(news_changed)
+def update_inverted_index(sender, created, updated, deleted, **kwargs):
+    """
+    Keep the in-process index in line with the writes of this process once it
+    has been loaded, without waiting for the next refresh
+    :return:
+    """
+    if not _inverted_index_backend.loaded:
+        return
+    # read the values now, deleted instances lose their id once deleted
+    added = [(news.id, news.title, news.details, news.date) for news in list(created) + list(updated)]
+    removed = [news.id for news in deleted]
+
+    def apply():
+        for news_id in removed:
+            _inverted_index_backend.index.remove(news_id)
+        for news_id, title, details, date in added:
+            _inverted_index_backend.index.add(news_id, title, details, date)
+
+    transaction.on_commit(apply)
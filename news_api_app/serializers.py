@@ -1,11 +1,24 @@
+import json
+
+from django.utils import timezone
 from rest_framework import serializers
+from rest_framework.renderers import JSONRenderer
 
-from .models import News
+from .metrics import timed_serialization
+from .models import News, ScrapeJob
 
 
 class NewsSerializer(serializers.ModelSerializer):
     """ Serializer for news Model"""
 
+    def __init__(self, *args, **kwargs):
+        # optional projection, only the given fields are serialized
+        fields = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for field_name in set(self.fields) - set(fields):
+                self.fields.pop(field_name)
+
     class Meta:
         model = News
         fields = (
@@ -15,4 +28,110 @@ class NewsSerializer(serializers.ModelSerializer):
             'date',
             'news_from',
             'news_url',
+            'snippet',
+            'word_count',
+        )
+        read_only_fields = ('snippet', 'word_count')
+
+
+# fields of the news in the lists and the search, the details are only served by the news detail
+NEWS_LIST_FIELDS = tuple(field for field in NewsSerializer.Meta.fields if field != 'details')
+
+
+# same output as rest_framework.renderers.JSONRenderer with the default settings
+JSON_ENCODER = json.JSONEncoder(ensure_ascii=False, allow_nan=False, separators=(',', ':'))
+
+
+@timed_serialization
+def render_json(data):
+    """
+    Render plain json data to the same bytes as JSONRenderer
+    :param data: dicts, lists, strings and numbers only
+    :return:
+    """
+    return JSON_ENCODER.encode(data).replace('\u2028', '\\u2028').replace('\u2029', '\\u2029').encode()
+
+
+def date_to_representation(value):
+    return value.isoformat() if value else None
+
+
+class NewsRowSerializer:
+    """
+    Read only fast path of NewsSerializer.
+
+    Works on the tuples of ``values_list(*fields)`` instead of model instances
+    and gives the same dicts as NewsSerializer(..., fields=fields).data, the
+    list fields by default. NewsSerializer is still used for writes and validation.
+    """
+
+    def __init__(self, fields=NEWS_LIST_FIELDS, row_fields=None):
+        """
+        :param fields: fields of the output, in NewsSerializer.Meta.fields order
+        :param row_fields: fields of the rows when they hold more than the output
+        """
+        self.fields = tuple(fields)
+        self.row_fields = tuple(row_fields or fields)
+        self._columns = [
+            (field, self.row_fields.index(field), date_to_representation if field == 'date' else None)
+            for field in self.fields
+        ]
+
+    def to_representation(self, row):
+        """
+        Dict of a row of values_list(*self.row_fields)
+        :param row:
+        :return:
+        """
+        data = {}
+        for field, position, convert in self._columns:
+            value = row[position]
+            data[field] = value if convert is None else convert(value)
+        return data
+
+    @timed_serialization
+    def many(self, rows):
+        return [self.to_representation(row) for row in rows]
+
+
+class TimedJSONRenderer(JSONRenderer):
+    """JSONRenderer counting its time in the serialization time of the request metrics"""
+
+    @timed_serialization
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return super().render(data, accepted_media_type, renderer_context)
+
+
+class ScrapeJobSerializer(serializers.ModelSerializer):
+    """ Serializer for scrape job Model"""
+    duration_seconds = serializers.SerializerMethodField()
+    bytes_downloaded = serializers.SerializerMethodField()
+    articles_parsed = serializers.SerializerMethodField()
+
+    def get_duration_seconds(self, job):
+        if job.started_at is None:
+            return None
+        return ((job.finished_at or timezone.now()) - job.started_at).total_seconds()
+
+    def get_bytes_downloaded(self, job):
+        return sum(source.get("bytes", 0) for source in job.sources.values())
+
+    def get_articles_parsed(self, job):
+        return sum(source.get("parsed", 0) for source in job.sources.values())
+
+    class Meta:
+        model = ScrapeJob
+        fields = (
+            'id',
+            'status',
+            'created_at',
+            'started_at',
+            'finished_at',
+            'duration_seconds',
+            'sources',
+            'articles_inserted',
+            'articles_skipped',
+            'bytes_downloaded',
+            'articles_parsed',
+            'error',
         )
@@ -0,0 +1,39 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import Signal, receiver
+
+from .models import News
+
+# Sent whenever news rows are written, with the keyword arguments
+# ``created``, ``updated`` and ``deleted``, each a list of News instances.
+# Single row writes are relayed from post_save/post_delete, bulk write paths
+# (bulk_create/bulk_update) have to send it themselves.
+# News moved to the archive are sent as ``deleted`` with ``archived=True``.
+news_changed = Signal()
+
+
+@receiver(post_save, sender=News)
+def relay_news_saved(sender, instance, created, **kwargs):
+    """
+    Relay post_save of a single news to news_changed
+    :param sender:
+    :param instance:
+    :param created:
+    :param kwargs:
+    :return:
+    """
+    if created:
+        news_changed.send(sender=News, created=[instance], updated=[], deleted=[])
+    else:
+        news_changed.send(sender=News, created=[], updated=[instance], deleted=[])
+
+
+@receiver(post_delete, sender=News)
+def relay_news_deleted(sender, instance, **kwargs):
+    """
+    Relay post_delete of a single news to news_changed
+    :param sender:
+    :param instance:
+    :param kwargs:
+    :return:
+    """
+    news_changed.send(sender=News, created=[], updated=[], deleted=[instance])
@@ -0,0 +1,209 @@
+import hashlib
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db.models import Q
+from django.dispatch import receiver
+
+from .models import ArticleFingerprint, News
+from .search import tokenize
+from .signals import news_changed
+
+BITS = 64
+BANDS = 4
+BAND_BITS = BITS // BANDS
+BAND_MASK = (1 << BAND_BITS) - 1
+# words per shingle, the features of the fingerprint
+SHINGLE_SIZE = 2
+# fingerprints looked up per query, BANDS IN lists of this size
+LOOKUP_BATCH_SIZE = 200
+
+
+def max_distance():
+    """
+    Largest Hamming distance between near duplicates, the bands only
+    guarantee a common band up to BANDS - 1 bits
+    :return: None when the near duplicate detection is disabled
+    """
+    limit = getattr(settings, 'NEWS_NEAR_DUPLICATE_DISTANCE', 3)
+    return None if limit is None else min(limit, BANDS - 1)
+
+
+def simhash(text):
+    """
+    64 bit SimHash of the word shingles of a text
+    :param text:
+    :return: the fingerprint or None for a text without words
+    """
+    tokens = tokenize(text)
+    if len(tokens) > SHINGLE_SIZE:
+        tokens = [" ".join(tokens[index:index + SHINGLE_SIZE]) for index in range(len(tokens) - SHINGLE_SIZE + 1)]
+    if not tokens:
+        return None
+    weights = [0] * BITS
+    for feature, count in Counter(tokens).items():
+        value = int.from_bytes(hashlib.blake2b(feature.encode(), digest_size=8).digest(), 'big')
+        for bit in range(BITS):
+            weights[bit] += count if value >> bit & 1 else -count
+    return sum(1 << bit for bit in range(BITS) if weights[bit] > 0)
+
+
+def bands(fingerprint):
+    """
+    Split a fingerprint in its BANDS bands
+    :param fingerprint:
+    :return:
+    """
+    return [fingerprint >> (band * BAND_BITS) & BAND_MASK for band in range(BANDS)]
+
+
+def distance(first, second):
+    """
+    Hamming distance of two fingerprints
+    :return:
+    """
+    return bin(first ^ second).count('1')
+
+
+def to_signed(fingerprint):
+    return fingerprint - (1 << BITS) if fingerprint >= 1 << (BITS - 1) else fingerprint
+
+
+def to_unsigned(value):
+    return value + (1 << BITS) if value < 0 else value
+
+
+def build_fingerprint(news):
+    """
+    Unsaved fingerprint of a stored news
+    :param news:
+    :return: ArticleFingerprint or None when the details have no words
+    """
+    fingerprint = simhash(news.details)
+    if fingerprint is None:
+        return None
+    band0, band1, band2, band3 = bands(fingerprint)
+    return ArticleFingerprint(news_id=news.id, simhash=to_signed(fingerprint), band0=band0, band1=band1,
+                              band2=band2, band3=band3)
+
+
+class SimHashIndex:
+    """In memory band index of fingerprints, used within an ingest batch"""
+
+    def __init__(self):
+        self._bands = [defaultdict(list) for _ in range(BANDS)]
+
+    def add(self, fingerprint, key):
+        for band, value in enumerate(bands(fingerprint)):
+            self._bands[band][value].append((fingerprint, key))
+
+    def find(self, fingerprint, max_distance):
+        """
+        Nearest indexed fingerprint within max_distance bits
+        :param fingerprint:
+        :param max_distance:
+        :return: key of the nearest one or None
+        """
+        best = None
+        for band, value in enumerate(bands(fingerprint)):
+            for candidate, key in self._bands[band].get(value, ()):
+                candidate_distance = distance(fingerprint, candidate)
+                if candidate_distance <= max_distance and (best is None or candidate_distance < best[0]):
+                    best = (candidate_distance, key)
+        return None if best is None else best[1]
+
+
+def stored_near_duplicates(fingerprints):
+    """
+    Find the stored news near every fingerprint, by index lookups on the bands
+    :param fingerprints: list of fingerprints
+    :return: dict of fingerprint to the id of its nearest stored news
+    """
+    found = {}
+    limit = max_distance()
+    for start in range(0, len(fingerprints), LOOKUP_BATCH_SIZE):
+        chunk = fingerprints[start:start + LOOKUP_BATCH_SIZE]
+        values = [set() for _ in range(BANDS)]
+        for fingerprint in chunk:
+            for band, value in enumerate(bands(fingerprint)):
+                values[band].add(value)
+        query = Q()
+        for band in range(BANDS):
+            query |= Q(**{'band{}__in'.format(band): list(values[band])})
+        index = SimHashIndex()
+        for news_id, value in ArticleFingerprint.objects.filter(query).values_list('news_id', 'simhash'):
+            index.add(to_unsigned(value), news_id)
+        for fingerprint in chunk:
+            news_id = index.find(fingerprint, limit)
+            if news_id is not None:
+                found[fingerprint] = news_id
+    return found
+
+
+def split_near_duplicates(candidates):
+    """
+    Separate the candidates near a stored news or near an earlier candidate
+    :param candidates: unsaved News
+    :return: (kept, duplicates) where duplicates are (news, original) pairs and
+        the original is the id of a stored news or one of the kept candidates
+    """
+    limit = max_distance()
+    if limit is None:
+        return candidates, []
+    fingerprints = {id(news): simhash(news.details) for news in candidates}
+    stored = stored_near_duplicates([fingerprint for fingerprint in set(fingerprints.values())
+                                     if fingerprint is not None])
+    batch = SimHashIndex()
+    kept = []
+    duplicates = []
+    for news in candidates:
+        fingerprint = fingerprints[id(news)]
+        if fingerprint is None:
+            kept.append(news)
+            continue
+        original = stored.get(fingerprint)
+        if original is None:
+            original = batch.find(fingerprint, limit)
+        if original is None:
+            batch.add(fingerprint, news)
+            kept.append(news)
+        else:
+            duplicates.append((news, original))
+    return kept, duplicates
+
+
+@receiver(news_changed)
+def update_fingerprints(sender, created, updated, deleted, **kwargs):
+    """
+    Keep the fingerprints in line with the details of the news, the
+    fingerprints of deleted news go with them (on delete cascade)
+    :return:
+    """
+    changed = [news for news in created + updated if news.id is not None]
+    if not changed:
+        return
+    if updated:
+        ArticleFingerprint.objects.filter(news_id__in=[news.id for news in updated]).delete()
+    fingerprints = [fingerprint for fingerprint in map(build_fingerprint, changed) if fingerprint is not None]
+    ArticleFingerprint.objects.bulk_create(fingerprints, batch_size=500, ignore_conflicts=True)
+
+
+def rebuild_fingerprints(chunk_size=2000):
+    """
+    Fingerprint every stored news, for the news stored before the fingerprints existed
+    :param chunk_size:
+    :return: number of fingerprints written
+    """
+    ArticleFingerprint.objects.all().delete()
+    written = 0
+    batch = []
+    for news in News.objects.only('id', 'details').iterator(chunk_size=chunk_size):
+        fingerprint = build_fingerprint(news)
+        if fingerprint is not None:
+            batch.append(fingerprint)
+        if len(batch) == chunk_size:
+            ArticleFingerprint.objects.bulk_create(batch)
+            written += len(batch)
+            batch = []
+    ArticleFingerprint.objects.bulk_create(batch)
+    return written + len(batch)
@@ -0,0 +1,351 @@
+import bisect
+import heapq
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from django.conf import settings
+from django.db import connection
+
+from .changes import ChangesExpired, read_changes
+from .models import News
+from .search import tokenize
+
+logger = logging.getLogger(__name__)
+
+# words too common to be worth suggesting
+STOP_WORDS = frozenset((
+    'about', 'after', 'again', 'all', 'also', 'and', 'any', 'are', 'because', 'been', 'before', 'being', 'but',
+    'can', 'could', 'did', 'does', 'for', 'from', 'had', 'has', 'have', 'her', 'here', 'him', 'his', 'how', 'into',
+    'its', 'just', 'more', 'most', 'not', 'now', 'off', 'one', 'only', 'other', 'our', 'out', 'over', 'said',
+    'says', 'she', 'should', 'some', 'than', 'that', 'the', 'their', 'them', 'then', 'there', 'these', 'they',
+    'this', 'those', 'through', 'too', 'under', 'very', 'was', 'were', 'what', 'when', 'where', 'which', 'while',
+    'who', 'why', 'will', 'with', 'would', 'you', 'your',
+))
+MIN_TERM_LENGTH = 3
+# changes of the news read per query when catching up
+CHANGES_BATCH_SIZE = 500
+
+
+def suggest_config():
+    return getattr(settings, 'NEWS_SUGGEST', {})
+
+
+def is_suggestable(term):
+    return len(term) >= MIN_TERM_LENGTH and term not in STOP_WORDS and not term.isdigit()
+
+
+def news_terms(title, details, detail_terms):
+    """
+    Terms a news contributes to the index: the words of its title and the
+    most frequent words of its details
+    :param title:
+    :param details:
+    :param detail_terms: number of words taken from the details
+    :return: tuple of interned terms, each once
+    """
+    terms = {term for term in tokenize(title) if is_suggestable(term)}
+    # counted first, each distinct word is checked once
+    counts = Counter(tokenize(details))
+    terms.update(term for term, _ in heapq.nlargest(
+        detail_terms, ((term, count) for term, count in counts.items() if is_suggestable(term)),
+        key=lambda item: item[1]))
+    return tuple(sys.intern(term) for term in terms)
+
+
+class Top:
+    """
+    The most frequent terms of a prefix as [(-count, term)], sorted, always
+    the head of the ranking of all its terms. complete when it holds them all.
+    """
+    __slots__ = ('terms', 'complete')
+
+    def __init__(self, terms, complete):
+        self.terms = terms
+        self.complete = complete
+
+
+class SuggestIndex:
+    """
+    Prefix index of the terms of the news with the number of news having
+    each of them. The terms are kept in a sorted array where the terms of a
+    prefix are a range found by bisection. The most frequent terms of the
+    prefixes asked for (and of the short ones, see warm) are kept and patched
+    as the counts change, so the ranges of the short prefixes are not ranked
+    again on every keystroke. The vocabulary is bounded by max_terms, the
+    rarest terms are dropped when it is full and their counts are approximate
+    from then on.
+    """
+
+    def __init__(self, max_terms=100000, detail_terms=10, top_size=100, cache_size=4096):
+        self.max_terms = max_terms
+        self.detail_terms = detail_terms
+        self.top_size = top_size
+        self.cache_size = cache_size
+        self._lock = threading.RLock()
+        # term -> number of news
+        self._counts = {}
+        self._sorted = []
+        # news id -> terms of the news
+        self._documents = {}
+        # prefix -> Top of at most top_size terms
+        self._tops = OrderedDict()
+
+    def __len__(self):
+        return len(self._counts)
+
+    def add(self, news_id, title, details):
+        """
+        Index (or re-index) a single news
+        :param news_id:
+        :param title:
+        :param details:
+        :return:
+        """
+        terms = news_terms(title, details, self.detail_terms)
+        with self._lock:
+            # only the terms which changed are counted again, the tops of the others stay as they are
+            previous = self._documents.pop(news_id, ())
+            self._discount(term for term in previous if term not in terms)
+            for term in terms:
+                if term in previous:
+                    continue
+                count = self._counts.get(term)
+                if count is None:
+                    if len(self._counts) >= self.max_terms:
+                        self._shrink()
+                    bisect.insort(self._sorted, term)
+                    count = 0
+                self._counts[term] = count + 1
+                self._count_changed(term, count, count + 1)
+            self._documents[news_id] = terms
+
+    def remove(self, news_id):
+        """
+        Drop a news from the index
+        :param news_id:
+        :return:
+        """
+        with self._lock:
+            self._remove(news_id)
+
+    def _remove(self, news_id):
+        self._discount(self._documents.pop(news_id, ()))
+
+    def _discount(self, terms):
+        for term in terms:
+            count = self._counts.get(term)
+            if count is None:
+                # dropped by _shrink
+                continue
+            if count > 1:
+                self._counts[term] = count - 1
+            else:
+                del self._counts[term]
+                del self._sorted[bisect.bisect_left(self._sorted, term)]
+            self._count_changed(term, count, count - 1)
+
+    def _count_changed(self, term, old, new):
+        """
+        Patch the kept tops of the prefixes of a term
+        :param term:
+        :param old: previous number of news with the term, 0 when new
+        :param new: number of news with the term, 0 when gone
+        :return:
+        """
+        for length in range(1, len(term) + 1):
+            top = self._tops.get(term[:length])
+            if top is None:
+                continue
+            terms = top.terms
+            kept = False
+            if old:
+                position = bisect.bisect_left(terms, (-old, term))
+                if position < len(terms) and terms[position] == (-old, term):
+                    del terms[position]
+                    kept = new > old
+            # a term ranked after the last one of an incomplete top may be behind terms left out of it
+            if new and (kept or top.complete or (terms and (-new, term) < terms[-1])):
+                bisect.insort(terms, (-new, term))
+                if len(terms) > self.top_size:
+                    del terms[self.top_size:]
+                    top.complete = False
+
+    def _shrink(self):
+        """
+        Drop the rarest tenth of max_terms
+        :return:
+        """
+        for term, _ in heapq.nsmallest(max(self.max_terms // 10, 1), self._counts.items(), key=lambda item: item[1]):
+            del self._counts[term]
+        self._sorted = sorted(self._counts)
+        self._tops.clear()
+
+    def _top(self, prefix, limit):
+        top = self._tops.get(prefix)
+        if top is not None and (top.complete or len(top.terms) >= limit):
+            self._tops.move_to_end(prefix)
+            return top.terms
+        start = bisect.bisect_left(self._sorted, prefix)
+        end = bisect.bisect_left(self._sorted, prefix + '\U0010ffff', start)
+        counts = self._counts
+        terms = heapq.nsmallest(self.top_size, ((-counts[term], term) for term in self._sorted[start:end]))
+        self._tops[prefix] = Top(terms, end - start <= self.top_size)
+        self._tops.move_to_end(prefix)
+        if len(self._tops) > self.cache_size:
+            self._tops.popitem(last=False)
+        return terms
+
+    def warm(self, length=2):
+        """
+        Rank the terms of every prefix up to length letters in one pass, the
+        ranges of the short prefixes are the longest
+        :param length:
+        :return:
+        """
+        with self._lock:
+            for term in self._sorted:
+                for size in range(1, min(length, len(term)) + 1):
+                    self._top(term[:size], self.top_size)
+
+    def suggest(self, prefix, limit):
+        """
+        Most frequent terms starting with the prefix
+        :param prefix: lower case
+        :param limit: number of terms, up to top_size
+        :return: list of (term, number of news), most frequent first then alphabetical
+        """
+        with self._lock:
+            return [(term, -count) for count, term in self._top(prefix, limit)[:limit]]
+
+
+class KeywordSuggester:
+    """
+    SuggestIndex of the news table of a worker. Built from the table once,
+    then kept up to date from the change log (see changes.py) at most every
+    REFRESH_SECONDS, so the news written by any process, the scrape worker
+    included, are suggested.
+    """
+
+    def __init__(self):
+        self.index = None
+        self._cursor = None
+        self._refreshed_at = 0.0
+        self._load_lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+
+    def reset_after_fork(self):
+        # a fork in the middle of a load leaves the locks taken by a thread which does not exist in the child
+        self._load_lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+
+    def load(self):
+        """
+        Build the index from the news table, only the first call does the work
+        :return:
+        """
+        with self._load_lock:
+            if self.index is None:
+                self._build()
+
+    def _build(self):
+        config = suggest_config()
+        index = SuggestIndex(config.get('MAX_TERMS', 100000), config.get('DETAIL_TERMS', 10))
+        # taken first, the changes made while loading are applied again by refresh
+        _, cursor, _ = read_changes(None, 1)
+        for news_id, title, details in News.objects.values_list('id', 'title', 'details').iterator():
+            index.add(news_id, title, details)
+        self._cursor = cursor
+        index.warm()
+        self._refreshed_at = time.monotonic()
+        # replaced at once, the suggestions are served from the previous index meanwhile
+        self.index = index
+
+    def is_stale(self):
+        return time.monotonic() - self._refreshed_at >= suggest_config().get('REFRESH_SECONDS', 2)
+
+    def refresh(self):
+        """
+        Apply the changes of the news since the last refresh. A refresh
+        running in another thread is not waited for.
+        :return:
+        """
+        if not self._refresh_lock.acquire(blocking=False):
+            return
+        try:
+            has_more = True
+            while has_more:
+                try:
+                    changes, cursor, has_more = read_changes(self._cursor, CHANGES_BATCH_SIZE)
+                except ChangesExpired:
+                    self._build()
+                    return
+                index = self.index
+                for change in changes:
+                    if "news" in change:
+                        index.add(change["id"], change["news"]["title"], change["news"]["details"])
+                    else:
+                        index.remove(change["id"])
+                self._cursor = cursor
+            self._refreshed_at = time.monotonic()
+        finally:
+            self._refresh_lock.release()
+
+    def suggest(self, text, limit):
+        """
+        Complete the last word of a partial keyword
+        :param text: keyword typed so far
+        :param limit: number of suggestions
+        :return: list of {"text": keyword with the last word completed, "count": number of news with the word},
+        empty until the index is built
+        """
+        words = tokenize(text)
+        if not words:
+            return []
+        index = self.index
+        if index is None:
+            # building the index takes seconds, the requests do not wait for it (or for load_at_startup)
+            if not self._load_lock.locked():
+                in_background(self.load, 'news-suggest-load')
+            return []
+        if self.is_stale() and not self._refresh_lock.locked():
+            # a scrape can bring thousands of news, the request does not wait for them
+            in_background(self.refresh, 'news-suggest-refresh')
+        head = " ".join(words[:-1] + [""])
+        return [{"text": head + term, "count": count} for term, count in index.suggest(words[-1], limit)]
+
+
+suggester = KeywordSuggester()
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=suggester.reset_after_fork)
+
+
+def in_background(target, name):
+    """
+    Run a load or refresh of the suggester in a daemon thread with its own
+    database connection, a failure is logged and retried by the next suggestion
+    :param target:
+    :param name: name of the thread
+    :return:
+    """
+    def run():
+        try:
+            target()
+        except Exception:
+            logger.exception("Updating the keyword suggestions failed")
+        finally:
+            connection.close()
+    threading.Thread(target=run, name=name, daemon=True).start()
+
+
+def load_at_startup():
+    """
+    Build the index in a daemon thread when the worker starts, so the first
+    suggestions do not wait for it and the worker serves meanwhile
+    :return:
+    """
+    if suggest_config().get('LOAD_AT_STARTUP', True):
+        in_background(suggester.load, 'news-suggest-load')
@@ -1,3 +1,1053 @@
-from django.test import TestCase
+import base64
+import datetime
+import importlib
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import zlib
+from collections import Counter
+from unittest import mock
 
-# Create your tests here.
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import connection, connections, transaction
+from django.db.models import Count
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from drf_yasg.generators import OpenAPISchemaGenerator
+from rest_framework_simplejwt.tokens import AccessToken
+
+from News_API.urls import SchemaView
+from benchmarks.fixture_server import (as_newspapers, atom_xml, homepage_html, news_sitemap_xml, rss_xml,
+                                       sitemap_index_xml, start_sites, stories)
+
+from .archive import archive_news
+from .cache import get_response_cache
+from .changes import ChangesExpired, read_changes
+from .discovery import FeedError, feed_links, is_recent, newest_first, parse_feed
+from .fetch_cache import DatabaseFetchCache
+from .ingest import build_news, delete_news, ingest_news, ingested_urls
+from .jobs import claim_next_job, enqueue_scrape_job, run_job
+from .metrics import record_scrape
+from .models import (ArticleFingerprint, FetchedPage, News, NewsArchive, NewsChange, NewsDailyCount, RevokedToken,
+                     ScrapeJob, SourceState)
+from .query_plans import explain_endpoint_queries
+from .rollup import rebuild_daily_counts
+from .scheduler import poll_due_sources
+from .scraper import ScrapeEngine
+from .search import InvertedIndexSearchBackend
+from .serializers import NEWS_LIST_FIELDS, NewsRowSerializer, NewsSerializer, render_json
+from .simhash import distance, simhash, split_near_duplicates
+from .suggest import KeywordSuggester
+
+
+def make_news(number, **fields):
+    values = {
+        "title": "News {}".format(number),
+        "details": "Details of the news {}".format(number),
+        "date": datetime.date.today(),
+        "news_from": "example",
+        "news_url": "https://example.com/news/{}".format(number),
+    }
+    values.update(fields)
+    return News.objects.create(**values)
+
+
+def api_client(username="reader"):
+    client = APIClient()
+    client.force_authenticate(get_user_model().objects.create_user(username, password="secret"))
+    return client
+
+
+class NewsListPaginationTests(TestCase):
+    """GET /news/ pages on (date, id) with an opaque cursor"""
+
+    def setUp(self):
+        self.client = api_client()
+
+    def test_pages_without_gaps_or_duplicates(self):
+        today = datetime.date.today()
+        # several news per date, the id breaks the ties
+        ids = [make_news(number, date=today - datetime.timedelta(days=number % 3)).id for number in range(11)]
+        expected = [news_id for _, news_id in sorted(
+            ((News.objects.get(id=news_id).date, news_id) for news_id in ids), reverse=True)]
+        seen, cursor = [], None
+        while True:
+            response = self.client.get('/news/', {"page_size": 2, "cursor": cursor} if cursor else {"page_size": 2})
+            self.assertEqual(response.status_code, 200)
+            content = json.loads(response.content)
+            self.assertLessEqual(len(content["results"]), 2)
+            seen.extend(news["id"] for news in content["results"])
+            cursor = content["next"]
+            if cursor is None:
+                break
+        self.assertEqual(seen, expected)
+
+    def test_invalid_cursor(self):
+        make_news(1)
+        for raw in (b"garbage", b"2020-13-01|5", b"2020-01-01|x", b"2020-01-01", b"\xff\xfe|1"):
+            cursor = base64.urlsafe_b64encode(raw).decode().rstrip("=")
+            response = self.client.get('/news/', {"cursor": cursor})
+            self.assertEqual(response.status_code, 400, raw)
+            self.assertEqual(json.loads(response.content), {"error": "Invalid cursor"})
+        self.assertEqual(self.client.get('/news/', {"cursor": "!!not base64!!"}).status_code, 400)
+
+
+class NewsRowSerializerTests(TestCase):
+    """The values_list fast path serializes like NewsSerializer"""
+
+    def setUp(self):
+        make_news(1, title="Café \u2028 \"quoted\" </script>", details="Ünïcödé details \u2029 end",
+                  news_from="Le Monde")
+        make_news(2, date=datetime.date(2020, 2, 29))
+
+    def assertSameOutput(self, fields, row_fields=None):
+        serializer = NewsRowSerializer(fields, row_fields)
+        rows = News.objects.order_by('id').values_list(*serializer.row_fields)
+        expected = NewsSerializer(News.objects.order_by('id'), many=True, fields=fields).data
+        self.assertEqual(serializer.many(rows), expected)
+        self.assertEqual(render_json(serializer.many(rows)), JSONRenderer().render(expected))
+
+    def test_list_fields(self):
+        self.assertSameOutput(NEWS_LIST_FIELDS)
+
+    def test_every_field(self):
+        self.assertSameOutput(NewsSerializer.Meta.fields)
+
+    def test_projection_with_extra_row_fields(self):
+        self.assertSameOutput(("title", "news_url"), ("id", "title", "date", "news_url"))
+
+
+@override_settings(NEWS_SEARCH_REFRESH_SECONDS=0)
+class InvertedIndexRefreshTests(TransactionTestCase):
+    """The in-process search index follows the writes of the other processes through the change log"""
+
+    def search(self, backend, keyword):
+        return [row[0] for row in backend.search(keyword, 0, 10, ('id',))]
+
+    def test_follows_the_change_log(self):
+        # not the index of this process, so it only sees the writes through the change log
+        backend = InvertedIndexSearchBackend()
+        first = make_news(1, title="Harbour opens")
+        self.assertEqual(self.search(backend, "harbour"), [first.id])
+        second = make_news(2, title="Harbour closes")
+        self.assertCountEqual(self.search(backend, "harbour"), [first.id, second.id])
+        first.title = "Bridge opens"
+        first.save()
+        self.assertEqual(self.search(backend, "harbour"), [second.id])
+        self.assertEqual(self.search(backend, "bridge"), [first.id])
+        second.delete()
+        self.assertEqual(self.search(backend, "harbour"), [])
+
+    def test_waits_for_the_refresh_interval(self):
+        backend = InvertedIndexSearchBackend()
+        self.assertEqual(self.search(backend, "harbour"), [])
+        make_news(1, title="Harbour opens")
+        with override_settings(NEWS_SEARCH_REFRESH_SECONDS=60):
+            self.assertEqual(self.search(backend, "harbour"), [])
+
+
+class UrlHashMigrationTests(TestCase):
+    """Migration 0005 stops on news whose urls only differ before normalization"""
+
+    def test_conflicts_are_reported_not_deleted(self):
+        migration = importlib.import_module('news_api_app.migrations.0005_news_url_hash')
+        News.objects.bulk_create([
+            News(title="a", details="a", date=datetime.date.today(), news_from="example",
+                 news_url=news_url, url_hash=str(number))
+            for number, news_url in enumerate(("https://example.com/a", "https://www.example.com/a/?utm_source=x",
+                                               "https://example.com/b"))
+        ])
+        ids = list(News.objects.order_by('id').values_list('id', flat=True))
+        with self.assertRaisesMessage(RuntimeError, "{}, {}".format(ids[0], ids[1])):
+            migration.fill_url_hash(apps, None)
+        self.assertEqual(News.objects.count(), 3)
+
+
+class IngestTests(TestCase):
+    """ingest_news only reports and announces the rows it wrote"""
+
+    def candidates(self, numbers):
+        return [build_news("Title {}".format(number), "Details number {} of a long story".format(number),
+                           datetime.date.today(), "example", "https://example.com/{}".format(number))
+                for number in numbers]
+
+    def test_stored_urls_skipped(self):
+        make_news(1, news_url="https://example.com/1")
+        result = ingest_news(self.candidates([1, 2, 2, 3]))
+        self.assertEqual([news.news_url for news in result.inserted],
+                         ["https://example.com/2", "https://example.com/3"])
+        self.assertEqual(len(result.skipped), 2)
+        self.assertTrue(all(news.id is not None for news in result.inserted))
+
+    def test_url_stored_after_the_lookup(self):
+        def insert_then_split(candidates):
+            # a POST /news/ of the same url between the lookup and the insert
+            make_news(1, news_url="https://example.com/1")
+            return split_near_duplicates(candidates)
+
+        with mock.patch('news_api_app.ingest.split_near_duplicates', insert_then_split):
+            result = ingest_news(self.candidates([1, 2]))
+        raced = News.objects.get(news_url="https://example.com/1")
+        self.assertEqual([news.news_url for news in result.inserted], ["https://example.com/2"])
+        self.assertEqual([news.news_url for news in result.skipped], ["https://example.com/1"])
+        self.assertEqual(NewsDailyCount.objects.get(date=datetime.date.today(), news_from="example").count, 2)
+        self.assertEqual(NewsChange.objects.filter(news_id=raced.id).count(), 1)
+        self.assertEqual(ArticleFingerprint.objects.filter(news_id=raced.id).count(), 1)
+
+
+def long_story(edit=None):
+    words = "harbour council budget bridge ferry island mainland morning debate cost mayor vote river".split()
+    text = " ".join("{}{}".format(words[(index * 7 + index // 3) % len(words)], index % 11) for index in range(400))
+    return text if edit is None else text.replace("budget", edit, 1)
+
+
+class NearDuplicateTests(TestCase):
+    """SimHash near duplicates, on fingerprints chosen bit by bit"""
+    BASE = 0x0123456789ABCDEF
+    # every bit flipped
+    FAR = 0xFEDCBA9876543210
+
+    def setUp(self):
+        self.fingerprints = {}
+        patcher = mock.patch('news_api_app.simhash.simhash', lambda text: self.fingerprints.get(text))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def details(self, fingerprint):
+        details = "Details {:x}".format(fingerprint)
+        self.fingerprints[details] = fingerprint
+        return details
+
+    def store(self, number, fingerprint, **fields):
+        return make_news(number, details=self.details(fingerprint), **fields)
+
+    def candidate(self, number, fingerprint):
+        return build_news("Title {}".format(number), self.details(fingerprint), datetime.date.today(), "example",
+                          "https://example.com/candidate/{}".format(number))
+
+    def duplicates_of_stored(self, *flips):
+        stored = self.store(1, self.BASE)
+        kept, duplicates = split_near_duplicates([self.candidate(number, self.BASE ^ flip)
+                                                  for number, flip in enumerate(flips)])
+        for news, original in duplicates:
+            self.assertEqual(original, stored.id)
+        return [self.fingerprints[news.details] ^ self.BASE for news, _ in duplicates]
+
+    def test_within_one_band(self):
+        self.assertEqual(self.duplicates_of_stored(0b1, 0b111, 0b1111), [0b1, 0b111])
+
+    def test_threshold_across_bands(self):
+        # three bits in three bands, band 3 is still common: exactly at the threshold
+        at_threshold = 1 | 1 << 16 | 1 << 32
+        # one bit in every band, no common band and over the threshold
+        every_band = at_threshold | 1 << 48
+        self.assertEqual(self.duplicates_of_stored(at_threshold, every_band), [at_threshold])
+
+    @override_settings(NEWS_NEAR_DUPLICATE_DISTANCE=2)
+    def test_configured_threshold(self):
+        self.assertEqual(self.duplicates_of_stored(0b11, 0b111), [0b11])
+
+    @override_settings(NEWS_NEAR_DUPLICATE_DISTANCE=None)
+    def test_disabled(self):
+        self.assertEqual(self.duplicates_of_stored(0, 0b1), [])
+
+    def test_nearest_stored_news(self):
+        self.store(1, self.BASE)
+        nearest = self.store(2, self.BASE ^ 0b100)
+        _, duplicates = split_near_duplicates([self.candidate(1, self.BASE ^ 0b110)])
+        self.assertEqual(duplicates[0][1], nearest.id)
+
+    def test_within_the_batch(self):
+        first, second, other = (self.candidate(1, self.BASE), self.candidate(2, self.BASE ^ 0b101),
+                                self.candidate(3, self.FAR))
+        kept, duplicates = split_near_duplicates([first, second, other])
+        self.assertEqual(kept, [first, other])
+        self.assertEqual(duplicates, [(second, first)])
+
+    def test_fingerprint_follows_the_details(self):
+        news = self.store(1, self.BASE)
+        news.details = self.details(self.BASE ^ 0xFFFF)
+        news.save()
+        self.assertEqual(list(ArticleFingerprint.objects.filter(news_id=news.id).values_list('band0', flat=True)),
+                         [(self.BASE ^ 0xFFFF) & 0xFFFF])
+
+    def test_fingerprints_deleted_with_the_news(self):
+        deleted, single, kept = (self.store(number, self.BASE ^ number) for number in range(3))
+        with transaction.atomic():
+            delete_news([deleted])
+        single.delete()
+        self.assertEqual(list(ArticleFingerprint.objects.values_list('news_id', flat=True)), [kept.id])
+
+    def test_fingerprints_deleted_when_archived(self):
+        yesterday = datetime.date.today() - datetime.timedelta(days=1)
+        old, recent = self.store(1, self.BASE, date=yesterday), self.store(2, self.FAR)
+        archive_news(datetime.date.today())
+        self.assertTrue(NewsArchive.objects.filter(id=old.id).exists())
+        self.assertEqual(list(ArticleFingerprint.objects.values_list('news_id', flat=True)), [recent.id])
+        # an archived news is no original any more
+        self.assertEqual(split_near_duplicates([self.candidate(1, self.BASE)])[1], [])
+
+
+class NearDuplicateTextTests(TestCase):
+    """SimHash on real texts: a light edit stays within the threshold"""
+
+    def test_edited_story(self):
+        self.assertLessEqual(distance(simhash(long_story()), simhash(long_story("budgets"))), 3)
+        self.assertGreater(distance(simhash(long_story()), simhash("An unrelated story about frogs " * 20)), 3)
+
+    def test_edited_story_not_ingested(self):
+        stored = make_news(1, details=long_story())
+        edited = build_news("Edited", long_story("budgets"), datetime.date.today(), "other", "https://other.example/1")
+        result = ingest_news([edited])
+        self.assertEqual((result.inserted, result.near_duplicates), ([], [(edited, stored.id)]))
+
+
+class CompressedTextFieldTests(TestCase):
+
+    def details(self, news):
+        return News.objects.get(id=news.id).details
+
+    def set_raw_details(self, news, value):
+        quote_name = connection.ops.quote_name
+        with connection.cursor() as cursor:
+            cursor.execute('UPDATE {} SET {} = %s WHERE {} = %s'.format(
+                quote_name(News._meta.db_table), quote_name('details'), quote_name('id')), [value, news.id])
+
+    def test_round_trip(self):
+        for number, text in enumerate(["", "Économie : 経済ニュース — Ünïcode ✓", long_story()]):
+            news = make_news(number, details=text)
+            self.assertEqual(self.details(news), text)
+            self.assertEqual(News.objects.filter(id=news.id).values_list('details', flat=True).get(), text)
+
+    def test_stored_compressed(self):
+        if connection.vendor == 'postgresql':
+            self.skipTest("stored as text, compressed by TOAST")
+        text = long_story()
+        news = make_news(1, details=text)
+        table = connection.ops.quote_name(News._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT details FROM {} WHERE id = %s'.format(table), [news.id])
+            stored = bytes(cursor.fetchone()[0])
+        self.assertLess(len(stored), len(text.encode()))
+        self.assertEqual(zlib.decompress(stored).decode(), text)
+
+    def test_legacy_uncompressed_rows(self):
+        news = make_news(1)
+        for value in ["Written as text before the compression ✓", "Written as bytes ✓".encode()]:
+            self.set_raw_details(news, value)
+            expected = value if isinstance(value, str) else value.decode()
+            self.assertEqual(self.details(news), expected)
+        # saved again, compressed from then on
+        news = News.objects.get(id=news.id)
+        news.save()
+        self.assertEqual(self.details(news), "Written as bytes ✓")
+
+
+class DailyCountTests(TestCase):
+    """NewsDailyCount stays equal to a count of the news and the archive per date and source"""
+
+    def setUp(self):
+        self.client = api_client()
+        self.today = datetime.date.today()
+        self.yesterday = self.today - datetime.timedelta(days=1)
+        self.news = [make_news(1), make_news(2, news_from="other"), make_news(3, date=self.yesterday),
+                     make_news(4, date=self.yesterday)]
+
+    def assertCountsMatch(self):
+        expected = Counter()
+        for model in (News, NewsArchive):
+            for date, news_from, count in model.objects.order_by().values_list('date', 'news_from').annotate(
+                    count=Count('id')):
+                expected[date, news_from] += count
+        self.assertEqual({(row.date, row.news_from): row.count for row in NewsDailyCount.objects.all()},
+                         dict(expected))
+
+    def values(self, news, **changes):
+        values = {"title": news.title, "details": news.details, "date": news.date.isoformat(),
+                  "news_from": news.news_from, "news_url": news.news_url}
+        values.update(changes)
+        return values
+
+    def put(self, path, data):
+        response = self.client.put(path, json.dumps(data), content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+
+    def test_created(self):
+        self.assertCountsMatch()
+
+    def test_put_moves_the_date_and_source(self):
+        news = self.news[0]
+        self.put('/news/{}/'.format(news.id), self.values(news, date=self.yesterday.isoformat(), news_from="third"))
+        self.assertCountsMatch()
+        self.assertFalse(NewsDailyCount.objects.filter(date=self.today, news_from="example").exists())
+        # unchanged date and source
+        self.put('/news/{}/'.format(news.id), self.values(News.objects.get(id=news.id), title="New title"))
+        self.assertCountsMatch()
+
+    def test_batch_put(self):
+        first, second = self.news[1], self.news[2]
+        self.put('/news/batch/', [dict(self.values(first, date=self.yesterday.isoformat()), id=first.id),
+                                  dict(self.values(second, news_from="other", date=self.today.isoformat()),
+                                       id=second.id)])
+        self.assertCountsMatch()
+
+    def test_delete(self):
+        with transaction.atomic():
+            delete_news(list(News.objects.filter(id__in=[self.news[0].id, self.news[2].id])))
+        self.assertCountsMatch()
+        self.assertEqual(self.client.delete('/news/{}/'.format(self.news[3].id)).status_code, 204)
+        self.assertCountsMatch()
+        self.assertFalse(NewsDailyCount.objects.filter(date=self.yesterday).exists())
+
+    def test_archived_news_still_counted(self):
+        self.assertEqual(archive_news(self.today), (2, 0))
+        self.assertCountsMatch()
+        self.assertEqual(NewsDailyCount.objects.get(date=self.yesterday, news_from="example").count, 2)
+
+    def test_rebuild(self):
+        archive_news(self.today)
+        NewsDailyCount.objects.all().delete()
+        NewsDailyCount.objects.create(date=self.today, news_from="gone", count=7)
+        self.assertEqual(rebuild_daily_counts(), 3)
+        self.assertCountsMatch()
+
+
+class BatchDeleteTests(TestCase):
+    """DELETE /news/batch/ deletes with set based statements whatever the number of news"""
+
+    def delete(self, ids):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.delete('/news/batch/', json.dumps(ids), content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.content), len(queries)
+
+    def setUp(self):
+        self.client = api_client()
+
+    def test_queries_do_not_grow_with_the_batch(self):
+        ids = [make_news(number, details="Report number {} of the day".format(number)).id for number in range(103)]
+        self.assertEqual(ArticleFingerprint.objects.filter(news_id__in=ids).count(), 103)
+        NewsChange.objects.all().delete()
+        result, few_queries = self.delete(ids[:3])
+        self.assertEqual(result["deleted"], 3)
+        result, many_queries = self.delete(ids[3:] + [ids[0], "x"])
+        self.assertEqual((result["deleted"], result["failed"]), (100, 2))
+        self.assertEqual(many_queries, few_queries)
+        self.assertFalse(News.objects.exists())
+        self.assertFalse(ArticleFingerprint.objects.exists())
+        self.assertFalse(NewsDailyCount.objects.filter(count__gt=0).exists())
+        self.assertEqual(NewsChange.objects.filter(action=NewsChange.DELETE).count(), 103)
+
+
+@override_settings(NEWS_RESPONSE_CACHE=dict(settings.NEWS_RESPONSE_CACHE, VERSION_CHECK_SECONDS=0))
+class ResponseCacheTests(TestCase):
+    """The cached responses follow the writes of the other processes through the head of the change log"""
+
+    def setUp(self):
+        self.client = api_client()
+        get_response_cache().clear()
+
+    def title(self, news_id):
+        response = self.client.get('/news/{}/'.format(news_id))
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.content)["title"]
+
+    def test_change_log_invalidates(self):
+        news = make_news(1, title="Before")
+        self.assertEqual(self.title(news.id), "Before")
+        # written as by another process: no news_changed in this one
+        News.objects.filter(id=news.id).update(title="After")
+        self.assertEqual(self.title(news.id), "Before")
+        NewsChange.objects.create(news_id=news.id, action=NewsChange.UPDATE)
+        self.assertEqual(self.title(news.id), "After")
+
+
+class QueryPlanTests(TestCase):
+    """Every query behind the endpoints reads an index, see the check_query_plans command"""
+
+    def test_no_full_scan(self):
+        plans = explain_endpoint_queries()
+        self.assertTrue(plans)
+        self.assertEqual([(name, plan) for name, plan, full_scan in plans if full_scan], [])
+
+
+class ApiWorkerTests(TestCase):
+
+    def test_urls_do_not_import_the_scraper(self):
+        code = ("import sys, django; django.setup(); import News_API.urls; "
+                "print(sorted(name for name in ('newspaper', 'lxml', 'PIL') if name in sys.modules))")
+        output = subprocess.run([sys.executable, "-c", code], check=True, stdout=subprocess.PIPE,
+                                env=dict(os.environ, DJANGO_SETTINGS_MODULE=settings.SETTINGS_MODULE),
+                                universal_newlines=True).stdout
+        self.assertEqual(output.strip().splitlines()[-1], "[]")
+
+    def test_schema_generated_once(self):
+        SchemaView.schemas.clear()
+        self.addCleanup(SchemaView.schemas.clear)
+        client = APIClient()
+        with mock.patch.object(OpenAPISchemaGenerator, 'get_schema', autospec=True,
+                               side_effect=OpenAPISchemaGenerator.get_schema) as get_schema:
+            first = client.get('/swagger/?format=openapi')
+            second = client.get('/swagger/?format=openapi')
+        self.assertEqual((first.status_code, second.status_code), (200, 200))
+        self.assertEqual(first.content, second.content)
+        self.assertIn(b'/news/', first.content)
+        self.assertEqual(get_schema.call_count, 1)
+
+
+class MetricsTests(TestCase):
+    """/metrics answers the allowed addresses, with the sum of every process or per pid"""
+
+    def metrics(self, **extra):
+        response = self.client.get('/metrics', **extra)
+        return response.status_code, response.content.decode()
+
+    def test_per_pid_without_directory(self):
+        status_code, body = self.metrics()
+        self.assertEqual(status_code, 200)
+        self.assertIn('pid="{}"'.format(os.getpid()), body)
+
+    def test_allowed_addresses(self):
+        self.assertEqual(self.metrics(REMOTE_ADDR='10.1.2.3')[0], 403)
+        with override_settings(NEWS_METRICS_ALLOWED_IPS=['10.0.0.0/8']):
+            self.assertEqual(self.metrics(REMOTE_ADDR='10.1.2.3')[0], 200)
+            self.assertEqual(self.metrics()[0], 403)
+
+    def test_summed_over_processes(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        # metrics written by another worker, gone or alive
+        with open(os.path.join(directory.name, '1-1.json'), 'w') as other:
+            json.dump({"news_api_scrape_articles_total": [[["summed", "inserted"], 5]],
+                       "news_api_scrape_fetch_seconds": [[["summed"], [1] + [0] * 12 + [0.5, 1]]]}, other)
+        with override_settings(NEWS_METRICS_DIR=directory.name):
+            record_scrape({"summed": {"inserted": 2, "fetch_seconds": 2.0, "parse_seconds": 0.1}})
+            status_code, body = self.metrics()
+            self.assertEqual(len(os.listdir(directory.name)), 2)
+        self.assertEqual(status_code, 200)
+        self.assertIn('news_api_scrape_articles_total{source="summed",outcome="inserted"} 7', body)
+        self.assertIn('news_api_scrape_fetch_seconds_bucket{source="summed",le="0.005"} 1', body)
+        self.assertIn('news_api_scrape_fetch_seconds_bucket{source="summed",le="2.5"} 2', body)
+        self.assertIn('news_api_scrape_fetch_seconds_count{source="summed"} 2', body)
+        self.assertNotIn('pid=', body)
+
+
+@override_settings(NEWS_AUTH_CACHE=dict(settings.NEWS_AUTH_CACHE, REVOCATION_CHECK_SECONDS=0))
+class RevokeTokenTests(TestCase):
+    """POST /api/token/revoke/ only revokes the tokens of its user, for every worker"""
+
+    def setUp(self):
+        self.owner = get_user_model().objects.create_user("owner", password="secret")
+        self.other = get_user_model().objects.create_user("other", password="secret")
+
+    def request(self, method, path, token, data=None):
+        return getattr(self.client, method)(path, json.dumps(data) if data else None, content_type='application/json',
+                                            HTTP_AUTHORIZATION='Bearer {}'.format(token))
+
+    def test_revoke_own_token(self):
+        token = AccessToken.for_user(self.owner)
+        self.assertEqual(self.request('get', '/news/', token).status_code, 200)
+        self.assertEqual(self.request('post', '/api/token/revoke/', token).status_code, 200)
+        self.assertEqual(self.request('get', '/news/', token).status_code, 401)
+        self.assertTrue(RevokedToken.objects.filter(jti=token['jti']).exists())
+
+    def test_token_of_another_user(self):
+        token = AccessToken.for_user(self.owner)
+        response = self.request('post', '/api/token/revoke/', AccessToken.for_user(self.other), {"token": str(token)})
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(self.request('get', '/news/', token).status_code, 200)
+
+    def test_revoked_by_another_worker(self):
+        token = AccessToken.for_user(self.owner)
+        self.assertEqual(self.request('get', '/news/', token).status_code, 200)
+        RevokedToken.objects.create(jti=token['jti'], expires_at=timezone.now() + datetime.timedelta(minutes=5))
+        self.assertEqual(self.request('get', '/news/', token).status_code, 401)
+
+
+class CachedUserTests(TestCase):
+    """The users cached with their tokens follow the changes made by the other workers"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user("cached", password="secret")
+        self.token = AccessToken.for_user(self.user)
+
+    def get(self):
+        return self.client.get('/news/', HTTP_AUTHORIZATION='Bearer {}'.format(self.token)).status_code
+
+    def deactivate_elsewhere(self):
+        # an update sends no post_save, as for a user changed by another worker
+        get_user_model().objects.filter(pk=self.user.pk).update(is_active=False)
+
+    def test_deactivated_by_this_worker(self):
+        self.assertEqual(self.get(), 200)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.get(), 401)
+
+    @override_settings(NEWS_AUTH_CACHE={'TIMEOUT': 300, 'USER_CHECK_SECONDS': 0})
+    def test_deactivated_by_another_worker(self):
+        self.assertEqual(self.get(), 200)
+        self.deactivate_elsewhere()
+        self.assertEqual(self.get(), 401)
+
+    @override_settings(NEWS_AUTH_CACHE={'TIMEOUT': 300, 'USER_CHECK_SECONDS': 60})
+    def test_checked_every_user_check_seconds(self):
+        self.assertEqual(self.get(), 200)
+        self.deactivate_elsewhere()
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.get(), 200)
+        self.assertFalse([query for query in queries if 'auth_user' in query['sql']])
+        with mock.patch('news_api_app.authentication.time.monotonic', return_value=time.monotonic() + 61):
+            self.assertEqual(self.get(), 401)
+
+    @override_settings(NEWS_AUTH_CACHE={'TIMEOUT': 300, 'USER_CHECK_SECONDS': 0})
+    def test_deleted_by_another_worker(self):
+        self.assertEqual(self.get(), 200)
+        with connection.cursor() as cursor:
+            cursor.execute("DELETE FROM {} WHERE id = %s".format(get_user_model()._meta.db_table), [self.user.pk])
+        self.assertEqual(self.get(), 401)
+
+
+class ArchivedNewsTests(TestCase):
+    """Archived news leave the News table, their detail is still served"""
+
+    def setUp(self):
+        self.client = api_client()
+        get_response_cache().clear()
+
+    def test_detail_falls_back_to_the_archive(self):
+        old = make_news(1, date=datetime.date.today() - datetime.timedelta(days=200),
+                        details="Old report on the harbour works of the town")
+        recent = make_news(2)
+        detail = self.client.get('/news/{}/'.format(old.id)).content
+        self.assertEqual(archive_news(datetime.date.today() - datetime.timedelta(days=90)), (1, 0))
+        self.assertFalse(News.objects.filter(id=old.id).exists())
+        self.assertFalse(ArticleFingerprint.objects.filter(news_id=old.id).exists())
+        self.assertTrue(NewsArchive.objects.filter(id=old.id).exists())
+        self.assertEqual(NewsChange.objects.filter(news_id=old.id, action=NewsChange.ARCHIVE).count(), 1)
+        response = self.client.get('/news/{}/'.format(old.id))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, detail)
+        self.assertEqual([news["id"] for news in json.loads(self.client.get('/news/').content)["results"]],
+                         [recent.id])
+        self.assertEqual(self.client.get('/news/{}/'.format(recent.id + 1)).status_code, 404)
+
+
+REPLICA = 'replica_test'
+# registered on import, before the test runner sets the databases up and points the mirror at the test database
+connections.databases.setdefault(REPLICA, dict(connections.databases['default'], TEST={'MIRROR': 'default'}))
+
+
+@override_settings(NEWS_READ_REPLICAS={'DATABASES': [REPLICA], 'STICKY_SECONDS': 60, 'ALIAS': 'default'})
+class ReplicaRoutingTests(TransactionTestCase):
+    """
+    Reads of the views decorated with read_from_replica go to the replica,
+    a second connection mirroring the test database, unless the client just
+    wrote. Transactions are committed so the replica connection sees the rows.
+    """
+    databases = {'default', REPLICA}
+
+    def setUp(self):
+        caches['default'].clear()
+        get_response_cache().clear()
+        self.client = api_client()
+
+    def news_queries(self, alias, path):
+        with CaptureQueriesContext(connections[alias]) as queries:
+            response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+        return [query["sql"] for query in queries if News._meta.db_table in query["sql"]], json.loads(response.content)
+
+    def test_reads_go_to_the_replica(self):
+        news = make_news(1)
+        queries, content = self.news_queries(REPLICA, '/news/')
+        self.assertTrue(queries)
+        self.assertEqual([item["id"] for item in content["results"]], [news.id])
+        queries, _ = self.news_queries('default', '/news/{}/'.format(news.id))
+        self.assertEqual(queries, [])
+
+    def test_primary_after_write(self):
+        response = self.client.post('/news/', json.dumps({
+            "title": "Fresh", "details": "Just written", "date": datetime.date.today().isoformat(),
+            "news_from": "example", "news_url": "https://example.com/fresh",
+        }), content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        queries, content = self.news_queries(REPLICA, '/news/')
+        self.assertEqual(queries, [])
+        self.assertEqual([item["title"] for item in content["results"]], ["Fresh"])
+        # only the client which wrote is pinned
+        self.client = api_client("other")
+        queries, _ = self.news_queries(REPLICA, '/news/?page_size=10')
+        self.assertTrue(queries)
+
+
+class NewsChangesTests(TransactionTestCase):
+    """
+    GET /news/changes/ from a cursor. Transactions are committed, on
+    PostgreSQL the changes of a running transaction are not served.
+    """
+
+    def setUp(self):
+        self.client = api_client()
+
+    def changes(self, since=None, page_size=None):
+        params = {key: value for key, value in (("since", since), ("page_size", page_size)) if value}
+        response = self.client.get('/news/changes/', params)
+        self.assertEqual(response.status_code, 200)
+        content = json.loads(response.content)
+        return content["changes"], content["next"], content["has_more"]
+
+    def test_resume_from_cursor(self):
+        changes, cursor, has_more = self.changes()
+        self.assertEqual((changes, has_more), ([], False))
+        first, second, third = (make_news(number) for number in range(3))
+        changes, cursor, has_more = self.changes(cursor, 2)
+        self.assertEqual([(change["action"], change["id"]) for change in changes],
+                         [("insert", first.id), ("insert", second.id)])
+        self.assertTrue(has_more)
+        changes, cursor, has_more = self.changes(cursor, 2)
+        self.assertEqual([(change["action"], change["id"]) for change in changes], [("insert", third.id)])
+        self.assertEqual(changes[0]["news"]["details"], third.details)
+        self.assertFalse(has_more)
+        first.title = "Corrected"
+        first.save()
+        changes, cursor, has_more = self.changes(cursor)
+        self.assertEqual([(change["action"], change["id"], change["news"]["title"]) for change in changes],
+                         [("update", first.id, "Corrected")])
+        self.assertEqual(self.changes(cursor)[0], [])
+
+    def test_tombstones_for_deletes(self):
+        kept = make_news(1)
+        _, cursor, _ = self.changes()
+        deleted = make_news(2)
+        self.assertEqual(self.client.delete('/news/{}/'.format(kept.id)).status_code, 204)
+        deleted_id = deleted.id
+        deleted.delete()
+        changes, _, _ = self.changes(cursor)
+        # the insert and the delete of the same news come as the tombstone only
+        self.assertEqual(changes, [{"action": "delete", "id": kept.id}, {"action": "delete", "id": deleted_id}])
+
+    def test_expired_cursor_after_prune(self):
+        past = timezone.now() - datetime.timedelta(days=settings.NEWS_CHANGES_KEEP_DAYS + 2)
+        with mock.patch('django.utils.timezone.now', return_value=past):
+            _, cursor, _ = self.changes()
+            make_news(1)
+        make_news(2)
+        call_command('prune_news_changes', stdout=io.StringIO())
+        self.assertEqual(NewsChange.objects.count(), 1)
+        with self.assertRaises(ChangesExpired):
+            read_changes(cursor, 10)
+        response = self.client.get('/news/changes/', {"since": cursor})
+        self.assertEqual(response.status_code, 410)
+        self.assertEqual(self.changes()[0], [])
+
+
+class KeywordSuggesterTests(TestCase):
+
+    def setUp(self):
+        make_news(1, title="Election results")
+        make_news(2, title="Election turnout")
+        self.suggester = KeywordSuggester()
+
+    def test_does_not_wait_for_the_load(self):
+        with mock.patch('news_api_app.suggest.in_background') as in_background:
+            # held by the load of load_at_startup
+            with self.suggester._load_lock:
+                self.assertEqual(self.suggester.suggest("elect", 10), [])
+            in_background.assert_not_called()
+            self.assertEqual(self.suggester.suggest("elect", 10), [])
+            in_background.assert_called_once_with(self.suggester.load, 'news-suggest-load')
+        self.assertIsNone(self.suggester.index)
+
+    def test_suggests_once_loaded(self):
+        self.suggester.load()
+        self.assertEqual(self.suggester.suggest("new elect", 10), [{"text": "new election", "count": 2}])
+
+
+class FeedParsingTests(SimpleTestCase):
+    """discovery.py on the feeds and pages served by benchmarks/fixture_server.py"""
+    url = "http://news.example/"
+
+    def setUp(self):
+        self.today = datetime.date.today()
+        # 2 stories of today, 3 of the previous days
+        self.stories = stories(2, 3, self.today)
+
+    def story_url(self, index, day):
+        return "{}{:%Y/%m/%d}/story-number-{}-of-the-day.html".format(self.url, day, index)
+
+    def expected_entries(self):
+        return [[self.story_url(index, day), "{}T08:00:00+00:00".format(day.isoformat())]
+                for index, day in self.stories]
+
+    def test_rss(self):
+        self.assertEqual(parse_feed(self.url + "feed.xml", rss_xml("Example", self.url, self.stories)),
+                         {"entries": self.expected_entries(), "sitemaps": []})
+
+    def test_atom_relative_links(self):
+        self.assertEqual(parse_feed(self.url + "feed.xml", atom_xml("Example", self.url, self.stories)),
+                         {"entries": self.expected_entries(), "sitemaps": []})
+
+    def test_news_sitemap(self):
+        self.assertEqual(parse_feed(self.url + "news-sitemap.xml", news_sitemap_xml(self.url, self.stories)),
+                         {"entries": self.expected_entries(), "sitemaps": []})
+
+    def test_sitemap_index(self):
+        self.assertEqual(parse_feed(self.url + "sitemap.xml", sitemap_index_xml(self.url, self.today)),
+                         {"entries": [], "sitemaps": [[self.url + "news-sitemap.xml",
+                                                       "{}T00:00:00".format(self.today.isoformat())]]})
+
+    def test_not_a_feed(self):
+        for content in ("<html><body>", homepage_html("Example", self.stories)):
+            with self.assertRaises(FeedError):
+                parse_feed(self.url, content)
+
+    def test_feed_links(self):
+        self.assertEqual(feed_links(self.url, homepage_html("Example", self.stories, "rss")),
+                         [self.url + "feed.xml"])
+        self.assertEqual(feed_links(self.url, homepage_html("Example", self.stories)), [])
+        html = ("<head><link rel='alternate' type='application/rss+xml' href='/rss'>"
+                '<link rel="stylesheet" href="/style.css"><link rel="alternate" hreflang="fr" href="/fr/">'
+                '<LINK REL="Alternate" TYPE="application/atom+xml" HREF="https://cdn.example/atom.xml"/>'
+                "<link rel=alternate type=application/rss+xml href=/rss></head>")
+        self.assertEqual(feed_links(self.url + "world/", html), [self.url + "rss", "https://cdn.example/atom.xml"])
+
+    def test_dates(self):
+        entries = parse_feed(self.url, rss_xml("Example", self.url, self.stories))["entries"]
+        self.assertEqual([is_recent(published, self.today) for _, published in entries],
+                         [True, True, False, False, False])
+        self.assertTrue(is_recent(None, self.today))
+        ordered = newest_first([[self.url + "undated", None]] + entries[::-1] + entries[:1])
+        # each url once
+        self.assertCountEqual([url for url, _ in ordered], [self.url + "undated"] + [url for url, _ in entries])
+        self.assertEqual([published for _, published in ordered],
+                         sorted((published for _, published in entries), reverse=True) + [None])
+
+
+class ScrapeDiscoveryTests(TestCase):
+    """
+    ScrapeEngine against the sites of benchmarks/fixture_server.py: the old
+    and already stored articles are dropped before anything is downloaded
+    """
+
+    def start(self, feed=None):
+        site = start_sites(1, articles=3, old=5, feed=feed)[0]
+        self.addCleanup(site.stop)
+        return site
+
+    def scrape(self, site, feeds=None, known_urls=None, limit=10, fetch_cache=None):
+        sources = as_newspapers([site])
+        if feeds:
+            sources[site.name]["feeds"] = [site.url + url for url in feeds]
+        requests = site.requests
+        articles, stats = ScrapeEngine(parse_processes=0, known_urls=known_urls,
+                                       fetch_cache=fetch_cache).scrape(sources, limit)
+        return articles, stats[site.name], site.requests - requests
+
+    def test_rss_feed_of_the_homepage(self):
+        articles, stats, requests = self.scrape(self.start("rss"))
+        self.assertEqual((len(articles), stats["feeds"], stats["old"], stats["parsed"]), (3, 1, 5, 3))
+        # homepage, feed and the articles of today only
+        self.assertEqual(requests, 2 + 3)
+
+    def test_atom_feed_of_the_homepage(self):
+        articles, stats, requests = self.scrape(self.start("atom"), limit=2)
+        self.assertEqual((len(articles), stats["old"]), (2, 5))
+        self.assertEqual(requests, 2 + 2)
+
+    def test_configured_sitemap_index(self):
+        articles, stats, requests = self.scrape(self.start(), feeds=["missing.xml", "sitemap.xml"])
+        self.assertEqual((len(articles), stats["feeds"], stats["old"]), (3, 2, 5))
+        # no homepage: the missing feed, the index, its news sitemap and the articles
+        self.assertEqual(requests, 3 + 3)
+
+    def test_known_urls_not_downloaded(self):
+        site = self.start("rss")
+        articles, _, _ = self.scrape(site)
+        make_news(1, news_url=articles[0]["url"])
+        articles, stats, requests = self.scrape(site, known_urls=ingested_urls)
+        self.assertEqual((len(articles), stats["known"]), (2, 1))
+        self.assertEqual(requests, 2 + 2)
+
+    def test_homepage_crawled_without_feed(self):
+        # no feed announced or readable: newspaper finds the articles of the homepage, undated
+        site = self.start()
+        articles, stats, _ = self.scrape(site, feeds=["missing.xml"])
+        self.assertEqual((len(articles), stats["feeds"], stats["old"]), (8, 0, 0))
+        self.assertEqual({article["title"] for article in articles},
+                         {"Story {} of {}".format(index, site.name) for index in range(8)})
+
+    def test_validators_only_cached_for_articles(self):
+        site = self.start("rss")
+        articles, _, _ = self.scrape(site, fetch_cache=DatabaseFetchCache())
+        self.assertEqual(len(articles), 3)
+        pages = {page.url: page.parsed for page in FetchedPage.objects.all()}
+        self.assertEqual([pages[article["url"]] for article in articles], [{}] * 3)
+        self.assertEqual(len(pages[site.url + "feed.xml"]["entries"]), 8)
+        # unchanged articles were returned by the first scrape, they are not parsed again
+        articles, stats, _ = self.scrape(site, fetch_cache=DatabaseFetchCache())
+        self.assertEqual((len(articles), stats["downloaded"], stats["not_modified"] + stats["unchanged"],
+                          stats["parsed"]), (0, 3, 3, 0))
+
+    @override_settings(SCRAPER_FETCH_CACHE_KEEP_DAYS=7)
+    def test_old_pages_pruned(self):
+        old = FetchedPage.objects.create(url="https://example.com/old", url_hash="0" * 64)
+        recent = FetchedPage.objects.create(url="https://example.com/recent", url_hash="1" * 64)
+        FetchedPage.objects.filter(id=old.id).update(fetched_at=timezone.now() - datetime.timedelta(days=8))
+        FetchedPage.objects.filter(id=recent.id).update(fetched_at=timezone.now() - datetime.timedelta(days=6))
+        self.scrape(self.start("rss"), fetch_cache=DatabaseFetchCache())
+        self.assertFalse(FetchedPage.objects.filter(id=old.id).exists())
+        self.assertTrue(FetchedPage.objects.filter(id=recent.id).exists())
+
+
+class FakeEngine:
+    """ScrapeEngine stand-in returning fixed articles per source, or raising"""
+
+    def __init__(self, articles=(), error=None):
+        self.articles = list(articles)
+        self.error = error
+
+    def scrape(self, companies, limit, progress=None):
+        if self.error is not None:
+            raise self.error
+        for name in companies:
+            progress(name, {"articles": sum(1 for article in self.articles if article["news_from"] == name)})
+        return self.articles, {}
+
+
+def scraped_article(number, news_from, publish_date=None):
+    return {"title": "Story {}".format(number), "text": "Text of the story {}".format(number),
+            "publish_date": publish_date or datetime.datetime.now(), "news_from": news_from,
+            "url": "https://{}.example/{}".format(news_from, number)}
+
+
+def use_sources(test, sources):
+    """Serve sources as the NewsPapers.json of the jobs for the duration of a test"""
+    sources_file = tempfile.NamedTemporaryFile("w", suffix=".json", delete=False)
+    json.dump(sources, sources_file)
+    sources_file.close()
+    test.addCleanup(os.remove, sources_file.name)
+    override = override_settings(NEWS_PAPERS_FILE=sources_file.name)
+    override.enable()
+    test.addCleanup(override.disable)
+
+
+class ScrapeJobTests(TestCase):
+    """The queue of scrape jobs: claim, progress, outcome and reaping"""
+
+    def setUp(self):
+        use_sources(self, {"alpha": {"link": "https://alpha.example"}, "beta": {"link": "https://beta.example"}})
+
+    def test_empty_queue(self):
+        self.assertIsNone(claim_next_job())
+
+    def test_claim_oldest_first(self):
+        first, second = enqueue_scrape_job(), enqueue_scrape_job()
+        job = claim_next_job()
+        self.assertEqual((job.id, job.status), (first.id, ScrapeJob.RUNNING))
+        self.assertIsNotNone(job.started_at)
+        self.assertEqual(claim_next_job().id, second.id)
+        self.assertIsNone(claim_next_job())
+
+    def test_succeeded_with_progress_per_source(self):
+        make_news(1, news_url="https://alpha.example/1")
+        yesterday = datetime.datetime.now() - datetime.timedelta(days=1)
+        articles = [scraped_article(1, "alpha"), scraped_article(2, "alpha"), scraped_article(3, "beta"),
+                    scraped_article(4, "beta", yesterday)]
+        enqueue_scrape_job()
+        job = run_job(claim_next_job(), engine=FakeEngine(articles))
+        job.refresh_from_db()
+        self.assertEqual(job.status, ScrapeJob.SUCCEEDED)
+        self.assertIsNotNone(job.finished_at)
+        self.assertEqual((job.articles_inserted, job.articles_skipped), (2, 1))
+        self.assertEqual(job.sources["alpha"], {"status": "done", "articles": 2, "inserted": 1, "skipped": 1,
+                                                "near_duplicates": 0})
+        # the article of yesterday is not stored
+        self.assertEqual(job.sources["beta"], {"status": "done", "articles": 2, "inserted": 1, "skipped": 0,
+                                               "near_duplicates": 0})
+        self.assertEqual(News.objects.count(), 3)
+
+    def test_only_named_sources(self):
+        enqueue_scrape_job()
+        job = run_job(claim_next_job(), engine=FakeEngine([scraped_article(1, "beta")]), names=["beta"])
+        self.assertEqual(list(job.sources), ["beta"])
+
+    def test_failed(self):
+        enqueue_scrape_job()
+        job = run_job(claim_next_job(), engine=FakeEngine(error=RuntimeError("network down")))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.error), (ScrapeJob.FAILED, "network down"))
+        self.assertIsNotNone(job.finished_at)
+        self.assertEqual(job.sources, {"alpha": {"status": "pending"}, "beta": {"status": "pending"}})
+        self.assertEqual(News.objects.count(), 0)
+
+    @override_settings(SCRAPE_JOB_TIMEOUT=60)
+    def test_stale_running_job_failed(self):
+        stale, recent = enqueue_scrape_job(), enqueue_scrape_job()
+        ScrapeJob.objects.filter(id=stale.id).update(status=ScrapeJob.RUNNING,
+                                                     started_at=timezone.now() - datetime.timedelta(seconds=61))
+        ScrapeJob.objects.filter(id=recent.id).update(status=ScrapeJob.RUNNING, started_at=timezone.now())
+        self.assertIsNone(claim_next_job())
+        stale.refresh_from_db()
+        recent.refresh_from_db()
+        self.assertEqual(stale.status, ScrapeJob.FAILED)
+        self.assertIsNotNone(stale.finished_at)
+        self.assertIn("60 seconds", stale.error)
+        self.assertEqual(recent.status, ScrapeJob.RUNNING)
+
+
+class SchedulerTests(TestCase):
+    """poll_due_sources adapts the poll interval of every source to what it finds"""
+
+    def setUp(self):
+        use_sources(self, {"alpha": {"link": "https://alpha.example", "limit": 2, "poll_interval": 600,
+                                     "min_poll_interval": 200, "max_poll_interval": 1000}})
+        self.number = 0
+
+    def poll(self, inserted=0, error=None):
+        # make the source due and scrape inserted new articles
+        SourceState.objects.update(next_poll_at=timezone.now())
+        articles = [scraped_article(self.number + index, "alpha") for index in range(inserted)]
+        self.number += inserted
+        job = poll_due_sources(FakeEngine(articles, error))
+        return job, SourceState.objects.get(name="alpha")
+
+    def test_new_source_due_at_once(self):
+        job = poll_due_sources(FakeEngine())
+        self.assertEqual(job.status, ScrapeJob.SUCCEEDED)
+        state = SourceState.objects.get(name="alpha")
+        self.assertEqual(state.polls, 1)
+        self.assertAlmostEqual((state.next_poll_at - state.last_polled_at).total_seconds(), state.poll_interval)
+        # not due again before its interval
+        self.assertIsNone(poll_due_sources(FakeEngine()))
+
+    def test_backoff_up_to_the_longest_interval(self):
+        intervals = [self.poll()[1].poll_interval for _ in range(3)]
+        self.assertEqual(intervals, [900, 1000, 1000])
+
+    def test_full_poll_resets_to_shorter_intervals(self):
+        self.poll()
+        self.assertEqual(self.poll()[1].poll_interval, 1000)
+        intervals = [self.poll(inserted=2)[1].poll_interval for _ in range(3)]
+        self.assertEqual(intervals, [500, 250, 200])
+
+    def test_partial_poll_keeps_the_interval(self):
+        state = self.poll(inserted=1)[1]
+        self.assertEqual((state.poll_interval, state.last_inserted), (600, 1))
+
+    def test_failed_poll_keeps_the_interval(self):
+        self.poll()
+        job, state = self.poll(error=RuntimeError("network down"))
+        self.assertEqual(job.status, ScrapeJob.FAILED)
+        self.assertEqual((state.poll_interval, state.polls), (900, 2))
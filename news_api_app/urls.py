@@ -1,11 +1,21 @@
 from django.urls import path, include
 
-from news_api_app.views import NewsAPIView, NewsDetailsAPIView, FilterNews, ScrapedNews
+from news_api_app.views import NewsAPIView, NewsDetailsAPIView, FilterNews, ScrapedNews, \
+    ScrapeJobDetails, NewsBatchAPIView, CacheStats, NewsExport, Metrics, NewsStats, NewsChanges, \
+    SuggestKeywords
 
 urlpatterns = [
     path('news/', NewsAPIView.as_view()),
     path('bulk-news/', ScrapedNews.as_view()),
+    path('bulk-news/<int:job_id>/', ScrapeJobDetails.as_view()),
+    path('news/batch/', NewsBatchAPIView.as_view()),
+    path('news/export/', NewsExport.as_view()),
+    path('news/stats/', NewsStats.as_view()),
+    path('news/changes/', NewsChanges.as_view()),
     path('news/<int:id>/', NewsDetailsAPIView.as_view()),
-    path('news-filter/', FilterNews.as_view())
+    path('news-filter/', FilterNews.as_view()),
+    path('news-filter/suggest/', SuggestKeywords.as_view()),
+    path('cache-stats/', CacheStats.as_view()),
+    path('metrics', Metrics.as_view()),
 
 ]
@@ -0,0 +1,58 @@
+import hashlib
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+# query parameters which only track where the reader came from
+TRACKING_PARAMETERS = ('utm_', 'fbclid', 'gclid', 'ocid', 'cmpid')
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+# characters of the details shown by the lists before the ellipsis
+SNIPPET_LENGTH = 280
+
+
+def normalize_url(url):
+    """
+    Normalize a news url so the same article always gives the same url: the
+    scheme and host are lower cased, the default port, the fragment, the
+    tracking parameters and the trailing slash are dropped and the query is sorted
+    :param url:
+    :return:
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or '').lower()
+    if host.startswith('www.'):
+        host = host[4:]
+    if parts.port and parts.port != DEFAULT_PORTS.get(scheme):
+        host = '{}:{}'.format(host, parts.port)
+    path = parts.path.rstrip('/') or '/'
+    query = sorted(
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not key.lower().startswith(TRACKING_PARAMETERS)
+    )
+    return urlunsplit((scheme, host, path, urlencode(query), ''))
+
+
+def url_hash(url):
+    """
+    Hash of the normalized url, the dedup key of the news
+    :param url:
+    :return:
+    """
+    return hashlib.sha256(normalize_url(url).encode()).hexdigest()
+
+
+def summarize(details):
+    """
+    Teaser and length of the details of a news: the first words up to
+    SNIPPET_LENGTH characters, whitespace collapsed, with an ellipsis when
+    cut, and the number of words
+    :param details:
+    :return: (snippet, word_count)
+    """
+    words = details.split()
+    length = -1
+    for count, word in enumerate(words):
+        length += len(word) + 1
+        if length > SNIPPET_LENGTH:
+            snippet = " ".join(words[:count]).rstrip(",;:-") if count else word[:SNIPPET_LENGTH]
+            return snippet + "\u2026", len(words)
+    return " ".join(words), len(words)
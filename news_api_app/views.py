@@ -2,19 +2,45 @@ import datetime
 import json
 from json import JSONDecodeError
 
-import newspaper
-from django.db.models import Q
-from django.http import JsonResponse
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.decorators import method_decorator
 from drf_yasg import openapi
 from drf_yasg.utils import swagger_auto_schema
 from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.views import APIView
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
 
-from .models import News
-from .serializers import NewsSerializer
+from .authentication import revoke_token
+from .cache import cache_stats, cached_response
+from .changes import ChangesExpired, read_changes
+from .export import CONTENT_TYPES, export_stream, parse_date
+from .ingest import BATCH_SIZE, build_news, delete_news, ingest_news
+from .jobs import enqueue_scrape_job
+from .metrics import CONTENT_TYPE, REGISTRY, is_allowed_client
+from .models import News, NewsArchive, ScrapeJob
+from .pagination import PaginationError, paginate_keyset, parse_fields, parse_page_number, parse_page_size
+from .rollup import daily_counts
+from .routers import read_from_replica
+from .search import get_search_backend
+from .serializers import NEWS_LIST_FIELDS, NewsRowSerializer, NewsSerializer, ScrapeJobSerializer, render_json
+from .signals import news_changed
+from .suggest import suggester
+from .utils import summarize, url_hash
+
+NEWS_KEYS = ["title", "details", "date", "news_from", "news_url"]
+NEWS_UPDATE_FIELDS = ["title", "details", "date", "news_from", "news_url", "url_hash", "snippet", "word_count"]
+BATCH_MAX_ITEMS = getattr(settings, 'NEWS_BATCH_MAX_ITEMS', 500)
+STATS_TOP = 10
+STATS_MAX_TOP = 100
+SUGGEST_LIMIT = 10
+SUGGEST_MAX_LIMIT = 50
 
 
 def validate_parameters(json_request, valid_keys_json):
@@ -51,23 +77,101 @@ def validate_parameters(json_request, valid_keys_json):
         return True, response
 
 
+def parse_news_item(item, valid_keys):
+    """
+    Validate one item of a batch request
+    :param item: decoded json of the item
+    :param valid_keys: mandatory keys of the item
+    :return: (error, values) where error is None for a valid item
+    """
+    if not isinstance(item, dict):
+        return {"error": "Item must be a json object"}, None
+    is_errors, response = validate_parameters(item, valid_keys)
+    if is_errors:
+        return response, None
+    try:
+        date = datetime.datetime.strptime(str(item["date"]), "%Y-%m-%d").date()
+    except ValueError as e:
+        return {"error": "Valid format for date is YYYY-MM-DD"}, None
+    values = {key: str(item[key]).strip() for key in ("title", "details", "news_from", "news_url")}
+    values["date"] = date
+    return None, values
+
+
+def batch_response(results, done_status):
+    """
+    Body of a batch response with a summary of the item results
+    :param results: result entry of every item
+    :param done_status: status of the items which were applied
+    :return:
+    """
+    done = sum(1 for result in results if result["status"] == done_status)
+    return {"results": results, done_status: done, "failed": len(results) - done}
+
+
+def parse_batch(request):
+    """
+    Decode the json array of a batch request and check its size
+    :param request:
+    :return: (error response, items) where the error response is None for a valid batch
+    """
+    items = json.loads(request.body)
+    if not isinstance(items, list) or not items:
+        return JsonResponse({"error": "Request body must be a non empty json array"},
+                            status=status.HTTP_400_BAD_REQUEST), None
+    if len(items) > BATCH_MAX_ITEMS:
+        return JsonResponse({"error": "At most {} items per batch".format(BATCH_MAX_ITEMS)},
+                            status=status.HTTP_400_BAD_REQUEST), None
+    return None, items
+
+
 class NewsAPIView(APIView):
     permission_classes = (IsAuthenticated,)
 
     @swagger_auto_schema(
-        operation_description="List all the news.",
-        responses={200: '[{"id":xx,"title":xxx,"details":xxx,"date":xx,"news_from":xx,"news_url":xx}]'}
+        operation_description="List the news, newest first, one page at a time. The news come with a snippet "
+                              "of their details, GET /news/{id}/ gives the details.",
+        manual_parameters=[
+            openapi.Parameter('cursor', openapi.IN_QUERY, type=openapi.TYPE_STRING,
+                              description='Cursor returned as "next" by the previous page'),
+            openapi.Parameter('page_size', openapi.IN_QUERY, type=openapi.TYPE_INTEGER,
+                              description='Number of news per page'),
+            openapi.Parameter('fields', openapi.IN_QUERY, type=openapi.TYPE_STRING,
+                              description='Comma separated list of fields to return e.g. id,title,date'),
+        ],
+        responses={200: '{"results":[{"id":xx,"title":xxx,"date":xx,"news_from":xx,"news_url":xx,"snippet":xxx,'
+                        '"word_count":xx}],"next":xxx}'}
 
     )
+    @method_decorator(read_from_replica)
     def get(self, request):
         """
-        list all the news
+        list the news page by page, served from the response cache when possible
         :param request:
         :return:
         """
-        queryset = News.objects.all()
-        serializer = NewsSerializer(queryset, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        return cached_response(request, lambda: self.list_news(request))
+
+    def list_news(self, request):
+        """
+        list the news page by page using keyset pagination on (date, id)
+        :param request:
+        :return:
+        """
+        try:
+            fields = parse_fields(request.query_params.get("fields"), NEWS_LIST_FIELDS)
+            page_size = parse_page_size(request.query_params.get("page_size"))
+            # date and id are always loaded as they build the cursor of the next page
+            row_fields = tuple(field for field in NEWS_LIST_FIELDS if field in fields or field in ("id", "date"))
+            date_index, id_index = row_fields.index("date"), row_fields.index("id")
+            rows, next_cursor = paginate_keyset(News.objects.values_list(*row_fields),
+                                                request.query_params.get("cursor"), page_size,
+                                                key=lambda row: (row[date_index], row[id_index]))
+        except PaginationError as e:
+            return JsonResponse({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        serializer = NewsRowSerializer(fields, row_fields)
+        return HttpResponse(render_json({"results": serializer.many(rows), "next": next_cursor}),
+                            content_type="application/json", status=status.HTTP_200_OK)
 
     @swagger_auto_schema(
         operation_description="Add single record for news",
@@ -105,12 +209,16 @@ class NewsAPIView(APIView):
                 news_from = data.get("news_from")
                 news_url = data.get("news_url")
                 date = datetime.datetime.strptime(date, "%Y-%m-%d")
-                if News.objects.filter(title=title, news_from=news_from, news_url=news_url).exists():
+                if News.objects.filter(url_hash=url_hash(news_url)).exists():
                     return JsonResponse({"error": "News already exists!"}, status=status.HTTP_400_BAD_REQUEST)
                 else:
-                    News.objects.create(title=title.strip(), details=details.strip(), news_from=news_from.strip(),
-                                        news_url=news_url.strip(), date=date)
+                    with transaction.atomic():
+                        News.objects.create(title=title.strip(), details=details.strip(), news_from=news_from.strip(),
+                                            news_url=news_url.strip(), date=date)
                 return JsonResponse({"message": "Record created!"}, status=status.HTTP_201_CREATED)
+        except IntegrityError as e:
+            # inserted by another request since the check above
+            return JsonResponse({"error": "News already exists!"}, status=status.HTTP_400_BAD_REQUEST)
         except JSONDecodeError as e:
             return JsonResponse({"error": "Invalid Json"}, status=status.HTTP_400_BAD_REQUEST)
         except ValueError as e:
@@ -135,22 +243,38 @@ class NewsDetailsAPIView(APIView):
 
     @swagger_auto_schema(
         operation_description="Detail of single news.",
-        responses={200: '{"id":xx,"title":xxx,"details":xxx,"date":xx,"news_from":xx,"news_url":xx}'}
+        responses={200: '{"id":xx,"title":xxx,"details":xxx,"date":xx,"news_from":xx,"news_url":xx,"snippet":xxx,'
+                        '"word_count":xx}'}
     )
+    @method_decorator(read_from_replica)
     def get(self, request, id=None):
         """
-        Get the record from the db and return the detail
+        Return the detail of the news, served from the response cache when possible
         :param request:
         :param id: pk of news in db
         :return:
         """
+        return cached_response(request, lambda: self.get_news(id))
+
+    def get_news(self, id):
+        """
+        Get the record from the db and return the detail, a news moved to the
+        archive is served from there
+        :param id: pk of news in db
+        :return:
+        """
         try:
             success_status, result = self.get_object(id)
-            if success_status:
-                serializer = NewsSerializer(result)
-                return Response(serializer.data, status=status.HTTP_200_OK)
-            else:
-                return JsonResponse(result, status=status.HTTP_404_NOT_FOUND)
+            if not success_status:
+                archived = NewsArchive.objects.filter(id=id).first()
+                if archived is None:
+                    return JsonResponse(result, status=status.HTTP_404_NOT_FOUND)
+                snippet, word_count = summarize(archived.details)
+                result = News(id=archived.id, title=archived.title, details=archived.details, date=archived.date,
+                              news_from=archived.news_from, news_url=archived.news_url, snippet=snippet,
+                              word_count=word_count)
+            serializer = NewsSerializer(result)
+            return Response(serializer.data, status=status.HTTP_200_OK)
         except Exception as e:
             return JsonResponse({"error": "Internal server error"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
@@ -197,10 +321,14 @@ class NewsDetailsAPIView(APIView):
                     instance.news_from = news_from.strip()
                     instance.news_url = news_url.strip()
                     instance.date = date
-                    instance.save()
+                    with transaction.atomic():
+                        instance.save()
                     return JsonResponse({"message": "Record Updated!"}, status=status.HTTP_200_OK)
                 else:
                     return JsonResponse(instance, status=status.HTTP_404_NOT_FOUND)
+        except IntegrityError as e:
+            # the new url belongs to another news
+            return JsonResponse({"error": "News already exists!"}, status=status.HTTP_400_BAD_REQUEST)
         except JSONDecodeError as e:
             return JsonResponse({"error": "Invalid Json"}, status=status.HTTP_400_BAD_REQUEST)
         except ValueError as e:
@@ -231,6 +359,327 @@ class NewsDetailsAPIView(APIView):
             return JsonResponse({"error": "Internal server error"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+class NewsBatchAPIView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    @swagger_auto_schema(
+        operation_description="Add many news at once, news already stored and near duplicates are skipped",
+        request_body=openapi.Schema(
+            type=openapi.TYPE_ARRAY,
+            items=openapi.Schema(
+                type=openapi.TYPE_OBJECT,
+                properties={
+                    'title': openapi.Schema(type=openapi.TYPE_STRING, description='Title of the news'),
+                    'details': openapi.Schema(type=openapi.TYPE_STRING, description='Description of the news'),
+                    'date': openapi.Schema(type=openapi.TYPE_STRING,
+                                           description='Published date of the news in YYY-MM-DD format'),
+                    'news_from': openapi.Schema(type=openapi.TYPE_STRING, description='Source of the news'),
+                    'news_url': openapi.Schema(type=openapi.TYPE_STRING, description='URL for the news')
+                }
+            )
+        ),
+        responses={200: '{"results":[{"index":xx,"status":"created","id":xx}], "created":xx, "failed":xx}'}
+    )
+    def post(self, request):
+        """
+        Store many news in one transaction
+        :param request:
+        :return:
+        """
+        try:
+            error_response, items = parse_batch(request)
+            if error_response is not None:
+                return error_response
+            results = [None] * len(items)
+            candidates = {}
+            for index, item in enumerate(items):
+                error, values = parse_news_item(item, NEWS_KEYS)
+                if error is not None:
+                    results[index] = {"index": index, "status": "error", "error": error}
+                else:
+                    candidates[index] = build_news(**values)
+            result = ingest_news(list(candidates.values()))
+            inserted = {id(news) for news in result.inserted}
+            originals = {id(news): original for news, original in result.near_duplicates}
+            for index, news in candidates.items():
+                if id(news) in inserted:
+                    results[index] = {"index": index, "status": "created", "id": news.id}
+                elif id(news) in originals:
+                    results[index] = {"index": index, "status": "error",
+                                      "error": "Near duplicate of news {}!".format(originals[id(news)])}
+                else:
+                    results[index] = {"index": index, "status": "error", "error": "News already exists!"}
+            return JsonResponse(batch_response(results, "created"), status=status.HTTP_200_OK)
+        except JSONDecodeError as e:
+            return JsonResponse({"error": "Invalid Json"}, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            return JsonResponse({"error": "Internal server error"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    @swagger_auto_schema(
+        operation_description="Update many existing news at once",
+        request_body=openapi.Schema(
+            type=openapi.TYPE_ARRAY,
+            items=openapi.Schema(
+                type=openapi.TYPE_OBJECT,
+                properties={
+                    'id': openapi.Schema(type=openapi.TYPE_INTEGER, description='Id of the news'),
+                    'title': openapi.Schema(type=openapi.TYPE_STRING, description='Title of the news'),
+                    'details': openapi.Schema(type=openapi.TYPE_STRING, description='Description of the news'),
+                    'date': openapi.Schema(type=openapi.TYPE_STRING,
+                                           description='Published date of the news in YYY-MM-DD format'),
+                    'news_from': openapi.Schema(type=openapi.TYPE_STRING, description='Source of the news'),
+                    'news_url': openapi.Schema(type=openapi.TYPE_STRING, description='URL for the news')
+                }
+            )
+        ),
+        responses={200: '{"results":[{"index":xx,"status":"updated","id":xx}], "updated":xx, "failed":xx}'}
+    )
+    def put(self, request):
+        """
+        Update many news in one transaction
+        :param request:
+        :return:
+        """
+        try:
+            error_response, items = parse_batch(request)
+            if error_response is not None:
+                return error_response
+            results = [None] * len(items)
+            changes = {}
+            for index, item in enumerate(items):
+                error, values = parse_news_item(item, ["id"] + NEWS_KEYS)
+                if error is None:
+                    try:
+                        values["id"] = int(item["id"])
+                    except (TypeError, ValueError):
+                        error = {"id": {"error": "Value of key id must be an integer"}}
+                if error is None and values["id"] in (change["id"] for change in changes.values()):
+                    error = {"id": {"error": "News is updated twice in the batch"}}
+                if error is not None:
+                    results[index] = {"index": index, "status": "error", "error": error}
+                else:
+                    values["url_hash"] = url_hash(values["news_url"])
+                    values["snippet"], values["word_count"] = summarize(values["details"])
+                    changes[index] = values
+            with transaction.atomic():
+                instances = News.objects.select_for_update().in_bulk(
+                    [values["id"] for values in changes.values()])
+                # url hash -> id of the news owning it once the batch is applied
+                owners = {
+                    hash_: news_id for hash_, news_id in News.objects.filter(
+                        url_hash__in=[values["url_hash"] for values in changes.values()]
+                    ).values_list("url_hash", "id") if news_id not in instances
+                }
+                updated = []
+                for index, values in changes.items():
+                    instance = instances.get(values["id"])
+                    if instance is None:
+                        results[index] = {"index": index, "status": "error", "error": "record  not exist"}
+                        continue
+                    if owners.setdefault(values["url_hash"], instance.id) != instance.id:
+                        results[index] = {"index": index, "status": "error", "error": "News already exists!"}
+                        continue
+                    for field in NEWS_UPDATE_FIELDS:
+                        setattr(instance, field, values[field])
+                    instance.updated_at = timezone.now()
+                    updated.append(instance)
+                    results[index] = {"index": index, "status": "updated", "id": instance.id}
+                News.objects.bulk_update(updated, NEWS_UPDATE_FIELDS + ["updated_at"], batch_size=BATCH_SIZE)
+                if updated:
+                    news_changed.send(sender=News, created=[], updated=updated, deleted=[])
+            return JsonResponse(batch_response(results, "updated"), status=status.HTTP_200_OK)
+        except IntegrityError as e:
+            # an url of the batch is still owned by a news which is not part of it
+            return JsonResponse({"error": "News already exists!"}, status=status.HTTP_400_BAD_REQUEST)
+        except JSONDecodeError as e:
+            return JsonResponse({"error": "Invalid Json"}, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            return JsonResponse({"error": "Internal server error"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    @swagger_auto_schema(
+        operation_description="Delete many existing news at once",
+        request_body=openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Schema(type=openapi.TYPE_INTEGER),
+                                    description='Ids of the news'),
+        responses={200: '{"results":[{"index":xx,"status":"deleted","id":xx}], "deleted":xx, "failed":xx}'}
+    )
+    def delete(self, request):
+        """
+        Delete many news in one transaction
+        :param request:
+        :return:
+        """
+        try:
+            error_response, items = parse_batch(request)
+            if error_response is not None:
+                return error_response
+            results = [None] * len(items)
+            ids = {}
+            for index, item in enumerate(items):
+                try:
+                    ids[index] = int(item)
+                except (TypeError, ValueError):
+                    results[index] = {"index": index, "status": "error", "error": "Id must be an integer"}
+            with transaction.atomic():
+                news = list(News.objects.filter(id__in=set(ids.values())).only("id", "date", "news_from"))
+                delete_news(news)
+            existing = {item.id for item in news}
+            for index, news_id in ids.items():
+                if news_id in existing:
+                    results[index] = {"index": index, "status": "deleted", "id": news_id}
+                    # an id listed twice is only deleted once
+                    existing.discard(news_id)
+                else:
+                    results[index] = {"index": index, "status": "error", "error": "record  not exist"}
+            return JsonResponse(batch_response(results, "deleted"), status=status.HTTP_200_OK)
+        except JSONDecodeError as e:
+            return JsonResponse({"error": "Invalid Json"}, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            return JsonResponse({"error": "Internal server error"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+class NewsExport(APIView):
+    permission_classes = [IsAuthenticated]
+
+    @swagger_auto_schema(
+        operation_description="Stream the news as NDJSON or CSV, oldest first.",
+        manual_parameters=[
+            openapi.Parameter('export_format', openapi.IN_QUERY, type=openapi.TYPE_STRING, enum=['ndjson', 'csv'],
+                              description='Format of the export, ndjson by default'),
+            openapi.Parameter('date_from', openapi.IN_QUERY, type=openapi.TYPE_STRING,
+                              description='First published date to export in YYYY-MM-DD format'),
+            openapi.Parameter('date_to', openapi.IN_QUERY, type=openapi.TYPE_STRING,
+                              description='Last published date to export in YYYY-MM-DD format'),
+            openapi.Parameter('news_from', openapi.IN_QUERY, type=openapi.TYPE_STRING,
+                              description='Only export the news of this source'),
+            openapi.Parameter('gzip', openapi.IN_QUERY, type=openapi.TYPE_BOOLEAN,
+                              description='Gzip the export'),
+            openapi.Parameter('archive', openapi.IN_QUERY, type=openapi.TYPE_BOOLEAN,
+                              description='Export the archived news, older than NEWS_ARCHIVE_AFTER_DAYS'),
+        ],
+        responses={200: 'NDJSON or CSV file'}
+    )
+    def get(self, request):
+        """
+        Stream the news table without loading it in memory
+        :param request:
+        :return:
+        """
+        export_format = request.query_params.get("export_format", "ndjson")
+        if export_format not in CONTENT_TYPES:
+            return JsonResponse({"error": "export_format must be ndjson or csv"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            date_from = parse_date(request.query_params.get("date_from"))
+            date_to = parse_date(request.query_params.get("date_to"))
+        except ValueError as e:
+            return JsonResponse({"error": "Valid format for date is YYYY-MM-DD"}, status=status.HTTP_400_BAD_REQUEST)
+        gzip = request.query_params.get("gzip", "").lower() in ("1", "true")
+        news_from = request.query_params.get("news_from") or None
+        archive = request.query_params.get("archive", "").lower() in ("1", "true")
+        response = StreamingHttpResponse(
+            export_stream(export_format, date_from, date_to, news_from, gzip, archive),
+            content_type=CONTENT_TYPES[export_format] + "; charset=utf-8"
+        )
+        filename = "news." + export_format + (".gz" if gzip else "")
+        response["Content-Disposition"] = 'attachment; filename="{}"'.format(filename)
+        return response
+
+
+class NewsChanges(APIView):
+    permission_classes = [IsAuthenticated]
+
+    @swagger_auto_schema(
+        operation_description="News inserted, updated, deleted or archived since a cursor, to keep a copy of the "
+                              "news in sync. Without since no change is returned, only the cursor to start from, "
+                              "take it before downloading GET /news/export/.",
+        manual_parameters=[
+            openapi.Parameter('since', openapi.IN_QUERY, type=openapi.TYPE_STRING,
+                              description='Cursor returned as "next" by the previous call'),
+            openapi.Parameter('page_size', openapi.IN_QUERY, type=openapi.TYPE_INTEGER,
+                              description='Number of changes read'),
+        ],
+        responses={200: '{"changes":[{"action":"insert|update|delete|archive","id":xx,"news":{...},'
+                        '"updated_at":xx}],"next":xxx,"has_more":xx}',
+                   410: '{"error": "Cursor older than 30 days, sync again from GET /news/export/"}'}
+    )
+    def get(self, request):
+        """
+        Changes of the news after the cursor, in the order of the change log
+        :param request:
+        :return:
+        """
+        try:
+            page_size = parse_page_size(request.query_params.get("page_size"))
+            changes, next_cursor, has_more = read_changes(request.query_params.get("since") or None, page_size)
+        except PaginationError as e:
+            return JsonResponse({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except ChangesExpired as e:
+            return JsonResponse({"error": str(e)}, status=status.HTTP_410_GONE)
+        return HttpResponse(render_json({"changes": changes, "next": next_cursor, "has_more": has_more}),
+                            content_type="application/json", status=status.HTTP_200_OK)
+
+
+class NewsStats(APIView):
+    permission_classes = [IsAuthenticated]
+
+    @swagger_auto_schema(
+        operation_description="Number of news per source and per day, archived news included. With a keyword "
+                              "the top sources of the news matching it.",
+        manual_parameters=[
+            openapi.Parameter('date_from', openapi.IN_QUERY, type=openapi.TYPE_STRING,
+                              description='First published date counted in YYYY-MM-DD format'),
+            openapi.Parameter('date_to', openapi.IN_QUERY, type=openapi.TYPE_STRING,
+                              description='Last published date counted in YYYY-MM-DD format'),
+            openapi.Parameter('news_from', openapi.IN_QUERY, type=openapi.TYPE_STRING,
+                              description='Only count the news of this source'),
+            openapi.Parameter('keyword', openapi.IN_QUERY, type=openapi.TYPE_STRING,
+                              description='Count the news matching the keyword per source, archive excluded'),
+            openapi.Parameter('top', openapi.IN_QUERY, type=openapi.TYPE_INTEGER,
+                              description='Number of sources ranked, 10 by default'),
+        ],
+        responses={200: '{"total":xx,"sources":[{"news_from":xx,"count":xx}],'
+                        '"days":[{"date":xx,"news_from":xx,"count":xx}]}'}
+    )
+    def get(self, request):
+        """
+        Facets of the news, served from the response cache when possible
+        :param request:
+        :return:
+        """
+        return cached_response(request, lambda: self.news_stats(request))
+
+    def news_stats(self, request):
+        """
+        Facets of the news from the daily counts, or from the search when a keyword is given
+        :param request:
+        :return:
+        """
+        try:
+            date_from = parse_date(request.query_params.get("date_from"))
+            date_to = parse_date(request.query_params.get("date_to"))
+        except ValueError as e:
+            return JsonResponse({"error": "Valid format for date is YYYY-MM-DD"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            top = int(request.query_params.get("top") or STATS_TOP)
+        except ValueError as e:
+            return JsonResponse({"error": "top must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+        if not 1 <= top <= STATS_MAX_TOP:
+            return JsonResponse({"error": "top must be between 1 and {}".format(STATS_MAX_TOP)},
+                                status=status.HTTP_400_BAD_REQUEST)
+        news_from = request.query_params.get("news_from") or None
+        keyword = request.query_params.get("keyword", "").strip()
+        if not keyword:
+            return JsonResponse(daily_counts(date_from, date_to, news_from, top), status=status.HTTP_200_OK)
+        counts = get_search_backend().source_counts(keyword, date_from, date_to)
+        if news_from is not None:
+            counts = {news_from: counts.get(news_from, 0)}
+        ranked = sorted(counts.items(), key=lambda item: (-item[1], item[0]))[:top]
+        return JsonResponse({
+            "keyword": keyword,
+            "total": sum(counts.values()),
+            "sources": [{"news_from": source, "count": count} for source, count in ranked],
+        }, status=status.HTTP_200_OK)
+
+
 class FilterNews(APIView):
     permission_classes = [IsAuthenticated]
 
@@ -239,14 +688,27 @@ class FilterNews(APIView):
         request_body=openapi.Schema(
             type=openapi.TYPE_OBJECT,
             properties={
-                'keyword': openapi.Schema(type=openapi.TYPE_STRING, description='Keyword for searching')
+                'keyword': openapi.Schema(type=openapi.TYPE_STRING,
+                                          description='Words to search, use "double quotes" for a phrase'),
+                'page': openapi.Schema(type=openapi.TYPE_INTEGER, description='Page of the results, from 1'),
+                'page_size': openapi.Schema(type=openapi.TYPE_INTEGER, description='Number of news per page'),
             }
         ),
-        responses={200: '[{"id":xx,"title":xxx,"details":xxx,"date":xx,"news_from":xx,"news_url":xx}]'}
+        responses={200: '{"results":[{"id":xx,"title":xxx,"date":xx,"news_from":xx,"news_url":xx,"snippet":xxx,'
+                        '"word_count":xx}],"next_page":xx}'}
     )
+    @method_decorator(read_from_replica)
     def post(self, request):
         """
-        Search the news by keyword
+        Search the news by keyword, served from the response cache when possible
+        :param request:
+        :return:
+        """
+        return cached_response(request, lambda: self.search_news(request))
+
+    def search_news(self, request):
+        """
+        Search the news by keyword, best match first
         :param request:
         :return:
         """
@@ -257,30 +719,73 @@ class FilterNews(APIView):
             if is_errors:
                 return JsonResponse(response, status=status.HTTP_400_BAD_REQUEST)
             else:
-                keyword = data.get("keyword")
-                news_obj = News.objects.filter(Q(title__contains=keyword) | Q(details__contains=keyword))
+                keyword = str(data.get("keyword"))
+                page = parse_page_number(data.get("page"))
+                page_size = parse_page_size(data.get("page_size"))
+                # one extra row tells whether there is a next page
+                serializer = NewsRowSerializer()
+                news_obj = get_search_backend().search(keyword, (page - 1) * page_size, page_size + 1,
+                                                       serializer.row_fields)
                 if news_obj:
-                    serializer = NewsSerializer(news_obj, many=True)
-                    return Response(serializer.data, status=status.HTTP_200_OK)
+                    next_page = page + 1 if len(news_obj) > page_size else None
+                    return HttpResponse(
+                        render_json({"results": serializer.many(news_obj[:page_size]), "next_page": next_page}),
+                        content_type="application/json", status=status.HTTP_200_OK)
                 else:
                     return JsonResponse({"message": "No data available!"}, status=status.HTTP_200_OK)
         except JSONDecodeError as e:
             return JsonResponse({"error": "Invalid Json"}, status=status.HTTP_400_BAD_REQUEST)
+        except PaginationError as e:
+            return JsonResponse({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             return JsonResponse({"error": "Internal server error"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+class SuggestKeywords(APIView):
+    permission_classes = [IsAuthenticated]
+
+    @swagger_auto_schema(
+        operation_description="Keywords completing what was typed in the search box, from the words of the titles "
+                              "and the most frequent words of the details, most common first",
+        manual_parameters=[
+            openapi.Parameter('q', openapi.IN_QUERY, type=openapi.TYPE_STRING,
+                              description='Keyword typed so far, its last word is completed'),
+            openapi.Parameter('limit', openapi.IN_QUERY, type=openapi.TYPE_INTEGER,
+                              description='Number of suggestions, 10 by default'),
+        ],
+        responses={200: '{"suggestions":[{"text":xxx,"count":xx}]}'}
+    )
+    def get(self, request):
+        """
+        Suggestions from the in memory index of the worker, see suggest.py
+        :param request:
+        :return:
+        """
+        try:
+            limit = int(request.query_params.get("limit") or SUGGEST_LIMIT)
+        except ValueError as e:
+            return JsonResponse({"error": "limit must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+        if not 1 <= limit <= SUGGEST_MAX_LIMIT:
+            return JsonResponse({"error": "limit must be between 1 and {}".format(SUGGEST_MAX_LIMIT)},
+                                status=status.HTTP_400_BAD_REQUEST)
+        suggestions = suggester.suggest(request.query_params.get("q", ""), limit)
+        return HttpResponse(render_json({"suggestions": suggestions}), content_type="application/json",
+                            status=status.HTTP_200_OK)
+
+
 class ScrapedNews(APIView):
     permission_classes = [IsAuthenticated]
 
     @swagger_auto_schema(
-        operation_description="Scrape the news and insert them if and only if they have published date.",
+        operation_description="Queue a scrape of the news, the news are inserted if and only if they have "
+                              "published date. Poll /bulk-news/{job_id}/ for the progress.",
 
-        responses={201: '{"message": "Records created!"}'}
+        responses={202: '{"message": "Scrape queued!", "job_id": xx}'}
     )
     def post(self, request):
         """
-        insert the bulk news from the websites
+        queue a scrape of the bulk news from the websites, the scrape worker
+        (python manage.py run_scrape_worker) runs it
         reference for scrapping
         https://holwech.github.io/blog/Automatic-news-scraper/
 
@@ -288,43 +793,106 @@ class ScrapedNews(APIView):
         :return:
         """
         try:
-            # Loads the JSON files with news sites
-            with open('NewsPapers.json') as data_file:
-                companies = json.load(data_file)
-            #     As library execute for many news so need to limit
-            LIMIT = 5
-            for company, value in companies.items():
-                paper = newspaper.build(value['link'], memoize_articles=False)
-                count = 0
-                for content in paper.articles:
-                    count = count + 1
-                    if count > LIMIT:
-                        break
-                    try:
-                        content.download()
-                        content.parse()
-                    except Exception as e:
-                        continue
-                    # Again, for consistency, if there is no found publish date the article will be skipped.
-                    # After 5 downloaded articles from the same newspaper without publish date,
-                    # the company will be skipped.
-                    if content.publish_date is None:
-                        continue
+            job = enqueue_scrape_job()
+            return JsonResponse({"message": "Scrape queued!", "job_id": job.id}, status=status.HTTP_202_ACCEPTED)
+        except Exception as e:
+            return JsonResponse({"error": "Internal server error"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-                    # Comparing the article publish date and current date
-                    # Proceed only when both date are same as per the problem statement
-                    publish_date = content.publish_date
-                    if datetime.datetime.now().strftime("%d-%m-%Y") == publish_date.strftime("%d-%m-%Y"):
-                        # check if news already exist or not in db
-                        title = content.title
-                        details = content.text
-                        news_from = company
-                        news_url = content.url
-                        if not News.objects.filter(title=title, news_from=news_from, news_url=news_url).exists():
-                            News.objects.create(title=title.strip(), details=details.strip(),
-                                                news_from=news_from.strip(),
-                                                news_url=news_url.strip(), date=publish_date)
-
-            return JsonResponse({"message": "Records created!"}, status=status.HTTP_201_CREATED)
+
+class ScrapeJobDetails(APIView):
+    permission_classes = [IsAuthenticated]
+
+    @swagger_auto_schema(
+        operation_description="Status of a scrape job with the progress of every source",
+        responses={200: '{"id":xx,"status":xx,"created_at":xx,"started_at":xx,"finished_at":xx,'
+                        '"duration_seconds":xx,"sources":{},"articles_inserted":xx,"error":xx}'}
+    )
+    def get(self, request, job_id):
+        """
+        Get the status of a scrape job
+        :param request:
+        :param job_id: pk of the scrape job
+        :return:
+        """
+        try:
+            job = ScrapeJob.objects.get(id=job_id)
+        except ScrapeJob.DoesNotExist as e:
+            return JsonResponse({"error": "record  not exist"}, status=status.HTTP_404_NOT_FOUND)
+        serializer = ScrapeJobSerializer(job)
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+class CacheStats(APIView):
+    permission_classes = [IsAuthenticated]
+
+    @swagger_auto_schema(
+        operation_description="Hit ratio of the response cache of the news list, detail and search",
+        responses={200: '{"hits":xx,"misses":xx,"hit_ratio":xx,"entries":xx,"version":xx}'}
+    )
+    def get(self, request):
+        """
+        Statistics of the response cache
+        :param request:
+        :return:
+        """
+        return JsonResponse(cache_stats(), status=status.HTTP_200_OK)
+
+
+class Metrics(APIView):
+    # scraped by Prometheus, which cannot renew JWTs, so the clients are checked by address instead
+    authentication_classes = []
+    permission_classes = [AllowAny]
+
+    @swagger_auto_schema(
+        operation_description="Latency, database queries, serialization time and response size per route and "
+                              "the scraper statistics, in the Prometheus text format. Only for the addresses of "
+                              "NEWS_METRICS_ALLOWED_IPS",
+        responses={200: 'news_api_request_seconds_bucket{method="GET",route="news/",le="0.005"} xx',
+                   403: '{"error": "Metrics are not served to this address"}'}
+    )
+    def get(self, request):
+        """
+        Metrics of the processes
+        :param request:
+        :return:
+        """
+        if not is_allowed_client(request.META.get('REMOTE_ADDR', '')):
+            return JsonResponse({"error": "Metrics are not served to this address"}, status=status.HTTP_403_FORBIDDEN)
+        return HttpResponse(REGISTRY.render(), content_type=CONTENT_TYPE)
+
+
+class RevokeToken(APIView):
+    permission_classes = [IsAuthenticated]
+
+    @swagger_auto_schema(
+        operation_description="Revoke an access token until it expires, the token of the request when no token "
+                              "is given",
+        request_body=openapi.Schema(
+            type=openapi.TYPE_OBJECT,
+            properties={
+                'token': openapi.Schema(type=openapi.TYPE_STRING, description='Access token to revoke'),
+            }
+        ),
+        responses={200: '{"message": "Token revoked!"}', 403: '{"error": "Only your own tokens can be revoked"}'}
+    )
+    def post(self, request):
+        """
+        Revoke an access token of the user of the request, e.g. on logout
+        :param request:
+        :return:
+        """
+        try:
+            data = json.loads(request.body) if request.body else {}
+            token = request.auth
+            if data.get("token"):
+                token = request.successful_authenticator.get_validated_token(str(data["token"]).encode())
+            if token.get(api_settings.USER_ID_CLAIM) != getattr(request.user, api_settings.USER_ID_FIELD):
+                return JsonResponse({"error": "Only your own tokens can be revoked"}, status=status.HTTP_403_FORBIDDEN)
+            revoke_token(token)
+            return JsonResponse({"message": "Token revoked!"}, status=status.HTTP_200_OK)
+        except InvalidToken as e:
+            return JsonResponse({"error": "Invalid token"}, status=status.HTTP_400_BAD_REQUEST)
+        except (JSONDecodeError, AttributeError) as e:
+            return JsonResponse({"error": "Invalid Json"}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
             return JsonResponse({"error": "Internal server error"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)